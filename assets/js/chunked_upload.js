@@ -0,0 +1,183 @@
+// Resumable chunked uploads (/uploads/, pms.uploads). A file is sent in
+// server-sized chunks, a few at a time, each with its SHA-256 so a damaged
+// chunk is refused and resent on its own. The upload token is remembered
+// per file, so after a reload or a dropped connection only the chunks the
+// server is missing go up again.
+window.pmsUpload = (function () {
+    const PARALLEL = 3;
+    const RETRIES = 5;
+    // Smaller files keep using the plain form post.
+    const THRESHOLD = 5 * 1024 * 1024;
+
+    function csrfToken() {
+        const input = document.querySelector('[name=csrfmiddlewaretoken]');
+        if (input) return input.value;
+        const match = document.cookie.match(/csrftoken=([^;]+)/);
+        return match ? match[1] : '';
+    }
+
+    function request(method, url, body, headers) {
+        return fetch(url, {
+            method: method,
+            headers: Object.assign({'X-CSRFToken': csrfToken(), 'X-Requested-With': 'XMLHttpRequest'}, headers || {}),
+            body: body,
+            credentials: 'same-origin'
+        }).then(response => response.json().catch(() => ({})).then(data => {
+            if (!response.ok) {
+                const error = new Error(data.error || response.statusText);
+                error.status = response.status;
+                throw error;
+            }
+            return data;
+        }));
+    }
+
+    async function sha256(buffer) {
+        // crypto.subtle only exists on https:// and localhost; without it
+        // chunks go up unchecked.
+        if (!window.crypto || !crypto.subtle) return null;
+        const digest = await crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    function sleep(ms) { return new Promise(resolve => setTimeout(resolve, ms)); }
+
+    function storageKey(file, target, targetId) {
+        return 'pms-upload:' + [target, targetId, file.name, file.size, file.lastModified].join(':');
+    }
+
+    async function resume(key) {
+        const token = localStorage.getItem(key);
+        if (!token) return null;
+        try {
+            const state = await request('GET', '/uploads/' + token + '/');
+            if (state.status === 'ACTIVE') return state;
+        } catch (e) { /* expired or pruned: start over */ }
+        localStorage.removeItem(key);
+        return null;
+    }
+
+    async function sendChunk(file, state, index) {
+        const start = index * state.chunk_size;
+        const buffer = await file.slice(start, start + state.chunk_size).arrayBuffer();
+        const digest = await sha256(buffer);
+        const headers = {'Content-Type': 'application/octet-stream'};
+        if (digest) headers['X-Chunk-SHA256'] = digest;
+        for (let attempt = 1; ; attempt++) {
+            try {
+                return await request('PUT', '/uploads/' + state.token + '/chunks/' + index + '/', buffer, headers);
+            } catch (e) {
+                // 4xx other than a checksum failure will not get better by retrying.
+                if (attempt >= RETRIES || (e.status && e.status < 500 && e.status !== 422)) throw e;
+                await sleep(500 * Math.pow(2, attempt - 1));
+            }
+        }
+    }
+
+    // upload(file, target, targetId, {description, onProgress(sent, total)})
+    // resolves with the completed upload ({url, sha256, ...}).
+    async function upload(file, target, targetId, options) {
+        options = options || {};
+        const key = storageKey(file, target, targetId);
+        let state = await resume(key);
+        if (!state) {
+            state = await request('POST', '/uploads/', JSON.stringify({
+                filename: file.name, size: file.size, target: target, target_id: targetId,
+                description: options.description || ''
+            }), {'Content-Type': 'application/json'});
+            localStorage.setItem(key, state.token);
+        }
+
+        const queue = state.missing.slice();
+        let sent = state.chunks - queue.length;
+        const progress = () => options.onProgress && options.onProgress(sent, state.chunks);
+        progress();
+        async function worker() {
+            while (queue.length) {
+                await sendChunk(file, state, queue.shift());
+                sent++;
+                progress();
+            }
+        }
+        await Promise.all(Array.from({length: Math.min(PARALLEL, queue.length)}, worker));
+
+        const result = await request('POST', '/uploads/' + state.token + '/complete/');
+        localStorage.removeItem(key);
+        return result;
+    }
+
+    // Forms marked data-chunked-target="<UploadTarget>" and
+    // data-chunked-target-id="<id>" send a large file in their
+    // [data-chunked-file] input through upload() and then reload.
+    function wireForm(form) {
+        const input = form.querySelector('[data-chunked-file]');
+        if (!input) return;
+        const status = form.querySelector('[data-chunked-status]');
+        form.addEventListener('submit', async event => {
+            const file = input.files[0];
+            if (!file || file.size < THRESHOLD) return;
+            event.preventDefault();
+            const description = form.querySelector('[name=description]');
+            const buttons = form.querySelectorAll('button');
+            buttons.forEach(b => b.disabled = true);
+            try {
+                await upload(file, form.dataset.chunkedTarget, form.dataset.chunkedTargetId, {
+                    description: description ? description.value : '',
+                    onProgress: (done, total) => {
+                        if (status) status.textContent = 'Uploading ' + Math.floor(100 * done / total) + '%';
+                    }
+                });
+                location.reload();
+            } catch (e) {
+                if (status) status.textContent = 'Upload failed: ' + e.message + ' (submit again to resume)';
+                buttons.forEach(b => b.disabled = false);
+            }
+        });
+    }
+
+    // Forms marked data-chunked-after-save="<UploadTarget>" create the
+    // object the files belong to (an update, an issue). Large files are
+    // left out of the form post; the view answers with {id, redirect} and
+    // they are then uploaded against that id. The id is kept, so
+    // submitting again after a failure only resumes the uploads.
+    function wireAfterSave(form) {
+        const status = form.querySelector('[data-chunked-status]');
+        let savedId = null, redirect = null;
+        form.addEventListener('submit', async event => {
+            const big = Array.from(form.querySelectorAll('[data-chunked-file]'))
+                .filter(input => input.files[0] && input.files[0].size >= THRESHOLD);
+            if (!big.length && savedId === null) return;
+            event.preventDefault();
+            const buttons = form.querySelectorAll('button');
+            buttons.forEach(b => b.disabled = true);
+            try {
+                if (savedId === null) {
+                    const body = new FormData(form);
+                    big.forEach(input => body.delete(input.name));
+                    const saved = await request('POST', form.action || location.href, body);
+                    savedId = saved.id;
+                    redirect = saved.redirect;
+                }
+                for (let i = 0; i < big.length; i++) {
+                    await upload(big[i].files[0], form.dataset.chunkedAfterSave, savedId, {
+                        onProgress: (done, total) => {
+                            if (status) status.textContent = 'Uploading ' + big[i].files[0].name + ' ' + Math.floor(100 * done / total) + '%';
+                        }
+                    });
+                }
+                if (redirect) location.href = redirect; else location.reload();
+            } catch (e) {
+                if (status) status.textContent = (savedId === null ? 'Could not save: ' : 'Upload failed: ') + e.message +
+                    (savedId === null ? '' : ' (submit again to resume)');
+                buttons.forEach(b => b.disabled = false);
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('form[data-chunked-target]').forEach(wireForm);
+        document.querySelectorAll('form[data-chunked-after-save]').forEach(wireAfterSave);
+    });
+
+    return {upload: upload, threshold: THRESHOLD};
+})();
@@ -0,0 +1,53 @@
+// Live notification badge for the base templates, on the tab's shared
+// stream socket (stream.js). On reconnect it asks the server to replay
+// anything newer than the last event it saw. Events are ordered by their
+// "<micros>_<id>" cursor, which also moves when a row is coalesced into.
+(function () {
+    let lastCursor = null;
+
+    function setBadge(count) {
+        const badge = document.getElementById('notification-badge');
+        if (!badge) {
+            // No badge rendered yet (count was 0): reload to get the markup.
+            if (count > 0) location.reload();
+            return;
+        }
+        badge.innerText = count;
+        badge.style.display = count > 0 ? 'inline-block' : 'none';
+    }
+
+    function cursorKey(cursor) {
+        return cursor.split('_').map(Number);
+    }
+
+    function seen(cursor) {
+        if (!cursor) return;
+        if (lastCursor === null) { lastCursor = cursor; return; }
+        const [micros, id] = cursorKey(cursor), [lastMicros, lastId] = cursorKey(lastCursor);
+        if (micros > lastMicros || (micros === lastMicros && id > lastId)) lastCursor = cursor;
+    }
+
+    window.pmsStream.subscribe('notifications', function () {
+        return lastCursor !== null ? {cursor: lastCursor} : {};
+    }, function (data) {
+        if (data.type === 'token') {
+            window.pmsStream.setToken(data.token);
+        } else if (data.type === 'notification') {
+            seen(data.cursor);
+            if (data.unread_count !== undefined && data.unread_count !== null) {
+                setBadge(data.unread_count);
+            } else if (!data.coalesced) {
+                const badge = document.getElementById('notification-badge');
+                setBadge(badge ? (parseInt(badge.innerText) || 0) + 1 : 1);
+            }
+        } else if (data.type === 'unread_count') {
+            seen(data.cursor);
+            setBadge(data.unread_count);
+        } else if (data.type === 'replay') {
+            data.notifications.forEach(n => seen(n.cursor));
+            setBadge(data.unread_count);
+            // Capped replay: keep asking until we've caught up.
+            if (data.has_more) window.pmsStream.send({type: 'replay', cursor: lastCursor});
+        }
+    });
+})();
@@ -0,0 +1,74 @@
+// One multiplexed socket per tab (/ws/stream/). Scripts subscribe to
+// streams ("notifications", "project:<id>") and get that stream's events;
+// subscriptions are re-sent whenever the socket reconnects.
+window.pmsStream = (function () {
+    const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const subscriptions = {};  // stream -> {params, handler}
+    // Signed subscription token; lets a reconnect skip the session lookup.
+    let token = document.currentScript.dataset.token || null;
+    let socket = null;
+    let retryDelay = 1000;
+
+    function send(message) {
+        if (socket && socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify(message));
+    }
+
+    function subscribeMessage(stream) {
+        return Object.assign({type: 'subscribe', stream: stream}, subscriptions[stream].params());
+    }
+
+    function dispatch(frame) {
+        if (frame.type === 'batch') {
+            frame.events.forEach(dispatch);
+        } else if (frame.type === 'ping') {
+            // Echo the server's byte count so it knows how far we have read.
+            send({type: 'pong', at: frame.at});
+        } else if (frame.type === 'resync') {
+            // Events were dropped server-side (slow connection): reload to catch up.
+            location.reload();
+        } else if (frame.stream && frame.event) {
+            const sub = subscriptions[frame.stream];
+            if (sub) sub.handler(frame.event, frame);
+        } else if (frame.type === 'error') {
+            console.error('Stream ' + frame.stream + ': ' + frame.reason);
+        }
+    }
+
+    function connect() {
+        let url = wsProtocol + '//' + window.location.host + '/ws/stream/';
+        if (token) url += '?token=' + encodeURIComponent(token);
+        socket = new WebSocket(url);
+
+        socket.onopen = function () {
+            retryDelay = 1000;
+            Object.keys(subscriptions).forEach(stream => send(subscribeMessage(stream)));
+        };
+
+        socket.onmessage = function (e) {
+            // Browser pages use the text payload modes only.
+            if (typeof e.data === 'string') dispatch(JSON.parse(e.data));
+        };
+
+        socket.onclose = function (e) {
+            // Evicted for a newer tab, or not signed in: reconnecting would only fight it.
+            if (e.code === 4001 || e.code === 4003) return;
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        };
+    }
+
+    return {
+        // ``params`` is an object or a function returning one; a function is
+        // re-evaluated on every (re)subscribe.
+        subscribe: function (stream, params, handler) {
+            subscriptions[stream] = {params: typeof params === 'function' ? params : () => params || {}, handler: handler};
+            if (socket === null) connect(); else send(subscribeMessage(stream));
+        },
+        unsubscribe: function (stream) {
+            delete subscriptions[stream];
+            send({type: 'unsubscribe', stream: stream});
+        },
+        send: send,
+        setToken: function (value) { token = value; },
+    };
+})();
@@ -1,14 +1,19 @@
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-import pms.routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Set up Django before importing anything that touches models.
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from pms.subscriptions import SubscriptionTokenMiddleware
+import pms.routing
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "http": django_asgi_app,
+    # Signed subscription tokens skip the session lookup; anything else
+    # falls back to the session-backed AuthMiddlewareStack.
+    "websocket": SubscriptionTokenMiddleware(
         URLRouter(
             pms.routing.websocket_urlpatterns
         )
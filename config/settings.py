@@ -32,6 +32,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'pms.middleware.ImageVariantMemoMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -98,18 +99,155 @@ LOGIN_URL = 'login'
 LOGOUT_REDIRECT_URL = 'login'
 LOGIN_REDIRECT_URL = 'index'
 
-# --- CHANNEL_LAYERS (Local Redis) ---
-CHANNEL_LAYERS = {
-    "default": {
+# --- CHANNEL_LAYERS ---
+# CHANNEL_LAYER=redis (default) for multi-host setups; CHANNEL_LAYER=unix
+# for single-box installs, where the Daphne processes talk over Unix
+# sockets in CHANNEL_SOCKET_DIR instead of going through Redis.
+CHANNEL_LAYER_BACKENDS = {
+    "redis": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
             "hosts": [("127.0.0.1", 6379)],
         },
     },
+    "unix": {
+        "BACKEND": "pms.layers.UnixSocketChannelLayer",
+        "CONFIG": {
+            "path": config('CHANNEL_SOCKET_DIR', default='/tmp/pms-channels'),
+        },
+    },
 }
+CHANNEL_LAYERS = {
+    "default": CHANNEL_LAYER_BACKENDS[config('CHANNEL_LAYER', default='redis')],
+}
+
+# Channel-layer publishing runs on a background thread after commit;
+# events beyond the queue size are dropped (and logged) instead of blocking.
+REALTIME_DISPATCH_QUEUE_SIZE = 1000
+REALTIME_DISPATCH_BATCH_SIZE = 50
+# Seconds a project group's subscriber counter lives without a refresh.
+REALTIME_PRESENCE_TTL = 120
+# Per-socket outbox for project updates: events arriving within the window
+# go out as one batch frame; past the size limit a socket is either told to
+# resync (and the backlog dropped) or disconnected.
+REALTIME_COALESCE_WINDOW = 0.05
+REALTIME_OUTBOX_SIZE = 100
+# A socket whose client has not acknowledged this many bytes stops being
+# written to until it does (its outbox then fills and the policy applies).
+REALTIME_MAX_UNACKED_BYTES = 1024 * 1024
+REALTIME_SLOW_CONSUMER_POLICY = 'resync'  # or 'disconnect'
+# Signed WebSocket subscription tokens (issued with the page) stay valid
+# this long; older ones fall back to the session plus a cached access check.
+REALTIME_TOKEN_MAX_AGE = 15 * 60
+# Sockets get an app-level ping every interval and are closed after the
+# idle timeout without any client frame. A user's oldest sockets are closed
+# once they have more than the cap open.
+REALTIME_HEARTBEAT_INTERVAL = 30
+REALTIME_IDLE_TIMEOUT = 90
+REALTIME_MAX_SOCKETS_PER_USER = 8
+# Groups (fnmatch patterns) sent over Redis pub/sub: one publish per event
+# and one subscription per process, fanned out to local sockets in memory,
+# instead of one channel-layer write per socket. Worth it for big teams,
+# e.g. ['project_*_updates', 'management_firehose'].
+REALTIME_BROADCAST_GROUPS = []
+REALTIME_BROADCAST_URL = 'redis://127.0.0.1:6379/0'
+REALTIME_ACCESS_CACHE_TIMEOUT = 5 * 60
+
+# --- CACHE (Local Redis) ---
+# Shared across Daphne/WSGI processes; holds the unread-notification counters.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/1",
+    },
+}
+
+# --- NOTIFICATIONS ---
+# Read notifications older than this are removed by `manage.py prune_notifications`.
+NOTIFICATION_RETENTION_DAYS = 90
+# Repeat chat/update/task events for the same user and project within this
+# many seconds update one unread row instead of adding new ones.
+NOTIFICATION_COALESCE_WINDOW = 15 * 60
+
+# --- BACKGROUND JOBS (`manage.py run_jobs`) ---
+# Jobs claimed per round, worker threads per process, seconds to sleep when
+# the queue is empty, and when a RUNNING job counts as abandoned by a dead
+# worker (a live one refreshes its lock every JOB_HEARTBEAT_INTERVAL
+# seconds while the handler runs). Failed jobs retry after JOB_RETRY_BACKOFF * 2**(attempt - 1)
+# seconds (capped at JOB_RETRY_BACKOFF_MAX) until max_attempts.
+JOB_BATCH_SIZE = 50
+JOB_CONCURRENCY = 1
+JOB_POLL_INTERVAL = 2
+JOB_LOCK_TIMEOUT = 10 * 60
+JOB_HEARTBEAT_INTERVAL = 60
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30
+JOB_RETRY_BACKOFF_MAX = 60 * 60
+
+# --- DEADLINE REMINDERS (`manage.py send_reminders`, daily) ---
+# Teams hear about a project end date this many days ahead, and about
+# passed project/recommendation deadlines up to the lookback (older ones
+# predate the scanner and are left alone).
+REMINDER_LEAD_DAYS = 3
+REMINDER_OVERDUE_LOOKBACK_DAYS = 7
+
+# --- DAILY UPDATES ---
+# Days (Monday = 0) employees are expected to post a daily update; the
+# compliance report and `manage.py remind_daily_updates` skip the rest.
+WORKING_DAYS = (0, 1, 2, 3, 4)
+
+# --- EMAIL DIGESTS (`manage.py send_digests`, nightly) ---
+# Links in emails are built on SITE_URL. A digest covers at most
+# DIGEST_MAX_DAYS back, lists at most DIGEST_SECTION_LIMIT items per section
+# and recipients are handled DIGEST_CHUNK_SIZE at a time. Anyone mailed in
+# the last DIGEST_MIN_INTERVAL_HOURS is skipped, so a rerun is harmless.
+SITE_URL = config('SITE_URL', default='http://127.0.0.1:8000')
+DIGEST_MAX_DAYS = 7
+DIGEST_SECTION_LIMIT = 20
+DIGEST_CHUNK_SIZE = 200
+DIGEST_MIN_INTERVAL_HOURS = 12
+
+# --- SCHEDULER (`manage.py run_scheduler`, one per app node) ---
+# Every node may run the scheduler; only the one holding the database lease
+# (renewed each tick, lost SCHEDULER_LEASE_SECONDS after its holder stops)
+# fires tasks. A task is a cron expression in TIME_ZONE plus either a job
+# kind ('job', 'payload') or a management command ('command', 'args',
+# 'options') and is run by the job workers. 'jitter' (seconds, default
+# SCHEDULER_DEFAULT_JITTER) spreads the next run after the cron slot. Run
+# history is kept SCHEDULER_HISTORY_DAYS.
+SCHEDULED_TASKS = {
+    'deadline_reminders': {'cron': '0 8 * * *', 'job': 'reminders'},
+    'daily_update_reminders': {'cron': '0 18 * * 1-5', 'job': 'daily_update_reminders'},
+    'digests': {'cron': '0 7 * * *', 'job': 'digest', 'jitter': 300},
+    'prune_notifications': {'cron': '30 3 * * *', 'command': 'prune_notifications', 'options': {'sleep': 0.1}},
+    'prune_uploads': {'cron': '15 * * * *', 'job': 'prune_uploads'},
+}
+SCHEDULER_LEASE_SECONDS = 60
+SCHEDULER_TICK = 15
+SCHEDULER_DEFAULT_JITTER = 30
+SCHEDULER_HISTORY_DAYS = 30
+
+# --- CHUNKED UPLOADS (pms.uploads, assets/js/chunked_upload.js) ---
+# Large files arrive UPLOAD_CHUNK_SIZE bytes per request (keep it under
+# DATA_UPLOAD_MAX_MEMORY_SIZE) and are assembled in storage once complete.
+# Unfinished uploads are dropped after UPLOAD_EXPIRY_HOURS.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_SIZE = 2 * 1024 ** 3
+UPLOAD_EXPIRY_HOURS = 24
+
+# --- IMAGE VARIANTS (pms.images) ---
+# Logos, profile photos and chat images get downscaled copies (longest side
+# in pixels) from the job worker after upload; templates pick them with the
+# image_variant/image_srcset filters. `manage.py generate_image_variants`
+# backfills existing images.
+IMAGE_VARIANT_SIZES = (64, 128, 256, 512)
+IMAGE_VARIANT_FORMAT = 'WEBP'
+IMAGE_VARIANT_QUALITY = 80
 
 # --- EMAIL SETTINGS ---
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Mail goes out from the job worker. EMAIL_BACKEND=django.core.mail.backends.locmem.EmailBackend
+# (or .console.EmailBackend) keeps it local while developing.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
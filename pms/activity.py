@@ -0,0 +1,75 @@
+from django.urls import reverse
+
+from .models import ActivityEvent
+from .choices import ActivityVerb
+
+FEED_PAGE_SIZE = 50
+FEED_MAX_PAGE_SIZE = 200
+
+
+def record_activity(project_id, verb, message, actor=None, link=None):
+    """Append one event to the project's activity feed. Events are never updated."""
+    return ActivityEvent.objects.create(
+        project_id=project_id,
+        actor=actor,
+        verb=verb,
+        message=message[:255],
+        link=link,
+    )
+
+
+def record_task_toggle(task, actor):
+    if task.is_complete:
+        verb, state = ActivityVerb.TASK_COMPLETED, "complete"
+    else:
+        verb, state = ActivityVerb.TASK_REOPENED, "incomplete"
+    return record_activity(
+        task.project_id, verb, f"{actor.username} marked '{task.page_name}' {state}",
+        actor=actor, link=reverse('manage_project_team', args=[task.project_id])
+    )
+
+
+def record_membership(project, member_user, added, actor=None):
+    if added:
+        verb, message = ActivityVerb.MEMBER_ADDED, f"{member_user.username} joined the team"
+    else:
+        verb, message = ActivityVerb.MEMBER_REMOVED, f"{member_user.username} left the team"
+    return record_activity(project.id, verb, message, actor=actor, link=reverse('project_detail', args=[project.id]))
+
+
+def get_feed_page(project, before=None, after=None, limit=FEED_PAGE_SIZE):
+    """
+    One page of the feed using the (project, id) index.
+
+    ``before`` walks back through history (newest first), ``after`` returns
+    what happened since a cursor (oldest first) so a client can catch up.
+    Returns (events, next_cursor); next_cursor is None when there is no more.
+    """
+    limit = max(1, min(limit, FEED_MAX_PAGE_SIZE))
+    qs = ActivityEvent.objects.filter(project=project).select_related('actor')
+
+    if after is not None:
+        qs = qs.filter(id__gt=after).order_by('id')
+    else:
+        if before is not None:
+            qs = qs.filter(id__lt=before)
+        qs = qs.order_by('-id')
+
+    events = list(qs[:limit + 1])
+    has_more = len(events) > limit
+    events = events[:limit]
+    next_cursor = events[-1].id if (events and has_more) else None
+    return events, next_cursor
+
+
+def serialize_event(event):
+    return {
+        'id': event.id,
+        'verb': event.verb,
+        'verb_display': event.get_verb_display(),
+        'message': event.message,
+        'link': event.link,
+        'actor_id': event.actor_id,
+        'actor_username': event.actor.username if event.actor else None,
+        'created_at': event.created_at.isoformat(),
+    }
@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (
     Project, ProjectMember, ProjectUpdate, Notification, 
     ProjectDocument, TaskPage, WorkUpdate, DailyUpdate, Issue,
-    ProjectUpdateAttachment, DailyUpdateLineItem
+    ProjectUpdateAttachment, DailyUpdateLineItem, ActivityEvent, Job, DigestState, ReminderLedger,
+    ScheduleEntry, SchedulerLease, ScheduledRun, Upload, UploadChunk
 )
 
 # Register models
@@ -16,4 +17,13 @@ admin.site.register(WorkUpdate)
 admin.site.register(DailyUpdate)
 admin.site.register(Issue)
 admin.site.register(ProjectUpdateAttachment)
-admin.site.register(DailyUpdateLineItem)
\ No newline at end of file
+admin.site.register(DailyUpdateLineItem)
+admin.site.register(ActivityEvent)
+admin.site.register(Job)
+admin.site.register(DigestState)
+admin.site.register(ReminderLedger)
+admin.site.register(ScheduleEntry)
+admin.site.register(SchedulerLease)
+admin.site.register(ScheduledRun)
+admin.site.register(Upload)
+admin.site.register(UploadChunk)
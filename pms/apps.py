@@ -7,4 +7,11 @@ class PmsConfig(AppConfig):
     # --- ADD THIS METHOD ---
     # This imports our signals file when the app is ready
     def ready(self):
-        import pms.signals
\ No newline at end of file
+        import pms.signals
+        # Job handlers register themselves on import.
+        import pms.jobs
+        import pms.digests
+        import pms.reminders
+        import pms.compliance
+        import pms.uploads
+        import pms.images
\ No newline at end of file
@@ -0,0 +1,128 @@
+import asyncio
+import fnmatch
+import logging
+import weakref
+
+import msgpack
+from django.conf import settings
+from redis import asyncio as redis_asyncio
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Groups (fnmatch patterns) published over Redis pub/sub instead of the
+# channel layer's group_send. Off unless configured.
+BROADCAST_GROUPS = getattr(settings, 'REALTIME_BROADCAST_GROUPS', [])
+BROADCAST_URL = getattr(settings, 'REALTIME_BROADCAST_URL', 'redis://127.0.0.1:6379/0')
+TOPIC_PREFIX = 'pms:broadcast:'
+
+
+def is_broadcast_group(group):
+    return any(fnmatch.fnmatchcase(group, pattern) for pattern in BROADCAST_GROUPS)
+
+
+def topic_name(group):
+    return TOPIC_PREFIX + group
+
+
+class BroadcastHub:
+    """
+    One pub/sub connection per process (event loop) for broadcast groups.
+
+    channels_redis' group_send writes one message per member channel; here
+    the publisher writes once per event, every process subscribed to the
+    topic receives it once and dispatches it to its own sockets in memory.
+    A topic is subscribed while at least one local socket is in the group.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.local = {}  # group -> set of consumers in this process
+        self._client = None
+        self._pubsub = None
+        self._reader = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis_asyncio.from_url(self.url)
+        return self._client
+
+    async def add(self, group, consumer):
+        members = self.local.setdefault(group, set())
+        members.add(consumer)
+        if len(members) == 1:
+            if self._pubsub is None:
+                self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            await self._pubsub.subscribe(topic_name(group))
+            # listen() returns once nothing is subscribed; restart it.
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.ensure_future(self._read())
+
+    async def discard(self, group, consumer):
+        members = self.local.get(group)
+        if not members or consumer not in members:
+            return
+        members.discard(consumer)
+        if not members:
+            del self.local[group]
+            await self._pubsub.unsubscribe(topic_name(group))
+
+    async def publish(self, group, message):
+        await self.client.publish(topic_name(group), msgpack.packb(message))
+
+    async def _read(self):
+        while self.local:
+            try:
+                async for item in self._pubsub.listen():
+                    if item['type'] == 'message':
+                        await self._fan_out(item['channel'], item['data'])
+                return
+            except (RedisConnectionError, OSError):
+                # redis-py resubscribes to every topic when it reconnects.
+                logger.warning("Broadcast subscriber lost its Redis connection; retrying.")
+                await asyncio.sleep(1)
+
+    async def _fan_out(self, topic, data):
+        group = topic.decode()[len(TOPIC_PREFIX):]
+        message = msgpack.unpackb(data)
+        for consumer in list(self.local.get(group, ())):
+            try:
+                await consumer.dispatch(message)
+            except Exception:
+                logger.exception("Broadcast dispatch to %s failed", consumer.channel_name)
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """The running event loop's hub (Daphne has one loop per process)."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = BroadcastHub(BROADCAST_URL)
+    return hub
+
+
+# --- CONSUMER SIDE ---
+async def join_group(consumer, group):
+    if is_broadcast_group(group):
+        await get_hub().add(group, consumer)
+    else:
+        await consumer.channel_layer.group_add(group, consumer.channel_name)
+
+
+async def leave_group(consumer, group):
+    if is_broadcast_group(group):
+        await get_hub().discard(group, consumer)
+    else:
+        await consumer.channel_layer.group_discard(group, consumer.channel_name)
+
+
+# --- PUBLISHER SIDE ---
+async def send_to_group(channel_layer, group, message):
+    if is_broadcast_group(group):
+        await get_hub().publish(group, message)
+    else:
+        await channel_layer.group_send(group, message)
@@ -55,4 +55,55 @@ class IssueStatus(models.TextChoices):
     PENDING = "PENDING", "Pending"
     ACCEPTED = "ACCEPTED", "Accepted"
     DECLINED = "DECLINED", "Declined"
-    WFH_APPROVED = "WFH_APPROVED", "Work From Home Approved"
\ No newline at end of file
+    WFH_APPROVED = "WFH_APPROVED", "Work From Home Approved"
+
+class ActivityVerb(models.TextChoices):
+    CHAT_MESSAGE = "CHAT_MESSAGE", "Chat Message"
+    UPDATE_POSTED = "UPDATE_POSTED", "Update Posted"
+    RECOMMENDATION_POSTED = "RECOMMENDATION_POSTED", "Recommendation Posted"
+    DOCUMENT_UPLOADED = "DOCUMENT_UPLOADED", "Document Uploaded"
+    ATTACHMENT_ADDED = "ATTACHMENT_ADDED", "Attachment Added"
+    WORK_STATUS = "WORK_STATUS", "Work Status Changed"
+    TASK_COMPLETED = "TASK_COMPLETED", "Task Completed"
+    TASK_REOPENED = "TASK_REOPENED", "Task Reopened"
+    MEMBER_ADDED = "MEMBER_ADDED", "Member Added"
+    MEMBER_REMOVED = "MEMBER_REMOVED", "Member Removed"
+
+
+class NotificationKind(models.TextChoices):
+    GENERAL = "GENERAL", "General"
+    CHAT = "CHAT", "Chat"
+    UPDATE = "UPDATE", "Project Update"
+    TASK = "TASK", "Task"
+    MEETING = "MEETING", "Meeting"
+    ISSUE = "ISSUE", "Issue"
+    DEADLINE = "DEADLINE", "Deadline"
+    REMINDER = "REMINDER", "Reminder"
+
+
+class JobStatus(models.TextChoices):
+    PENDING = "PENDING", "Pending"
+    RUNNING = "RUNNING", "Running"
+    DONE = "DONE", "Done"
+    FAILED = "FAILED", "Failed"
+
+
+class ReminderKind(models.TextChoices):
+    PROJECT_DUE_SOON = "PROJECT_DUE_SOON", "Project Due Soon"
+    PROJECT_OVERDUE = "PROJECT_OVERDUE", "Project Overdue"
+    RECOMMENDATION_OVERDUE = "RECOMMENDATION_OVERDUE", "Recommendation Overdue"
+    DAILY_UPDATE_MISSING = "DAILY_UPDATE_MISSING", "Daily Update Missing"
+
+
+class UploadTarget(models.TextChoices):
+    PROJECT_DOCUMENT = "PROJECT_DOCUMENT", "Project Document"
+    UPDATE_ATTACHMENT = "UPDATE_ATTACHMENT", "Update Attachment"
+    ISSUE_ATTACHMENT = "ISSUE_ATTACHMENT", "Issue Attachment"
+    CHAT_FILE = "CHAT_FILE", "Chat File"
+
+
+class UploadStatus(models.TextChoices):
+    ACTIVE = "ACTIVE", "Receiving"
+    ASSEMBLING = "ASSEMBLING", "Assembling"
+    COMPLETE = "COMPLETE", "Complete"
+    FAILED = "FAILED", "Failed"
@@ -0,0 +1,148 @@
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DateField, Exists, Max, OuterRef, Q, Value
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User
+from .choices import NotificationKind, ReminderKind
+from .jobs import job_handler
+from .models import DailyUpdate, Notification, ReminderLedger
+from .notifications import deliver, dedupe_key_for
+
+WORKING_DAYS = getattr(settings, 'WORKING_DAYS', (0, 1, 2, 3, 4))  # Monday..Friday
+
+
+def is_working_day(day):
+    return day.weekday() in WORKING_DAYS
+
+
+def working_days(start, end):
+    """Working days from ``start`` to ``end`` inclusive, oldest first."""
+    days = []
+    day = start
+    while day <= end:
+        if is_working_day(day):
+            days.append(day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def expected_reporters():
+    return User.objects.filter(role=User.Role.EMPLOYEE, is_active=True)
+
+
+# --- DETECTION ---
+def missing_on(day):
+    """
+    Employees without a DailyUpdate on ``day``: one NOT EXISTS anti-join,
+    answered from the (date, user) index.
+    """
+    submitted = DailyUpdate.objects.filter(user=OuterRef('pk'), date=day)
+    return expected_reporters().filter(~Exists(submitted)).order_by('first_name', 'username')
+
+
+def missed_days(employees, days):
+    """
+    {user_id: [day, ...]} of the working ``days`` on which each of
+    ``employees`` has no DailyUpdate: the employees cross-joined with a
+    derived table of the days, filtered by one NOT EXISTS against the
+    (date, user) index, so only the misses come back.
+    """
+    missed = defaultdict(list)
+    if not days:
+        return missed
+    qn = connection.ops.quote_name
+    date_column = DailyUpdate._meta.get_field('date').column
+    user_column = DailyUpdate._meta.get_field('user').column
+    by_value = {connection.ops.adapt_datefield_value(day): day for day in days}
+    day_rows = ' UNION ALL '.join([f'SELECT %s AS {qn("day")}'] + ['SELECT %s'] * (len(days) - 1))
+    employee_sql, employee_params = employees.order_by().values('id').query.sql_with_params()
+    sql = (
+        f'SELECT e.{qn("id")}, d.{qn("day")} FROM ({employee_sql}) e CROSS JOIN ({day_rows}) d '
+        f'WHERE NOT EXISTS (SELECT 1 FROM {qn(DailyUpdate._meta.db_table)} u '
+        f'WHERE u.{qn(user_column)} = e.{qn("id")} AND u.{qn(date_column)} = d.{qn("day")})'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*employee_params, *by_value))
+        for user_id, value in cursor.fetchall():
+            day = value if isinstance(value, datetime.date) else by_value[str(value)]
+            missed[user_id].append(day)
+    for user_days in missed.values():
+        user_days.sort()
+    return missed
+
+
+def compliance_summary(start, end):
+    """
+    Per-employee daily update record over the working days in [start, end]:
+    one query for the employees (with their last update in the range) and
+    one for the days they missed, so the result grows with the misses, not
+    with every update posted. Rows are sorted worst first.
+    """
+    days = working_days(start, end)
+    employees = expected_reporters()
+    missed = missed_days(employees, days)
+    last_submitted = Max('daily_updates__date', filter=Q(daily_updates__date__in=days)) if days else Value(None, output_field=DateField())
+
+    rows = []
+    for employee in employees.annotate(last_submitted=last_submitted).order_by('first_name', 'username'):
+        missed_here = missed.get(employee.id, [])
+        # Working days since the last miss (all of them if none).
+        streak = len(days) - days.index(missed_here[-1]) - 1 if missed_here else len(days)
+        submitted = len(days) - len(missed_here)
+        rows.append({
+            'employee': employee,
+            'submitted': submitted,
+            'missed_days': missed_here,
+            'rate': round(100 * submitted / len(days)) if days else 100,
+            'streak': streak,
+            'last_submitted': employee.last_submitted,
+        })
+    rows.sort(key=lambda r: (r['rate'], r['streak']))
+    return days, rows
+
+
+# --- REMINDERS ---
+def remind_missing_updates(day=None, dry_run=False):
+    """
+    Notify everyone who has not posted their daily update for ``day``
+    (default today), once per person and day. Non-working days are skipped.
+    Returns the number of reminders created (or that would be).
+    """
+    day = day or timezone.localdate()
+    if not is_working_day(day):
+        return 0
+    missing = set(missing_on(day).values_list('id', flat=True))
+    already = set(
+        ReminderLedger.objects.filter(kind=ReminderKind.DAILY_UPDATE_MISSING, target_id=0, due_date=day, user_id__in=missing)
+        .values_list('user_id', flat=True)
+    )
+    to_remind = missing - already
+    if dry_run or not to_remind:
+        return len(to_remind)
+
+    message = f"You have not posted your daily update for {day:%d %b}"
+    link = reverse('add_daily_update')
+    now = timezone.now()
+    with transaction.atomic():
+        ReminderLedger.objects.bulk_create(
+            [ReminderLedger(kind=ReminderKind.DAILY_UPDATE_MISSING, target_id=0, due_date=day, user_id=uid)
+             for uid in to_remind],
+            ignore_conflicts=True,
+        )
+        delivered = deliver([
+            Notification(user_id=uid, message=message, link=link, dedupe_key=dedupe_key_for(message, link),
+                         kind=NotificationKind.REMINDER, last_event_at=now)
+            for uid in to_remind
+        ])
+    return len(delivered)
+
+
+@job_handler('daily_update_reminders')
+def run_daily_update_reminder_jobs(jobs):
+    remind_missing_updates()
+    return {}
@@ -1,51 +1,482 @@
+import asyncio
 import json
+import logging
+from django.conf import settings
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from .broadcast import join_group, leave_group
+from .notifications import (
+    decode_replay_cursor, get_latest_notification_id, get_latest_replay_cursor, get_missed_notifications,
+    get_unread_count, user_group_name,
+)
+from .realtime import (
+    project_group_name, MANAGEMENT_FIREHOSE_GROUP, presence_join, presence_leave, presence_refresh, PRESENCE_TTL,
+    PAYLOAD_MODES, DEFAULT_PAYLOAD_MODE, batch_frame, stream_frame, query_param,
+    register_socket, refresh_socket, release_socket,
+)
+from .subscriptions import authorize_project, issue_subscription_token, user_is_management
 
-class ProjectUpdateConsumer(AsyncWebsocketConsumer):
+logger = logging.getLogger(__name__)
+
+RESYNC_FRAME = json.dumps({'type': 'resync'})
+PING_FRAME = json.dumps({'type': 'ping'})
+
+# Close codes the clients know not to reconnect on.
+CLOSE_IDLE = 4000
+CLOSE_EVICTED = 4001
+CLOSE_FORBIDDEN = 4003
+
+NOTIFICATIONS_STREAM = 'notifications'
+FIREHOSE_STREAM = 'firehose'
+
+
+def pick_frame(frames, mode):
+    """The publisher's frame for ``mode`` (see pms.realtime.mode_frames), or None."""
+    frame = frames.get(mode)
+    if frame is None:
+        # Presence lagged behind this socket's join; any text frame will do.
+        frame = frames.get('full') or next((f for f in frames.values() if isinstance(f, str)), None)
+    return frame
+
+
+class SocketLifecycleMixin:
+    """
+    Heartbeats, idle eviction and the per-user socket cap, shared by every
+    consumer. Call ``start_lifecycle`` after accept and ``stop_lifecycle``
+    on disconnect; ``receive`` must call ``touch`` for any client frame.
+
+    The server sends {"type": "ping"} every heartbeat_interval; a client
+    that sends nothing (a pong or anything else) for idle_timeout is closed.
+    When a user opens more than max_sockets_per_user sockets their oldest
+    ones are closed with CLOSE_EVICTED.
+    """
+    heartbeat_interval = getattr(settings, 'REALTIME_HEARTBEAT_INTERVAL', 30)
+    idle_timeout = getattr(settings, 'REALTIME_IDLE_TIMEOUT', 90)
+    max_sockets_per_user = getattr(settings, 'REALTIME_MAX_SOCKETS_PER_USER', 8)
+
+    async def start_lifecycle(self):
+        self.last_seen = asyncio.get_running_loop().time()
+        self.socket_seq = None
+        if self.user.is_authenticated:
+            self.socket_seq, evicted = await register_socket(self.user.id, self.channel_name, self.max_sockets_per_user)
+            for channel in evicted:
+                await self.channel_layer.send(channel, {'type': 'socket.evict'})
+        self.heartbeat_task = asyncio.ensure_future(self.heartbeat())
+
+    async def stop_lifecycle(self):
+        if getattr(self, 'heartbeat_task', None) is None:
+            return
+        self.heartbeat_task.cancel()
+        if self.socket_seq is not None:
+            await release_socket(self.user.id, self.socket_seq)
+
+    def touch(self):
+        self.last_seen = asyncio.get_running_loop().time()
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if asyncio.get_running_loop().time() - self.last_seen > self.idle_timeout:
+                await self.close(code=CLOSE_IDLE)
+                return
+            await self.send(text_data=PING_FRAME)
+            if self.socket_seq is not None:
+                await refresh_socket(self.user.id, self.socket_seq)
+
+    async def socket_evict(self, event):
+        await self.close(code=CLOSE_EVICTED)
+
+
+class OutboxMixin:
+    """
+    A bounded per-socket queue with one writer task. Frames queued within
+    coalesce_window of each other go out as one batch frame; past
+    outbox_size the socket is told to resync or is disconnected, depending
+    on slow_consumer_policy.
+
+    The ASGI server buffers whatever we send without limit, so the queue
+    alone only catches bursts. The real measure is the client: once
+    max_unacked_bytes / 2 have been written since its last acknowledgement,
+    the writer sends {"type": "ping", "at": <bytes written>} and the client
+    answers {"type": "pong", "at": ...} when it gets there. With more than
+    max_unacked_bytes unacknowledged the writer stops, frames pile up in
+    the outbox and the overflow policy applies. Clients that never echo
+    ``at`` (older scripts) are limited by the outbox size alone.
+    """
+    coalesce_window = getattr(settings, 'REALTIME_COALESCE_WINDOW', 0.05)
+    outbox_size = getattr(settings, 'REALTIME_OUTBOX_SIZE', 100)
+    max_unacked_bytes = getattr(settings, 'REALTIME_MAX_UNACKED_BYTES', 1024 * 1024)
+    slow_consumer_policy = getattr(settings, 'REALTIME_SLOW_CONSUMER_POLICY', 'resync')
+
+    def start_outbox(self):
+        self.outbox = []
+        self.outbox_ready = asyncio.Event()
+        self.overflowed = False
+        self.sent_bytes = 0
+        self.acked_bytes = None  # None until the client first echoes a ping
+        self.probed_at = 0
+        self.client_caught_up = asyncio.Event()
+        self.writer_task = asyncio.ensure_future(self.drain_outbox())
+
+    def stop_outbox(self):
+        if getattr(self, 'writer_task', None) is not None:
+            self.writer_task.cancel()
+
+    async def enqueue(self, frame):
+        if self.overflowed:
+            return
+        if len(self.outbox) >= self.outbox_size:
+            logger.info("Socket %s fell %d events behind (%s bytes unacknowledged); policy=%s",
+                        self.channel_name, len(self.outbox), self.unacked_bytes(), self.slow_consumer_policy)
+            self.outbox.clear()
+            if self.slow_consumer_policy == 'disconnect':
+                await self.close(code=4008)
+                return
+            # Drop the backlog and tell the client to reload instead.
+            self.overflowed = True
+        else:
+            self.outbox.append(frame)
+        self.outbox_ready.set()
+
+    def unacked_bytes(self):
+        return None if self.acked_bytes is None else self.sent_bytes - self.acked_bytes
+
+    def record_ack(self, data):
+        """Handle a client {"type": "pong", "at": n}."""
+        at = data.get('at')
+        if not isinstance(at, int) or isinstance(at, bool) or not 0 <= at <= self.sent_bytes:
+            return
+        if self.acked_bytes is None or at > self.acked_bytes:
+            self.acked_bytes = at
+            self.client_caught_up.set()
+
+    async def wait_for_client(self):
+        while self.unacked_bytes() is not None and self.unacked_bytes() > self.max_unacked_bytes:
+            self.client_caught_up.clear()
+            await self.client_caught_up.wait()
+
+    async def write(self, frame):
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+        self.sent_bytes += len(frame)
+        if self.sent_bytes - max(self.acked_bytes or 0, self.probed_at) > self.max_unacked_bytes // 2:
+            self.probed_at = self.sent_bytes
+            await self.send(text_data=json.dumps({'type': 'ping', 'at': self.sent_bytes}))
+
+    async def drain_outbox(self):
+        # Wait for the first event, give the rest of the burst a moment to
+        # arrive, then send it all as one frame once the client has caught up.
+        while True:
+            await self.outbox_ready.wait()
+            await asyncio.sleep(self.coalesce_window)
+            await self.wait_for_client()
+            self.outbox_ready.clear()
+            frames, self.outbox = self.outbox, []
+            if self.overflowed:
+                self.overflowed = False
+                await self.send(text_data=RESYNC_FRAME)
+                continue
+            # A fallback text frame can land in a msgpack socket's outbox;
+            # batch each kind separately.
+            binary = [f for f in frames if isinstance(f, bytes)]
+            text = [f for f in frames if not isinstance(f, bytes)]
+            if binary:
+                await self.write(binary[0] if len(binary) == 1 else batch_frame(binary))
+            if text:
+                await self.write(text[0] if len(text) == 1 else batch_frame(text))
+
+
+class NotificationFeedMixin:
+    """
+    The notification protocol (token, unread count, replay), shared by the
+    dedicated socket and the multiplexed one. Consumers route outgoing
+    frames through ``send_feed_frame``.
+    """
+
+    async def send_feed_frame(self, text):
+        await self.send(text_data=text)
+
+    @staticmethod
+    def replay_position(cursor=None, last_id=None):
+        """Where a replay starts: a decoded ``cursor``, else a bare ``last_id`` (older tabs), else None."""
+        if cursor:
+            try:
+                return decode_replay_cursor(cursor)
+            except ValueError:
+                return None
+        if last_id is not None and str(last_id).isdigit():
+            return int(last_id)
+        return None
+
+    async def start_feed(self, cursor=None, last_id=None):
+        # A fresh token for the next reconnect, so it can skip the session
+        # lookup. Only a session-authenticated connect earns one: a token
+        # user is never re-checked, so renewing from a token would keep a
+        # logged-out or deactivated user subscribed for good. Once the token
+        # expires the tab falls back to its session.
+        if 'subscription' not in self.scope:
+            await self.send_feed_frame(json.dumps({'type': 'token', 'token': issue_subscription_token(self.user)}))
+
+        # A reconnecting tab sends the cursor of the last event it saw;
+        # replay what it missed, coalesced rows included.
+        after = self.replay_position(cursor, last_id)
+        if after is not None:
+            await self.send_replay(after)
+        else:
+            # Fresh tab: tell it where the inbox stands so a later reconnect can resume from there.
+            count = await database_sync_to_async(get_unread_count)(self.user.id)
+            latest = await database_sync_to_async(get_latest_notification_id)(self.user.id)
+            latest_cursor = await database_sync_to_async(get_latest_replay_cursor)(self.user.id)
+            await self.send_feed_frame(json.dumps({
+                'type': 'unread_count', 'unread_count': count, 'last_id': latest, 'cursor': latest_cursor,
+            }))
+
+    async def send_replay(self, after):
+        rows, has_more = await database_sync_to_async(get_missed_notifications)(self.user.id, after)
+        count = await database_sync_to_async(get_unread_count)(self.user.id)
+        await self.send_feed_frame(json.dumps({
+            'type': 'replay', 'notifications': rows, 'has_more': has_more, 'unread_count': count,
+        }))
+
+    async def send_notification(self, event):
+        await self.send_feed_frame(event['text'])
+
+    async def send_unread_count(self, event):
+        await self.send_feed_frame(event['text'])
+
+
+class ProjectUpdateConsumer(SocketLifecycleMixin, OutboxMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.project_id = self.scope['url_route']['kwargs']['project_id']
-        self.project_group_name = f'project_{self.project_id}_updates'
+        self.project_group_name = project_group_name(self.project_id)
         self.user = self.scope['user']
+        # ?mode=full|html|fields|msgpack; unknown values get the full frame.
+        self.mode = query_param(self.scope, 'mode', DEFAULT_PAYLOAD_MODE)
+        if self.mode not in PAYLOAD_MODES:
+            self.mode = DEFAULT_PAYLOAD_MODE
+
+        if not await authorize_project(self.scope, self.project_id):
+            await self.close(code=CLOSE_FORBIDDEN)
+            return
 
-        await self.channel_layer.group_add(self.project_group_name, self.channel_name)
+        await join_group(self, self.project_group_name)
+        await presence_join(self.project_group_name, self.mode)
         await self.accept()
+        self.start_outbox()
+        self.presence_task = asyncio.ensure_future(self.keep_presence())
+        await self.start_lifecycle()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.project_group_name, self.channel_name)
+        await self.stop_lifecycle()
+        if getattr(self, 'presence_task', None):
+            self.presence_task.cancel()
+            self.stop_outbox()
+            await presence_leave(self.project_group_name, self.mode)
+            await leave_group(self, self.project_group_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # Clients only send pongs here.
+        self.touch()
+        try:
+            data = json.loads(text_data or '{}')
+        except ValueError:
+            return
+        if isinstance(data, dict) and data.get('type') == 'pong':
+            self.record_ack(data)
+
+    async def keep_presence(self):
+        while True:
+            await asyncio.sleep(PRESENCE_TTL / 3)
+            await presence_refresh(self.project_group_name, self.mode)
 
     async def send_project_update(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'project_update',
-            'html': event.get('html'), 
-            'title': event.get('title'), 
-            'message': event.get('message'),
-            'sender_id': event['sender_id'],
-            'sender_username': event['sender_username'],
-            
-            # --- NEW: Pass Photo URL ---
-            'sender_profile_photo': event.get('sender_profile_photo'),
-            # ---------------------------
-
-            'timestamp': event['timestamp'],
-            'image_url': event.get('image_url'),
-            'file_url': event.get('file_url'),
-            'file_name': event.get('file_name'),
-        }))
+        frame = pick_frame(event['frames'], self.mode)
+        if frame is not None:
+            await self.enqueue(frame)
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(SocketLifecycleMixin, NotificationFeedMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope['user']
         if not self.user.is_authenticated:
-            await self.close()
+            await self.close(code=CLOSE_FORBIDDEN)
             return
-        self.room_group_name = f'user_{self.user.id}_notifications'
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        self.room_group_name = user_group_name(self.user.id)
+        await join_group(self, self.room_group_name)
         await self.accept()
+        await self.start_lifecycle()
+        await self.start_feed(query_param(self.scope, 'cursor'), query_param(self.scope, 'last_id'))
+
+    async def receive(self, text_data=None, bytes_data=None):
+        self.touch()
+        # "Load more" when the previous replay was capped.
+        try:
+            data = json.loads(text_data or '{}')
+        except ValueError:
+            return
+        after = self.replay_position(data.get('cursor'), data.get('after'))
+        if data.get('type') == 'replay' and after is not None:
+            await self.send_replay(after)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        # Unauthenticated sockets were closed before joining anything.
+        if not hasattr(self, 'room_group_name'):
+            return
+        await self.stop_lifecycle()
+        await leave_group(self, self.room_group_name)
 
-    async def send_notification(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'notification', 'message': event['message'], 'link': event['link']
-        }))
\ No newline at end of file
+class StreamConsumer(SocketLifecycleMixin, OutboxMixin, NotificationFeedMixin, AsyncWebsocketConsumer):
+    """
+    One socket per tab carrying any number of streams, joined and left with
+    control messages:
+
+        {"type": "subscribe", "stream": "notifications", "cursor": "1760000000000000_41"}
+        {"type": "subscribe", "stream": "project:7", "mode": "fields", "token": "..."}
+        {"type": "subscribe", "stream": "firehose", "mode": "fields"}   (management only)
+        {"type": "unsubscribe", "stream": "project:7"}
+        {"type": "replay", "cursor": "1760000000000000_41"}
+
+    Events come back as {"stream": ..., "event": <the same frame the
+    dedicated sockets send>}, built from the publishers' pre-encoded frames
+    without decoding them. Streams map onto the existing groups, so the
+    publishers are shared with ``NotificationConsumer`` and
+    ``ProjectUpdateConsumer``.
+    """
+
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close(code=CLOSE_FORBIDDEN)
+            return
+        self.projects = {}  # project id -> payload mode
+        self.firehose_mode = None
+        self.notifications = False
+        await self.accept()
+        self.start_outbox()
+        self.presence_task = asyncio.ensure_future(self.keep_presence())
+        await self.start_lifecycle()
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'presence_task', None) is None:
+            return
+        await self.stop_lifecycle()
+        self.presence_task.cancel()
+        self.stop_outbox()
+        for project_id in list(self.projects):
+            await self.leave_project(project_id)
+        if self.firehose_mode:
+            await self.leave_firehose()
+        if self.notifications:
+            await leave_group(self, user_group_name(self.user.id))
+
+    async def receive(self, text_data=None, bytes_data=None):
+        self.touch()
+        try:
+            data = json.loads(text_data or '{}')
+        except ValueError:
+            return
+        kind, stream = data.get('type'), str(data.get('stream', ''))
+        if kind == 'pong':
+            self.record_ack(data)
+        elif kind == 'subscribe':
+            await self.subscribe(stream, data)
+        elif kind == 'unsubscribe':
+            await self.unsubscribe(stream)
+        elif kind == 'replay' and self.notifications:
+            after = self.replay_position(data.get('cursor'), data.get('after'))
+            if after is not None:
+                await self.send_replay(after)
+
+    async def subscribe(self, stream, data):
+        if stream == NOTIFICATIONS_STREAM:
+            if not self.notifications:
+                self.notifications = True
+                await join_group(self, user_group_name(self.user.id))
+            await self.start_feed(data.get('cursor'), data.get('last_id'))
+            return
+
+        mode = data.get('mode') if data.get('mode') in PAYLOAD_MODES else DEFAULT_PAYLOAD_MODE
+        if stream == FIREHOSE_STREAM:
+            if not await database_sync_to_async(user_is_management)(self.user.id):
+                await self.send_control('error', stream, reason='forbidden')
+                return
+            if self.firehose_mode:
+                await self.leave_firehose()
+            await join_group(self, MANAGEMENT_FIREHOSE_GROUP)
+            await presence_join(MANAGEMENT_FIREHOSE_GROUP, mode)
+            self.firehose_mode = mode
+            await self.send_control('subscribed', stream)
+            return
+
+        project_id = self.project_stream_id(stream)
+        if project_id is None:
+            await self.send_control('error', stream, reason='unknown stream')
+            return
+        if not await authorize_project(self.scope, project_id, token=data.get('token')):
+            await self.send_control('error', stream, reason='forbidden')
+            return
+        if project_id in self.projects:
+            await self.leave_project(project_id)
+        group = project_group_name(project_id)
+        await join_group(self, group)
+        await presence_join(group, mode)
+        self.projects[project_id] = mode
+        await self.send_control('subscribed', stream)
+
+    async def unsubscribe(self, stream):
+        if stream == NOTIFICATIONS_STREAM and self.notifications:
+            self.notifications = False
+            await leave_group(self, user_group_name(self.user.id))
+        elif stream == FIREHOSE_STREAM and self.firehose_mode:
+            await self.leave_firehose()
+        else:
+            project_id = self.project_stream_id(stream)
+            if project_id in self.projects:
+                await self.leave_project(project_id)
+        await self.send_control('unsubscribed', stream)
+
+    async def leave_project(self, project_id):
+        group = project_group_name(project_id)
+        await presence_leave(group, self.projects.pop(project_id))
+        await leave_group(self, group)
+
+    async def leave_firehose(self):
+        await presence_leave(MANAGEMENT_FIREHOSE_GROUP, self.firehose_mode)
+        self.firehose_mode = None
+        await leave_group(self, MANAGEMENT_FIREHOSE_GROUP)
+
+    @staticmethod
+    def project_stream_id(stream):
+        prefix, _, pid = stream.partition(':')
+        return int(pid) if prefix == 'project' and pid.isdigit() else None
+
+    async def send_control(self, kind, stream, **extra):
+        await self.send(text_data=json.dumps(dict({'type': kind, 'stream': stream}, **extra)))
+
+    async def keep_presence(self):
+        while True:
+            await asyncio.sleep(PRESENCE_TTL / 3)
+            for project_id, mode in list(self.projects.items()):
+                await presence_refresh(project_group_name(project_id), mode)
+            if self.firehose_mode:
+                await presence_refresh(MANAGEMENT_FIREHOSE_GROUP, self.firehose_mode)
+
+    async def send_feed_frame(self, text):
+        await self.send(text_data=stream_frame(NOTIFICATIONS_STREAM, text))
+
+    async def send_project_update(self, event):
+        mode = self.projects.get(event.get('project_id'))
+        if mode is None:
+            # Unsubscribed while the event was in flight.
+            return
+        frame = pick_frame(event['frames'], mode)
+        if frame is not None:
+            await self.enqueue(stream_frame(f"project:{event['project_id']}", frame))
+
+    async def send_firehose_update(self, event):
+        if self.firehose_mode is None:
+            return
+        frame = pick_frame(event['frames'], self.firehose_mode)
+        if frame is not None:
+            await self.enqueue(stream_frame(FIREHOSE_STREAM, frame, project_id=event['project_id']))
@@ -1,7 +1,7 @@
-from .models import Notification
+from .notifications import get_unread_count
+from .subscriptions import issue_subscription_token
 
 def unread_notifications_count(request):
     if request.user.is_authenticated:
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
-        return {'unread_count': count}
+        return {'unread_count': get_unread_count(request.user.id), 'ws_token': issue_subscription_token(request.user)}
     return {'unread_count': 0}
\ No newline at end of file
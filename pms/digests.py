@@ -0,0 +1,197 @@
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Count, F, Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User
+from .choices import IssueStatus, IssueSubject, ProjectUpdateStatus, WorkStatus
+from .jobs import job_handler
+from .models import DigestState, Issue, Notification, Project, ProjectUpdate
+
+SITE_URL = getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000').rstrip('/')
+DIGEST_MAX_DAYS = getattr(settings, 'DIGEST_MAX_DAYS', 7)
+DIGEST_SECTION_LIMIT = getattr(settings, 'DIGEST_SECTION_LIMIT', 20)
+DIGEST_CHUNK_SIZE = getattr(settings, 'DIGEST_CHUNK_SIZE', 200)
+DIGEST_MIN_INTERVAL_HOURS = getattr(settings, 'DIGEST_MIN_INTERVAL_HOURS', 12)
+
+
+def site_link(name, *args):
+    return SITE_URL + reverse(name, args=args)
+
+
+def digest_recipients():
+    """Management and team heads with an email address, with the end of their last digest."""
+    return (
+        User.objects.filter(is_active=True)
+        .exclude(email='')
+        .filter(Q(role=User.Role.MANAGEMENT) | Q(headed_projects__isnull=False))
+        .distinct()
+        .annotate(last_digest_at=F('digest_state__last_sent_at'))
+        .order_by('id')
+    )
+
+
+# --- COLLECTING ---
+# Each query below covers a whole chunk of recipients; what a recipient
+# gets is then picked out of the results in memory.
+def build_digests(users, now):
+    """{user_id: [section, ...]} for ``users``; a section is {'title', 'items', 'more'}."""
+    floor = now - datetime.timedelta(days=DIGEST_MAX_DAYS)
+    first = now - datetime.timedelta(days=1)
+    since = {u.id: max(u.last_digest_at or first, floor) for u in users}
+    window = min(since.values())
+    managers = {u.id for u in users if u.role == User.Role.MANAGEMENT}
+
+    headed = defaultdict(set)
+    for project_id, head_id in Project.objects.filter(team_head_id__in=since).values_list('id', 'team_head_id'):
+        headed[head_id].add(project_id)
+    # Management sees every project; a chunk of team heads only needs theirs.
+    scope = None if managers else set().union(*headed.values())
+
+    def scoped(queryset, field='project_id'):
+        return queryset if scope is None else queryset.filter(**{f"{field}__in": scope})
+
+    posts = list(
+        scoped(ProjectUpdate.objects.filter(created_at__gte=window, created_at__lt=now))
+        .exclude(Q(title__isnull=True) | Q(title=''))  # untitled rows are chat messages
+        .order_by('-created_at')
+        .values('project_id', 'project__name', 'category', 'title', 'user__username', 'created_at')
+    )
+    today = timezone.localdate(now)
+    overdue_recommendations = list(
+        scoped(ProjectUpdate.objects.filter(category='RECOMMENDATION', end_date__lt=today))
+        .exclude(update_status=ProjectUpdateStatus.COMPLETE)
+        .order_by('end_date')
+        .values('project_id', 'project__name', 'title', 'end_date')
+    )
+    overdue_projects = list(
+        scoped(Project.objects.filter(end_date__lt=today), 'id')
+        .exclude(project_status_update=WorkStatus.COMPLETE)
+        .order_by('end_date')
+        .values('id', 'name', 'end_date')
+    )
+    issues = list(
+        Issue.objects.filter(created_at__gte=window, created_at__lt=now)
+        .order_by('-created_at')
+        .values('id', 'subject', 'status', 'user__username', 'created_at')
+    ) if managers else []
+    unread = dict(
+        Notification.objects.filter(user_id__in=since, is_read=False)
+        .order_by().values('user_id').annotate(n=Count('id')).values_list('user_id', 'n')
+    )
+
+    digests = {}
+    for user in users:
+        start = since[user.id]
+        if user.id in managers:
+            mine = lambda project_id: True
+        else:
+            mine = headed[user.id].__contains__
+        sections = [
+            section("New updates", [
+                item(p['title'], f"{p['project__name']} · {p['user__username']}", site_link('project_updates', p['project_id']))
+                for p in posts if p['category'] == 'UPDATE' and p['created_at'] >= start and mine(p['project_id'])
+            ]),
+            section("New recommendations", [
+                item(p['title'], f"{p['project__name']} · {p['user__username']}", site_link('project_detail', p['project_id']))
+                for p in posts if p['category'] == 'RECOMMENDATION' and p['created_at'] >= start and mine(p['project_id'])
+            ]),
+            section("New issues", [
+                item(IssueSubject(i['subject']).label, f"{i['user__username']} · {IssueStatus(i['status']).label}",
+                     site_link('issue_detail', i['id']))
+                for i in issues if i['created_at'] >= start
+            ] if user.id in managers else []),
+            section("Overdue", [
+                item(p['name'], f"project due {p['end_date']:%d %b %Y}", site_link('project_detail', p['id']))
+                for p in overdue_projects if mine(p['id'])
+            ] + [
+                item(r['title'], f"{r['project__name']} · recommendation due {r['end_date']:%d %b %Y}",
+                     site_link('project_detail', r['project_id']))
+                for r in overdue_recommendations if mine(r['project_id'])
+            ]),
+        ]
+        sections = [s for s in sections if s['items']]
+        if sections and unread.get(user.id):
+            sections.append(section("Unread notifications", [
+                item(f"{unread[user.id]} unread", "in your inbox", site_link('notification_list')),
+            ]))
+        digests[user.id] = sections
+    return digests
+
+
+def section(title, items):
+    return {'title': title, 'items': items[:DIGEST_SECTION_LIMIT], 'more': max(len(items) - DIGEST_SECTION_LIMIT, 0)}
+
+
+def item(title, detail, url):
+    return {'title': title, 'detail': detail, 'url': url}
+
+
+# --- SENDING ---
+def render_digest(user, sections, now):
+    context = {'user': user, 'sections': sections, 'date': timezone.localdate(now), 'site_url': SITE_URL}
+    message = EmailMultiAlternatives(
+        f"Savithru PMS digest for {context['date']:%d %b %Y}",
+        render_to_string('pms/emails/digest.txt', context),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+    message.attach_alternative(render_to_string('pms/emails/digest.html', context), 'text/html')
+    return message
+
+
+def send_digests(now=None, dry_run=False):
+    """
+    Send everyone their digest, DIGEST_CHUNK_SIZE recipients at a time over
+    one SMTP connection per chunk. A recipient's window moves forward as
+    soon as their own message has gone out, so a failed run is simply
+    repeated; anyone who got a digest in the last DIGEST_MIN_INTERVAL_HOURS
+    is skipped, so the repeat mails nobody twice.
+    Returns (sent, empty).
+    """
+    now = now or timezone.now()
+    recent = now - datetime.timedelta(hours=DIGEST_MIN_INTERVAL_HOURS)
+    recipients = digest_recipients().exclude(digest_state__last_sent_at__gt=recent)
+    sent = empty = 0
+    last_id = 0
+    while True:
+        users = list(recipients.filter(id__gt=last_id)[:DIGEST_CHUNK_SIZE])
+        if not users:
+            break
+        last_id = users[-1].id
+        digests = build_digests(users, now)
+        pending = [(u, render_digest(u, digests[u.id], now)) for u in users if digests[u.id]]
+        empty += len(users) - len(pending)
+        if dry_run:
+            sent += len(pending)
+            continue
+        # Nothing to send means nothing to repeat either.
+        mark_sent([u for u in users if not digests[u.id]], now)
+        if pending:
+            with get_connection(fail_silently=False) as connection:
+                for user, message in pending:
+                    sent += connection.send_messages([message]) or 0
+                    mark_sent([user], now)
+    return sent, empty
+
+
+def mark_sent(users, now):
+    """Move the digest window of ``users`` up to ``now``."""
+    known = [u.id for u in users if u.last_digest_at is not None]
+    if known:
+        DigestState.objects.filter(user_id__in=known).update(last_sent_at=now)
+    new = [DigestState(user_id=u.id, last_sent_at=now) for u in users if u.last_digest_at is None]
+    if new:
+        DigestState.objects.bulk_create(new, ignore_conflicts=True)
+
+
+@job_handler('digest')
+def run_digest_jobs(jobs):
+    # Several queued digest jobs still mean one run.
+    send_digests()
+    return {}
@@ -44,7 +44,7 @@ class ProjectDocumentForm(forms.ModelForm):
         required=False
     )
     document = forms.FileField(
-        widget=forms.ClearableFileInput(attrs={'class': 'form-control'}),
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'data-chunked-file': ''}),
         required=True
     )
     class Meta:
@@ -128,7 +128,7 @@ class ProjectRecommendationForm(forms.ModelForm):
 # --- ATTACHMENT FORMSET (Used by both) ---
 class ProjectUpdateAttachmentForm(forms.ModelForm):
     file = forms.FileField(
-        widget=forms.ClearableFileInput(attrs={'class': 'form-control'}),
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'data-chunked-file': ''}),
         required=True,
         label=False
     )
@@ -170,7 +170,7 @@ class StructuredUpdateForm(forms.ModelForm):
 
 class ProjectUpdateAttachmentForm(forms.ModelForm):
     file = forms.FileField(
-        widget=forms.ClearableFileInput(attrs={'class': 'form-control'}),
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'data-chunked-file': ''}),
         required=True,
         label=False
     )
@@ -281,7 +281,7 @@ class IssueForm(forms.ModelForm):
         label="Description"
     )
     attachment = forms.FileField(
-        widget=forms.ClearableFileInput(attrs={'class': 'form-control'}),
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'data-chunked-file': ''}),
         required=False
     )
     class Meta:
@@ -0,0 +1,205 @@
+import contextlib
+import contextvars
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .jobs import enqueue, job_handler
+
+logger = logging.getLogger(__name__)
+
+# Width of each variant (so srcset "w" descriptors are exact); an image is
+# only scaled down, so a narrow original gets fewer variants and templates
+# fall back to the original.
+IMAGE_VARIANT_SIZES = tuple(sorted(getattr(settings, 'IMAGE_VARIANT_SIZES', (64, 128, 256, 512))))
+IMAGE_VARIANT_FORMAT = getattr(settings, 'IMAGE_VARIANT_FORMAT', 'WEBP')
+IMAGE_VARIANT_QUALITY = getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)
+VARIANT_DIR = 'variants'
+# Which variants exist is cached for a day once generated; "none yet" (the
+# job has not run) only for a minute.
+VARIANTS_TIMEOUT = 60 * 60 * 24
+PENDING_TIMEOUT = 60
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+
+def variant_name(name, size):
+    """Storage name of the ``size`` variant of the image stored as ``name``."""
+    return posixpath.join(VARIANT_DIR, f"{name}.{size}.{EXTENSIONS[IMAGE_VARIANT_FORMAT]}")
+
+
+def variants_cache_key(name):
+    return "pms:variants:" + hashlib.sha1(name.encode()).hexdigest()
+
+
+# Answers already looked up during the current request (the memo is opened
+# by pms.middleware.ImageVariantMemoMiddleware), so a page showing the same
+# avatar fifty times asks the cache once, and a view can fetch a whole
+# page's worth with one get_many (prefetch_variants).
+_memo = contextvars.ContextVar('pms_image_variants', default=None)
+
+
+@contextlib.contextmanager
+def variant_memo():
+    token = _memo.set({})
+    try:
+        yield
+    finally:
+        _memo.reset(token)
+
+
+def prefetch_variants(images):
+    """
+    Look up the variants of every image in ``images`` (file fields or
+    storage names) with one cache.get_many. Only useful inside a memo.
+    """
+    memo = _memo.get()
+    if memo is None:
+        return
+    keys = {variants_cache_key(name): name for name in {getattr(i, 'name', i) for i in images} if name and name not in memo}
+    if not keys:
+        return
+    found = cache.get_many(list(keys))
+    # A name missing from the cache is left to available_variants.
+    memo.update((keys[key], sizes) for key, sizes in found.items())
+
+
+def available_variants(name):
+    """
+    Sizes generated for ``name``, smallest first. Answered from the memo or
+    the cache; on a miss the storage is asked once per size and the answer
+    cached.
+    """
+    if not name:
+        return ()
+    memo = _memo.get()
+    if memo is not None and name in memo:
+        return memo[name]
+    key = variants_cache_key(name)
+    sizes = cache.get(key)
+    if sizes is None:
+        sizes = tuple(s for s in IMAGE_VARIANT_SIZES if default_storage.exists(variant_name(name, s)))
+        cache.set(key, sizes, VARIANTS_TIMEOUT if sizes else PENDING_TIMEOUT)
+    if memo is not None:
+        memo[name] = sizes
+    return sizes
+
+
+def forget_variants(name):
+    memo = _memo.get()
+    if memo is not None:
+        memo.pop(name, None)
+
+
+def needs_variants(name):
+    """
+    True for an image nobody has generated (or is generating) variants
+    for yet. A small original that needs none stays cached as such.
+    """
+    return bool(name) and cache.get(variants_cache_key(name)) is None and not available_variants(name)
+
+
+def variant_url(field, size):
+    """
+    URL of the smallest variant of image ``field`` at least ``size`` pixels
+    wide, or of the original when there is none (not generated yet, or the
+    original is smaller than that anyway).
+    """
+    if not field:
+        return ''
+    for s in available_variants(field.name):
+        if s >= size:
+            return default_storage.url(variant_name(field.name, s))
+    return field.url
+
+
+def variant_srcset(field):
+    """A ``srcset`` value listing every variant of ``field`` by width ("" if none)."""
+    if not field:
+        return ''
+    return ", ".join(
+        f"{default_storage.url(variant_name(field.name, s))} {s}w" for s in available_variants(field.name)
+    )
+
+
+def variant_image_set(field, size):
+    """
+    ``[(url, density), ...]`` for showing ``field`` ``size`` px wide: the
+    1x variant, plus a 2x one when a larger variant exists.
+    """
+    if not field:
+        return []
+    candidates = [(variant_url(field, size), 1), (variant_url(field, size * 2), 2)]
+    return [c for i, c in enumerate(candidates) if i == 0 or c[0] != candidates[0][0]]
+
+
+# --- GENERATING ---
+def generate_variants(name):
+    """Write the variants of the stored image ``name``. Returns the sizes written."""
+    with default_storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if IMAGE_VARIANT_FORMAT == 'JPEG':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    written = []
+    width, height = image.size
+    for size in IMAGE_VARIANT_SIZES:
+        if width <= size:
+            break
+        copy = image.resize((size, max(round(height * size / width), 1)), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        copy.save(buffer, IMAGE_VARIANT_FORMAT, quality=IMAGE_VARIANT_QUALITY)
+        target = variant_name(name, size)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        default_storage.save(target, ContentFile(buffer.getvalue()))
+        written.append(size)
+    cache.set(variants_cache_key(name), tuple(written), VARIANTS_TIMEOUT)
+    forget_variants(name)
+    return written
+
+
+def delete_variants(name):
+    for size in IMAGE_VARIANT_SIZES:
+        default_storage.delete(variant_name(name, size))
+    cache.delete(variants_cache_key(name))
+    forget_variants(name)
+
+
+def delete_variants_later(name):
+    """Drop the variants of ``name`` (replaced or deleted) once the current transaction commits."""
+    if name:
+        transaction.on_commit(lambda: delete_variants(name))
+
+
+def generate_variants_later(name):
+    """Queue variant generation for ``name`` once the current transaction commits."""
+    if name:
+        transaction.on_commit(lambda: enqueue('image_variants', {'name': name}))
+
+
+@job_handler('image_variants')
+def run_image_variant_jobs(jobs):
+    failures = {}
+    for name in {job.payload['name'] for job in jobs}:
+        try:
+            generate_variants(name)
+        except FileNotFoundError:
+            pass  # replaced or deleted since; nothing to do
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+            logger.warning("No variants for %s: %s", name, e)
+        except Exception as e:
+            failures.update({job.id: e for job in jobs if job.payload['name'] == name})
+    return failures
@@ -0,0 +1,238 @@
+import datetime
+import logging
+import os
+import random
+import socket
+import threading
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .choices import JobStatus
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_BATCH_SIZE = getattr(settings, 'JOB_BATCH_SIZE', 50)
+JOB_LOCK_TIMEOUT = getattr(settings, 'JOB_LOCK_TIMEOUT', 10 * 60)
+JOB_HEARTBEAT_INTERVAL = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', JOB_LOCK_TIMEOUT / 4)
+JOB_MAX_ATTEMPTS = getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+JOB_RETRY_BACKOFF = getattr(settings, 'JOB_RETRY_BACKOFF', 30)
+JOB_RETRY_BACKOFF_MAX = getattr(settings, 'JOB_RETRY_BACKOFF_MAX', 60 * 60)
+
+
+# --- REGISTRY ---
+# A handler takes the claimed jobs of its kind (one batch) and returns
+# {job_id: error} for the ones that failed; raising fails the whole batch.
+_handlers = {}
+
+
+def job_handler(kind):
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload, run_at=None, max_attempts=None):
+    """
+    Add a job. Call it inside the transaction that makes the job necessary:
+    the row commits (or rolls back) with it and the worker picks it up after.
+    """
+    return Job.objects.create(
+        kind=kind, payload=payload, run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+    )
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# --- WORKER SIDE ---
+def claim_jobs(worker_id, batch_size=JOB_BATCH_SIZE, kinds=None):
+    """
+    Lock up to ``batch_size`` due jobs and mark them RUNNING for this worker.
+
+    SKIP LOCKED lets several workers claim side by side without waiting on
+    each other's rows; the lock is only held for this short transaction, not
+    while the jobs run. A live worker keeps refreshing locked_at (see
+    Heartbeat), so RUNNING jobs locked longer than JOB_LOCK_TIMEOUT belong
+    to a dead worker and are claimed again.
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=JOB_LOCK_TIMEOUT)
+    due = Job.objects.filter(
+        Q(status=JobStatus.PENDING, run_at__lte=now) | Q(status=JobStatus.RUNNING, locked_at__lt=stale)
+    )
+    if kinds:
+        due = due.filter(kind__in=kinds)
+    with transaction.atomic():
+        jobs = list(due.select_for_update(skip_locked=True).order_by('run_at', 'id')[:batch_size])
+        if jobs:
+            Job.objects.filter(id__in=[j.id for j in jobs]).update(
+                status=JobStatus.RUNNING, locked_at=now, locked_by=worker_id, attempts=F('attempts') + 1,
+            )
+    for job in jobs:
+        job.attempts += 1
+        job.status, job.locked_at, job.locked_by = JobStatus.RUNNING, now, worker_id
+    return jobs
+
+
+class Heartbeat:
+    """
+    Refresh locked_at on claimed jobs every JOB_HEARTBEAT_INTERVAL seconds
+    while their handler runs, from a side thread with its own connection.
+    A batch that finishes sooner never touches the database here.
+    """
+
+    def __init__(self, jobs, interval=None):
+        self.ids = [job.id for job in jobs]
+        self.worker_id = jobs[0].locked_by if jobs else ''
+        self.interval = interval or JOB_HEARTBEAT_INTERVAL
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.beat, daemon=True)
+
+    def beat(self):
+        try:
+            while not self.stopping.wait(self.interval):
+                try:
+                    Job.objects.filter(id__in=self.ids, status=JobStatus.RUNNING, locked_by=self.worker_id).update(
+                        locked_at=timezone.now(),
+                    )
+                except Exception:
+                    logger.exception("Job heartbeat failed")
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        if self.ids:
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopping.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+
+def mark_done(job):
+    """
+    Record one job of a batch as done straight away. Handlers with side
+    effects (an email sent) call it per job, so if the batch is cut short
+    and reclaimed only the unfinished jobs run again.
+    """
+    Job.objects.filter(id=job.id, status=JobStatus.RUNNING, locked_by=job.locked_by).update(
+        status=JobStatus.DONE, finished_at=timezone.now(), last_error='',
+    )
+    job.status = JobStatus.DONE
+
+
+def retry_delay(attempts):
+    delay = min(JOB_RETRY_BACKOFF * 2 ** (attempts - 1), JOB_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def run_jobs(jobs):
+    """
+    Run claimed jobs, one handler call per kind, and record the outcome of
+    each. Outcomes are only written while this worker still holds the job.
+    """
+    by_kind = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+
+    failures = {}
+    with Heartbeat(jobs):
+        for kind, batch in by_kind.items():
+            handler = _handlers.get(kind)
+            if handler is None:
+                failures.update({job.id: f"No handler for job kind {kind!r}" for job in batch})
+                continue
+            try:
+                failures.update(handler(batch) or {})
+            except Exception as e:
+                logger.exception("Job batch %s failed", kind)
+                failures.update({job.id: e for job in batch if job.status != JobStatus.DONE})
+
+    now = timezone.now()
+    held = Job.objects.filter(status=JobStatus.RUNNING, locked_by=jobs[0].locked_by) if jobs else Job.objects.none()
+    done = [job.id for job in jobs if job.id not in failures]
+    if done:
+        held.filter(id__in=done).update(status=JobStatus.DONE, finished_at=now, last_error='')
+    for job in jobs:
+        if job.id not in failures:
+            continue
+        error = str(failures[job.id])[:2000]
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s (%s) failed for good: %s", job.id, job.kind, error)
+            held.filter(id=job.id).update(status=JobStatus.FAILED, finished_at=now, last_error=error)
+        else:
+            held.filter(id=job.id).update(
+                status=JobStatus.PENDING, locked_at=None, locked_by='', last_error=error,
+                run_at=now + datetime.timedelta(seconds=retry_delay(job.attempts)),
+            )
+    return len(done), len(failures)
+
+
+def run_pending(worker_id=None, batch_size=JOB_BATCH_SIZE, kinds=None):
+    """Claim and run one batch. Returns (succeeded, failed); (0, 0) means the queue was empty."""
+    jobs = claim_jobs(worker_id or default_worker_id(), batch_size, kinds)
+    if not jobs:
+        return 0, 0
+    return run_jobs(jobs)
+
+
+# --- EMAIL ---
+def send_email_later(subject, body, recipients, html=None, from_email=None):
+    """Queue one email (all ``recipients`` on the To line, as send_mail does)."""
+    return enqueue('email', {
+        'subject': subject, 'body': body, 'to': list(recipients),
+        'html': html, 'from_email': from_email,
+    })
+
+
+@job_handler('email')
+def send_queued_emails(jobs):
+    """
+    Send the batch over one SMTP connection instead of one handshake per
+    message. Each job is marked done as its message goes out, so a batch
+    reclaimed after a crash does not resend what was already delivered.
+    """
+    failures = {}
+    with get_connection(fail_silently=False) as connection:
+        for job in jobs:
+            p = job.payload
+            message = EmailMultiAlternatives(
+                p['subject'], p['body'], p.get('from_email') or settings.DEFAULT_FROM_EMAIL, p['to'],
+                connection=connection,
+            )
+            if p.get('html'):
+                message.attach_alternative(p['html'], 'text/html')
+            try:
+                message.send()
+            except Exception as e:
+                failures[job.id] = e
+            else:
+                mark_done(job)
+    return failures
+
+
+# --- MANAGEMENT COMMANDS ---
+@job_handler('command')
+def run_queued_commands(jobs):
+    """Run ``manage.py <name>`` for each job; payload is {'name', 'args', 'options'}."""
+    from django.core.management import call_command
+
+    failures = {}
+    for job in jobs:
+        p = job.payload
+        try:
+            call_command(p['name'], *p.get('args', []), **p.get('options', {}))
+        except Exception as e:
+            logger.exception("Queued command %s failed", p.get('name'))
+            failures[job.id] = e
+    return failures
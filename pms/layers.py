@@ -0,0 +1,229 @@
+import asyncio
+import atexit
+import glob
+import logging
+import os
+import random
+import socket
+import string
+import time
+
+import msgpack
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+
+logger = logging.getLogger(__name__)
+
+
+class UnixSocketChannelLayer(InMemoryChannelLayer):
+    """
+    Channel layer for several Daphne/worker processes on one host, with no
+    Redis round trip.
+
+    Every process that receives binds a Unix datagram socket named after
+    itself in ``path``; its specific channels are named after it too, so a
+    send() goes straight to the owning process. Group membership is kept
+    by each process for its own channels and group_send() writes one
+    datagram per live process, which delivers to its local members (the
+    same fan-out shape as pms.broadcast, without the broker).
+
+    Messages are msgpack-encoded and must fit in one datagram
+    (``max_message`` bytes). A sender waits up to ``send_timeout`` for a
+    backed-up peer and then drops the message, like a full channel.
+    """
+
+    extensions = ["groups", "flush"]
+    READ_BATCH = 32
+
+    def __init__(self, path='/tmp/pms-channels', max_message=256 * 1024, peer_refresh=1.0, send_timeout=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = path
+        self.max_message = max_message
+        self.peer_refresh = peer_refresh
+        self.send_timeout = send_timeout
+        self.node = "%d-%s" % (os.getpid(), "".join(random.choice(string.ascii_lowercase) for _ in range(4)))
+        self._loop = None
+        self._recv_sock = None
+        self._send_socks = {}
+        self._peers = []
+        self._peers_at = 0.0
+
+    # --- naming ---
+    def socket_path(self, node):
+        return os.path.join(self.path, f"{node}.sock")
+
+    def owner(self, channel):
+        """The node a specific channel lives on, or None for plain channels."""
+        if "!" not in channel:
+            return None
+        return channel.split("!", 1)[0].rsplit(".", 1)[-1]
+
+    async def new_channel(self, prefix="specific"):
+        # A channel made here is received here.
+        self._start_receiving()
+        return "%s.%s!%s" % (
+            prefix.rstrip("."), self.node,
+            "".join(random.choice(string.ascii_letters) for _ in range(12)),
+        )
+
+    # --- sending ---
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        node = self.owner(channel)
+        if self._is_receiving_loop() and node in (None, self.node):
+            return await super().send(channel, message)
+        await self._post(node or self.node, ["c", channel, message])
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        assert self.valid_group_name(group), "Invalid group name"
+        local = self._is_receiving_loop()
+        if local:
+            self._clean_expired()
+            for channel in list(self.groups.get(group, {})):
+                try:
+                    await super().send(channel, message)
+                except ChannelFull:
+                    pass
+        packet = self._encode(["g", group, message])
+        for node in self._live_peers():
+            if not (local and node == self.node):
+                await self._post(node, packet)
+
+    def _encode(self, item):
+        data = msgpack.packb(item)
+        if len(data) > self.max_message:
+            raise ValueError(f"Channel layer message of {len(data)} bytes exceeds max_message ({self.max_message})")
+        return data
+
+    async def _post(self, node, item):
+        data = item if isinstance(item, bytes) else self._encode(item)
+        try:
+            sock = self._peer_socket(node)
+            # The peer's queue may be full: give it up to send_timeout to
+            # drain. Polled rather than loop.sock_sendall(), which allows only
+            # one waiting sender per socket and event loop.
+            deadline = time.monotonic() + self.send_timeout
+            pause = 0.001
+            while True:
+                try:
+                    sock.send(data)
+                    return
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        logger.warning("Channel layer peer %s is backed up; dropping a message.", node)
+                        return
+                    await asyncio.sleep(pause)
+                    pause = min(pause * 2, 0.02)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # The process is gone; forget its socket.
+            self._forget_peer(node)
+
+    def _peer_socket(self, node):
+        sock = self._send_socks.get(node)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.max_message * 2)
+            sock.setblocking(False)
+            try:
+                sock.connect(self.socket_path(node))
+            except OSError:
+                sock.close()
+                raise
+            self._send_socks[node] = sock
+        return sock
+
+    def _live_peers(self):
+        now = time.monotonic()
+        if now - self._peers_at > self.peer_refresh:
+            self._peers = [os.path.basename(p)[:-5] for p in glob.glob(os.path.join(self.path, "*.sock"))]
+            self._peers_at = now
+        return self._peers
+
+    def _forget_peer(self, node):
+        sock = self._send_socks.pop(node, None)
+        if sock is not None:
+            sock.close()
+        try:
+            os.unlink(self.socket_path(node))
+        except FileNotFoundError:
+            pass
+        self._peers = [p for p in self._peers if p != node]
+
+    # --- receiving ---
+    def _is_receiving_loop(self):
+        try:
+            return self._loop is not None and asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _start_receiving(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None:
+            if not self._loop.is_closed():
+                raise RuntimeError("UnixSocketChannelLayer can only receive on one event loop per process")
+            # The old loop is gone (e.g. successive asyncio.run() calls): start over.
+            self._recv_sock.close()
+            self._unlink()
+            self.channels, self.groups = {}, {}
+        os.makedirs(self.path, exist_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.max_message * 16)
+        sock.bind(self.socket_path(self.node))
+        sock.setblocking(False)
+        loop.add_reader(sock.fileno(), self._on_readable)
+        self._recv_sock, self._loop = sock, loop
+        self._peers_at = 0.0
+        atexit.register(self._unlink)
+
+    def _on_readable(self):
+        # A bounded batch per wakeup, so receivers get to run before their
+        # queues fill up.
+        for _ in range(self.READ_BATCH):
+            try:
+                data = self._recv_sock.recv(self.max_message)
+            except BlockingIOError:
+                return
+            try:
+                kind, target, message = msgpack.unpackb(data)
+            except Exception:
+                logger.exception("Dropping an undecodable channel layer datagram.")
+                continue
+            targets = list(self.groups.get(target, {})) if kind == "g" else [target]
+            for channel in targets:
+                self._deliver(channel, message)
+
+    def _deliver(self, channel, message):
+        queue = self.channels.setdefault(channel, asyncio.Queue())
+        if queue.qsize() >= self.get_capacity(channel):
+            return
+        queue.put_nowait((time.time() + self.expiry, message))
+
+    async def receive(self, channel):
+        self._start_receiving()
+        return await super().receive(channel)
+
+    async def group_add(self, group, channel):
+        self._start_receiving()
+        await super().group_add(group, channel)
+
+    # --- lifecycle ---
+    async def close(self):
+        for sock in self._send_socks.values():
+            sock.close()
+        self._send_socks = {}
+        if self._loop is not None and self._recv_sock is not None:
+            self._loop.remove_reader(self._recv_sock.fileno())
+            self._recv_sock.close()
+            self._unlink()
+            self._loop = self._recv_sock = None
+
+    def _unlink(self):
+        try:
+            os.unlink(self.socket_path(self.node))
+        except FileNotFoundError:
+            pass
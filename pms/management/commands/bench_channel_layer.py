@@ -0,0 +1,118 @@
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+def build_layer(spec):
+    return import_string(spec['BACKEND'])(**spec.get('CONFIG', {}))
+
+
+def _echo_worker(spec, members, ready, start, done):
+    """Child process: answers pings and counts group deliveries on ``members`` channels."""
+    async def run():
+        layer = build_layer(spec)
+        echo = await layer.new_channel()
+        channels = [await layer.new_channel() for _ in range(members)]
+        for channel in channels:
+            await layer.group_add('bench', channel)
+        ready.put(echo)
+
+        async def answer():
+            while True:
+                message = await layer.receive(echo)
+                if message['type'] == 'bench.stop':
+                    return
+                await layer.send(message['reply'], message)
+
+        async def count(channel, expected):
+            for _ in range(expected):
+                await layer.receive(channel)
+
+        answering = asyncio.ensure_future(answer())
+        expected = await asyncio.get_running_loop().run_in_executor(None, start.get)
+        await asyncio.gather(*[count(c, expected) for c in channels])
+        done.put(time.time())
+        await answering
+        if hasattr(layer, 'close'):
+            await layer.close()
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = "Compare channel layer backends: ping-pong latency and group fan-out throughput across two processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', action='append',
+                            help="Name from CHANNEL_LAYER_BACKENDS (repeatable; default: all).")
+        parser.add_argument('--messages', type=int, default=2000, help="Ping-pong round trips.")
+        parser.add_argument('--group-messages', type=int, default=200, help="Messages sent to the group.")
+        parser.add_argument('--members', type=int, default=50, help="Channels in the group.")
+        parser.add_argument('--payload', type=int, default=512, help="Payload size in bytes.")
+
+    def handle(self, *args, **options):
+        backends = getattr(settings, 'CHANNEL_LAYER_BACKENDS', {'default': settings.CHANNEL_LAYERS['default']})
+        names = options['backend'] or list(backends)
+        unknown = set(names) - set(backends)
+        if unknown:
+            raise CommandError(f"Unknown backend(s): {', '.join(sorted(unknown))}")
+
+        for name in names:
+            try:
+                result = self.bench(backends[name], options)
+            except Exception as e:
+                self.stderr.write(f"{name}: failed ({e!r})")
+                continue
+            latencies, group_seconds = result
+            deliveries = options['group_messages'] * options['members']
+            self.stdout.write(
+                f"{name:>8}: ping-pong p50 {statistics.median(latencies) * 1e6:.0f}us "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e6:.0f}us "
+                f"({len(latencies) / sum(latencies):.0f} round trips/s); "
+                f"group fan-out {deliveries / group_seconds:.0f} deliveries/s "
+                f"({options['group_messages']} x {options['members']} members)"
+            )
+
+    def bench(self, spec, options):
+        ctx = multiprocessing.get_context('fork')
+        ready, start, done = ctx.Queue(), ctx.Queue(), ctx.Queue()
+        worker = ctx.Process(target=_echo_worker, args=(spec, options['members'], ready, start, done), daemon=True)
+        worker.start()
+        try:
+            echo = ready.get(timeout=30)
+            return asyncio.run(self._drive(spec, echo, start, done, options))
+        finally:
+            worker.join(10)
+            if worker.is_alive():
+                worker.terminate()
+
+    async def _drive(self, spec, echo, start, done, options):
+        layer = build_layer(spec)
+        reply = await layer.new_channel()
+        payload = 'x' * options['payload']
+
+        latencies = []
+        for n in range(options['messages']):
+            started = time.perf_counter()
+            await layer.send(echo, {'type': 'bench.ping', 'reply': reply, 'n': n, 'payload': payload})
+            await layer.receive(reply)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+
+        start.put(options['group_messages'])
+        await asyncio.sleep(0.2)  # let the worker start counting
+        started = time.time()
+        for n in range(options['group_messages']):
+            await layer.group_send('bench', {'type': 'bench.fanout', 'n': n, 'payload': payload})
+        finished = await asyncio.get_running_loop().run_in_executor(None, done.get, True, 60)
+        group_seconds = finished - started
+
+        await layer.send(echo, {'type': 'bench.stop'})
+        if hasattr(layer, 'close'):
+            await layer.close()
+        return latencies, group_seconds
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from users.models import User
+from pms.images import available_variants, generate_variants, generate_variants_later
+from pms.models import Project, ProjectUpdate
+
+
+def stored_images():
+    """Names of every logo, profile photo and chat image in storage."""
+    yield from Project.objects.exclude(project_logo='').exclude(project_logo__isnull=True).values_list('project_logo', flat=True)
+    yield from User.objects.exclude(profile_photo='').exclude(profile_photo__isnull=True).values_list('profile_photo', flat=True)
+    yield from ProjectUpdate.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True).iterator()
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail variants for existing logos, profile photos and chat images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Regenerate images that already have variants.")
+        parser.add_argument('--queue', action='store_true',
+                            help="Queue a job per image for the worker instead of generating here.")
+
+    def handle(self, *args, **options):
+        done = skipped = failed = 0
+        for name in stored_images():
+            if not options['force'] and available_variants(name):
+                skipped += 1
+                continue
+            if options['queue']:
+                generate_variants_later(name)
+                done += 1
+                continue
+            try:
+                generate_variants(name)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"{name}: {e}")
+        verb = "queued" if options['queue'] else "generated"
+        self.stdout.write(self.style.SUCCESS(f"{done} images {verb}, {skipped} already done, {failed} failed."))
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import resource
+import statistics
+import time
+import uuid
+
+import msgpack
+from asgiref.sync import sync_to_async
+from channels.layers import channel_layers
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from pms.choices import ProjectRole
+from pms.models import Project, ProjectMember
+from pms.realtime import dispatcher
+from pms.subscriptions import issue_subscription_token
+from users.models import User
+
+LOADTEST_MODES = ('full', 'fields', 'msgpack')
+
+
+def rss_mb():
+    """Current resident set size of this process (peak RSS where /proc is missing)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def decode_events(frame):
+    """Events in one frame, with batches unwrapped (see pms.realtime.batch_frame)."""
+    if isinstance(frame, bytes):
+        unpacker = msgpack.Unpacker()
+        unpacker.feed(frame)
+        items = list(unpacker)
+        if len(items) == 1 and isinstance(items[0], dict):
+            return items
+        return [e for item in items for e in (item if isinstance(item, list) else [item])]
+    data = json.loads(frame)
+    return data['events'] if data.get('type') == 'batch' else [data]
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the realtime path in process: N WebSocket clients across M projects on "
+        "config.asgi.application, chat posts through project_chat_view, and publish-to-receive "
+        "latency, throughput and memory at the end. Creates its own users and projects and removes them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200, help="Project sockets to open.")
+        parser.add_argument('--projects', type=int, default=10, help="Projects to spread the clients over.")
+        parser.add_argument('--messages', type=int, default=20, help="Chat posts per project.")
+        parser.add_argument('--interval', type=float, default=0.05,
+                            help="Seconds between posts in each project (0 = back to back).")
+        parser.add_argument('--mode', choices=LOADTEST_MODES, default='fields', help="Payload mode the clients ask for.")
+        parser.add_argument('--notifications', action='store_true',
+                            help="Also open a notification socket per client.")
+        parser.add_argument('--layer', help="Channel layer from CHANNEL_LAYER_BACKENDS (default: CHANNEL_LAYERS).")
+        parser.add_argument('--settle', type=float, default=10.0,
+                            help="Seconds to wait for outstanding deliveries after the last post.")
+        parser.add_argument('--keep', action='store_true', help="Keep the generated users and projects.")
+
+    def handle(self, *args, **options):
+        if options['clients'] < options['projects'] or options['projects'] < 1:
+            raise CommandError("Need at least one project and one client per project.")
+        if options['layer']:
+            backends = getattr(settings, 'CHANNEL_LAYER_BACKENDS', {})
+            if options['layer'] not in backends:
+                raise CommandError(f"Unknown layer {options['layer']!r}; choose from {', '.join(backends)}.")
+            spec = backends[options['layer']]
+            channel_layers.set('default', import_string(spec['BACKEND'])(**spec.get('CONFIG', {})))
+
+        run_id = uuid.uuid4().hex[:8]
+        fixtures = self.create_fixtures(run_id, options)
+        try:
+            report = asyncio.run(self.run(run_id, fixtures, options))
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=f"loadtest-{run_id}-").delete()
+                Project.objects.filter(id__in=[p.id for p, _, _ in fixtures]).delete()
+        self.print_report(report, options)
+
+    def create_fixtures(self, run_id, options):
+        """[(project, head, [members])]; clients are dealt round robin over the projects."""
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(username=f"loadtest-{run_id}-{i}", password=password, role=User.Role.EMPLOYEE)
+            for i in range(options['clients'] + options['projects'])
+        ])
+        heads, members = users[:options['projects']], users[options['projects']:]
+        # bulk_create only returns primary keys on some backends.
+        if heads[0].pk is None:
+            by_name = dict(User.objects.filter(username__startswith=f"loadtest-{run_id}-").values_list('username', 'id'))
+            for user in users:
+                user.pk = user.id = by_name[user.username]
+
+        fixtures = []
+        for n, head in enumerate(heads):
+            project = Project.objects.create(name=f"Load test {run_id} #{n}", created_by=head, team_head=head)
+            team = members[n::options['projects']]
+            ProjectMember.objects.bulk_create([
+                ProjectMember(project=project, user=user, role=ProjectRole.DEVELOPER) for user in team
+            ])
+            fixtures.append((project, head, team))
+        return fixtures
+
+    async def run(self, run_id, fixtures, options):
+        from config.asgi import application
+
+        rss_start = rss_mb()
+        latencies, counts = [], {'updates': 0, 'notifications': 0, 'post_errors': 0}
+        expected = sum(len(team) for _, _, team in fixtures) * options['messages']
+        all_received = asyncio.Event()
+
+        async def read(communicator, kind):
+            while True:
+                frame = await communicator.receive_from(timeout=3600)
+                received = time.time()
+                for event in decode_events(frame):
+                    if kind == 'notifications':
+                        counts['notifications'] += event.get('type') == 'notification'
+                        continue
+                    marker = str(event.get('message') or '').split()
+                    if len(marker) == 4 and marker[:2] == ['loadtest', run_id]:
+                        latencies.append(received - float(marker[3]))
+                        counts['updates'] += 1
+                        if counts['updates'] >= expected:
+                            all_received.set()
+
+        sockets = []
+        connect_started = time.monotonic()
+        for project, _, team in fixtures:
+            for user in team:
+                token = issue_subscription_token(user, project.id)
+                paths = [(f"/ws/project/{project.id}/updates/?mode={options['mode']}&token={token}", 'updates')]
+                if options['notifications']:
+                    paths.append((f"/ws/notifications/?token={issue_subscription_token(user)}", 'notifications'))
+                for path, kind in paths:
+                    communicator = WebsocketCommunicator(application, path)
+                    connected, code = await communicator.connect(timeout=10)
+                    if not connected:
+                        raise CommandError(f"Socket {path.split('?')[0]} was refused (close code {code}).")
+                    sockets.append((communicator, asyncio.ensure_future(read(communicator, kind))))
+        connect_seconds = time.monotonic() - connect_started
+        rss_connected = rss_mb()
+
+        async def post(project, head):
+            client = Client()
+            await sync_to_async(client.force_login, thread_sensitive=False)(head)
+            url = reverse('project_chat', args=[project.id])
+            for seq in range(options['messages']):
+                data = {'remarks': f"loadtest {run_id} {seq} {time.time():.6f}"}
+                try:
+                    response = await sync_to_async(client.post, thread_sensitive=False)(
+                        url, data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+                    ok = response.status_code == 200
+                except Exception:
+                    ok = False
+                counts['post_errors'] += not ok
+                if options['interval']:
+                    await asyncio.sleep(options['interval'])
+
+        post_started = time.monotonic()
+        await asyncio.gather(*[post(project, head) for project, head, _ in fixtures])
+        post_seconds = time.monotonic() - post_started
+        await sync_to_async(dispatcher.flush)(options['settle'])
+        try:
+            await asyncio.wait_for(all_received.wait(), options['settle'])
+        except asyncio.TimeoutError:
+            pass
+        deliver_seconds = time.monotonic() - post_started
+        rss_peak = max(rss_mb(), rss_connected)
+
+        for communicator, reader in sockets:
+            reader.cancel()
+            await communicator.disconnect()
+
+        return {
+            'sockets': len(sockets), 'connect_seconds': connect_seconds,
+            'posts': len(fixtures) * options['messages'], 'post_seconds': post_seconds,
+            'expected': expected, 'deliver_seconds': deliver_seconds,
+            'latencies': sorted(latencies), 'rss': (rss_start, rss_connected, rss_peak), **counts,
+        }
+
+    def print_report(self, report, options):
+        w = self.stdout.write
+        rss_start, rss_connected, rss_peak = report['rss']
+        w(f"Sockets:       {report['sockets']} opened in {report['connect_seconds']:.2f}s "
+          f"({options['clients']} clients, {options['projects']} projects, mode={options['mode']})")
+        w(f"Posts:         {report['posts']} in {report['post_seconds']:.2f}s "
+          f"({report['posts'] / report['post_seconds']:.1f}/s, {report['post_errors']} failed)")
+        w(f"Deliveries:    {report['updates']}/{report['expected']} project updates "
+          f"({report['updates'] / report['deliver_seconds']:.0f} msg/s)"
+          + (f", {report['notifications']} notifications" if options['notifications'] else ""))
+        latencies = report['latencies']
+        if latencies:
+            w("Latency (ms):  p50 {:.1f}  p90 {:.1f}  p99 {:.1f}  max {:.1f}  mean {:.1f}".format(
+                percentile(latencies, 50) * 1000, percentile(latencies, 90) * 1000,
+                percentile(latencies, 99) * 1000, latencies[-1] * 1000, statistics.mean(latencies) * 1000))
+        w(f"Memory (MB):   {rss_start:.1f} at start, {rss_connected:.1f} connected "
+          f"({(rss_connected - rss_start) * 1024 / max(report['sockets'], 1):.1f} KB/socket), {rss_peak:.1f} peak")
+        if report['updates'] < report['expected']:
+            self.stdout.write(self.style.WARNING(
+                f"{report['expected'] - report['updates']} project updates did not arrive within --settle."))
@@ -0,0 +1,63 @@
+import datetime
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pms.models import Notification
+
+
+class Command(BaseCommand):
+    help = "Delete (or archive, then delete) read notifications older than the retention window, in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+                            help="Keep read notifications newer than this many days.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows deleted per statement.")
+        parser.add_argument('--max-batches', type=int, default=0,
+                            help="Stop after this many batches (0 = until done).")
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help="Seconds to pause between batches to spread the load.")
+        parser.add_argument('--archive', metavar='PATH',
+                            help="Append each deleted row to this file as a JSON line first.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report how many rows would go.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        expired = Notification.objects.filter(is_read=True, timestamp__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} read notifications older than {cutoff:%Y-%m-%d} would be removed.")
+            return
+
+        archive = open(options['archive'], 'a', encoding='utf-8') if options['archive'] else None
+        total = batches = 0
+        try:
+            while True:
+                # Walk the (is_read, timestamp) index rather than the primary key.
+                rows = list(
+                    expired.order_by('timestamp', 'id').values('id', 'user_id', 'message', 'link', 'timestamp')[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                if archive:
+                    for row in rows:
+                        archive.write(json.dumps(dict(row, timestamp=row['timestamp'].isoformat())) + "\n")
+                    archive.flush()
+                Notification.objects.filter(id__in=[r['id'] for r in rows]).delete()
+
+                total += len(rows)
+                batches += 1
+                if options['max_batches'] and batches >= options['max_batches']:
+                    break
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        finally:
+            if archive:
+                archive.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Removed {total} notifications in {batches} batches."))
@@ -0,0 +1,25 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pms.compliance import remind_missing_updates
+
+
+class Command(BaseCommand):
+    help = "Notify employees who have not posted a daily update for the day (run in the evening; idempotent)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Check this day (YYYY-MM-DD) instead of today.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report how many reminders would be sent.")
+
+    def handle(self, *args, **options):
+        day = None
+        if options['date']:
+            try:
+                day = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid --date {options['date']!r}; use YYYY-MM-DD.")
+        count = remind_missing_updates(day, dry_run=options['dry_run'])
+        verb = "would be sent" if options['dry_run'] else "sent"
+        self.stdout.write(self.style.SUCCESS(f"{count} daily update reminders {verb}."))
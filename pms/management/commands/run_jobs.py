@@ -0,0 +1,63 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from pms.jobs import JOB_BATCH_SIZE, default_worker_id, run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (emails, ...) until stopped, or once with --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=JOB_BATCH_SIZE,
+                            help="Jobs claimed per round.")
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'JOB_CONCURRENCY', 1),
+                            help="Worker threads, each claiming its own batches.")
+        parser.add_argument('--poll', type=float, default=getattr(settings, 'JOB_POLL_INTERVAL', 2),
+                            help="Seconds to sleep when there is nothing to do.")
+        parser.add_argument('--kind', action='append',
+                            help="Only run jobs of this kind (repeatable).")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain what is due now and exit.")
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+
+        workers = [
+            threading.Thread(target=self.work, args=(f"{default_worker_id()}:{n}", options), daemon=True)
+            for n in range(max(options['concurrency'], 1))
+        ]
+        self.totals = [0, 0]
+        self.lock = threading.Lock()
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(1)
+        except KeyboardInterrupt:
+            self.stopping.set()
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS(f"Jobs done: {self.totals[0]}, failed: {self.totals[1]}."))
+
+    def work(self, worker_id, options):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                done, failed = run_pending(worker_id, options['batch_size'], options['kind'])
+                with self.lock:
+                    self.totals[0] += done
+                    self.totals[1] += failed
+                if done or failed:
+                    continue
+                if options['once']:
+                    return
+                self.stopping.wait(options['poll'])
+        finally:
+            connection.close()
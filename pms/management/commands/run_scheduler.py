@@ -0,0 +1,78 @@
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from pms.jobs import default_worker_id
+from pms.models import ScheduleEntry
+from pms.scheduler import acquire_lease, fire_due, prune_history, release_lease, sync_entries
+
+PRUNE_EVERY = 60 * 60
+
+
+class Command(BaseCommand):
+    help = "Fire SCHEDULED_TASKS into the job queue. Run one per node; only the lease holder fires."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tick', type=float, default=getattr(settings, 'SCHEDULER_TICK', 15),
+                            help="Seconds between checks for due tasks.")
+        parser.add_argument('--once', action='store_true',
+                            help="Check once (if the lease can be had) and exit.")
+        parser.add_argument('--list', action='store_true',
+                            help="Show the schedule and each task's last run, then exit.")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            return self.show()
+
+        owner = default_worker_id()
+        self.stopping = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+
+        leading = False
+        last_prune = 0
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                if acquire_lease(owner):
+                    if not leading:
+                        self.stdout.write(f"{owner} holds the scheduler lease.")
+                        sync_entries()
+                        leading = True
+                    for name in fire_due(owner):
+                        self.stdout.write(f"Fired {name}.")
+                    if time.monotonic() - last_prune > PRUNE_EVERY:
+                        prune_history()
+                        last_prune = time.monotonic()
+                elif leading:
+                    self.stdout.write(self.style.WARNING(f"{owner} lost the scheduler lease."))
+                    leading = False
+                if options['once']:
+                    break
+                self.stopping.wait(options['tick'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if leading:
+                release_lease(owner)
+            connection.close()
+
+    def show(self):
+        entries = ScheduleEntry.objects.all()
+        if not entries:
+            self.stdout.write("No scheduled tasks yet; they are created when a scheduler takes the lease.")
+        for entry in entries:
+            run = entry.runs.select_related('job').first()
+            last = "never"
+            if run:
+                status = run.job.get_status_display() if run.job else "job removed"
+                last = f"{timezone.localtime(run.fired_at):%Y-%m-%d %H:%M} by {run.fired_by} ({status})"
+            state = "" if entry.enabled else " [disabled]"
+            self.stdout.write(
+                f"{entry.name}{state}: {entry.cron}, next {timezone.localtime(entry.next_run_at):%Y-%m-%d %H:%M}, last {last}"
+            )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from pms.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = "Email management and team heads a digest of their projects since their last one (run nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Build the digests and report how many would go out, without sending.")
+
+    def handle(self, *args, **options):
+        sent, empty = send_digests(dry_run=options['dry_run'])
+        verb = "would be sent" if options['dry_run'] else "sent"
+        self.stdout.write(self.style.SUCCESS(f"{sent} digests {verb}; {empty} recipients had nothing new."))
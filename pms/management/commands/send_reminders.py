@@ -0,0 +1,25 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pms.reminders import send_reminders
+
+
+class Command(BaseCommand):
+    help = "Notify teams about project end dates coming up and passed project/recommendation deadlines (idempotent)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Scan as of this day (YYYY-MM-DD) instead of today.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report how many reminders would be sent.")
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid --date {options['date']!r}; use YYYY-MM-DD.")
+        count = send_reminders(today, dry_run=options['dry_run'])
+        verb = "would be sent" if options['dry_run'] else "sent"
+        self.stdout.write(self.style.SUCCESS(f"{count} reminders {verb}."))
@@ -0,0 +1,12 @@
+from .images import variant_memo
+
+
+class ImageVariantMemoMiddleware:
+    """Remember image variant lookups for the length of a request (see pms.images)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with variant_memo():
+            return self.get_response(request)
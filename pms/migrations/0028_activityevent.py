@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0027_project_google_meet_link'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(choices=[('CHAT_MESSAGE', 'Chat Message'), ('UPDATE_POSTED', 'Update Posted'), ('RECOMMENDATION_POSTED', 'Recommendation Posted'), ('DOCUMENT_UPLOADED', 'Document Uploaded'), ('WORK_STATUS', 'Work Status Changed'), ('TASK_COMPLETED', 'Task Completed'), ('TASK_REOPENED', 'Task Reopened'), ('MEMBER_ADDED', 'Member Added'), ('MEMBER_REMOVED', 'Member Removed')], max_length=30)),
+                ('message', models.CharField(max_length=255)),
+                ('link', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity_events', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_events', to='pms.project')),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['project', 'id'], name='pms_activity_project_id_idx')],
+            },
+        ),
+    ]
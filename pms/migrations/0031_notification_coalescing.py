@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0030_notification_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='event_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(choices=[('GENERAL', 'General'), ('CHAT', 'Chat'), ('UPDATE', 'Project Update'), ('TASK', 'Task'), ('MEETING', 'Meeting'), ('ISSUE', 'Issue')], default='GENERAL', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='last_event_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='pms.project'),
+        ),
+    ]
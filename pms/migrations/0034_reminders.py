@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0033_digeststate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('PROJECT_DUE_SOON', 'Project Due Soon'), ('PROJECT_OVERDUE', 'Project Overdue'), ('RECOMMENDATION_OVERDUE', 'Recommendation Overdue')], max_length=30)),
+                ('target_id', models.PositiveBigIntegerField()),
+                ('due_date', models.DateField()),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(choices=[('GENERAL', 'General'), ('CHAT', 'Chat'), ('UPDATE', 'Project Update'), ('TASK', 'Task'), ('MEETING', 'Meeting'), ('ISSUE', 'Issue'), ('DEADLINE', 'Deadline')], default='GENERAL', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['end_date'], name='pms_project_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectupdate',
+            index=models.Index(fields=['category', 'end_date'], name='pms_update_category_due_idx'),
+        ),
+        migrations.AddField(
+            model_name='reminderledger',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='reminderledger',
+            constraint=models.UniqueConstraint(fields=('kind', 'target_id', 'due_date', 'user'), name='pms_reminder_once'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0034_reminders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reminderledger',
+            name='kind',
+            field=models.CharField(choices=[('PROJECT_DUE_SOON', 'Project Due Soon'), ('PROJECT_OVERDUE', 'Project Overdue'), ('RECOMMENDATION_OVERDUE', 'Recommendation Overdue'), ('DAILY_UPDATE_MISSING', 'Daily Update Missing')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='dailyupdate',
+            index=models.Index(fields=['date', 'user'], name='pms_dailyupdate_date_user_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:12
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0036_scheduler'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('target', models.CharField(choices=[('PROJECT_DOCUMENT', 'Project Document'), ('UPDATE_ATTACHMENT', 'Update Attachment'), ('ISSUE_ATTACHMENT', 'Issue Attachment'), ('CHAT_FILE', 'Chat File')], max_length=20)),
+                ('target_id', models.PositiveBigIntegerField()),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Receiving'), ('COMPLETE', 'Complete'), ('FAILED', 'Failed')], default='ACTIVE', max_length=10)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('path', models.CharField(max_length=255)),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='pms.upload')),
+            ],
+            options={
+                'ordering': ['index'],
+                'constraints': [models.UniqueConstraint(fields=('upload', 'index'), name='pms_upload_chunk_once')],
+            },
+        ),
+    ]
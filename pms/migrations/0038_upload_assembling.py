@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0037_chunked_uploads'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='upload',
+            name='status',
+            field=models.CharField(choices=[('ACTIVE', 'Receiving'), ('ASSEMBLING', 'Assembling'), ('COMPLETE', 'Complete'), ('FAILED', 'Failed')], default='ACTIVE', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0038_upload_assembling'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activityevent',
+            name='verb',
+            field=models.CharField(choices=[('CHAT_MESSAGE', 'Chat Message'), ('UPDATE_POSTED', 'Update Posted'), ('RECOMMENDATION_POSTED', 'Recommendation Posted'), ('DOCUMENT_UPLOADED', 'Document Uploaded'), ('ATTACHMENT_ADDED', 'Attachment Added'), ('WORK_STATUS', 'Work Status Changed'), ('TASK_COMPLETED', 'Task Completed'), ('TASK_REOPENED', 'Task Reopened'), ('MEMBER_ADDED', 'Member Added'), ('MEMBER_REMOVED', 'Member Removed')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pms', '0039_attachment_activity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(choices=[('GENERAL', 'General'), ('CHAT', 'Chat'), ('UPDATE', 'Project Update'), ('TASK', 'Task'), ('MEETING', 'Meeting'), ('ISSUE', 'Issue'), ('DEADLINE', 'Deadline'), ('REMINDER', 'Reminder')], default='GENERAL', max_length=20),
+        ),
+    ]
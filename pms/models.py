@@ -1,10 +1,13 @@
+import uuid
+
 from django.db import models
 from users.models import User
 from django.utils import timezone
 from .choices import (
     TaskStatus, TaskPriority, ProjectStatus, ProjectPriority,
     ProjectRole, ProjectUpdateStatus, ProjectUpdateIntent, WorkStatus,
-    IssueSubject, IssueStatus
+    IssueSubject, IssueStatus, ActivityVerb, NotificationKind, JobStatus, ReminderKind,
+    UploadTarget, UploadStatus
 )
 
 class ProjectMember(models.Model):
@@ -68,6 +71,10 @@ class Project(models.Model):
     )
     project_status_description = models.TextField(blank=True, null=True)
 
+    class Meta:
+        # Deadline scans: WHERE end_date BETWEEN ? AND ?
+        indexes = [models.Index(fields=['end_date'], name='pms_project_end_date_idx')]
+
     def __str__(self):
         return self.name
 
@@ -130,6 +137,10 @@ class ProjectUpdate(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Overdue recommendation scans: WHERE category = ? AND end_date BETWEEN ? AND ?
+            models.Index(fields=['category', 'end_date'], name='pms_update_category_due_idx'),
+        ]
 
     def __str__(self):
         return f"{self.category} on {self.project.name}"
@@ -166,6 +177,10 @@ class DailyUpdate(models.Model):
     class Meta:
         ordering = ['-created_at']
         # REMOVED unique_together so you can submit multiple times per day
+        indexes = [
+            # "Who posted on day D" (anti-join on user, date) and range scans over dates.
+            models.Index(fields=['date', 'user'], name='pms_dailyupdate_date_user_idx'),
+        ]
 
     def __str__(self):
         return f"Update from {self.user.username} on {self.date}"
@@ -202,6 +217,181 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     timestamp = models.DateTimeField(auto_now_add=True)
     link = models.CharField(max_length=255, blank=True, null=True)
+    kind = models.CharField(max_length=20, choices=NotificationKind.choices, default=NotificationKind.GENERAL)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name="notifications")
+    # Coalesced rows absorb repeat events instead of inserting new ones.
+    event_count = models.PositiveIntegerField(default=1)
+    last_event_at = models.DateTimeField(null=True, blank=True)
+    # Set while the row is unread, cleared when it is read. The unique
+    # constraint lets bulk fan-out skip duplicates without get_or_create.
+    dedupe_key = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'dedupe_key'], name='pms_notification_unread_dedupe'),
+        ]
+        indexes = [
+            # Inbox keyset pagination: WHERE user = ? AND (timestamp, id) < cursor
+            models.Index(fields=['user', 'timestamp', 'id'], name='pms_notification_inbox_idx'),
+            # Retention sweeps: WHERE is_read AND timestamp < cutoff
+            models.Index(fields=['is_read', 'timestamp'], name='pms_notification_retain_idx'),
+        ]
+
+
+# --- PROJECT ACTIVITY FEED (append-only) ---
+class ActivityEvent(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="activity_events")
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="activity_events")
+    verb = models.CharField(max_length=30, choices=ActivityVerb.choices)
+    message = models.CharField(max_length=255)
+    link = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        # The feed is read as "events of project X before/after id N",
+        # so (project, id) serves every page as a single range scan.
+        indexes = [models.Index(fields=['project', 'id'], name='pms_activity_project_id_idx')]
+
+    def __str__(self):
+        return f"{self.get_verb_display()} on {self.project_id}"
+
+
+# --- BACKGROUND JOBS (run by `manage.py run_jobs`, see pms.jobs) ---
+class Job(models.Model):
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=JobStatus.choices, default=JobStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        # Workers claim with WHERE status = 'PENDING' AND run_at <= now
+        # ORDER BY run_at, id ... FOR UPDATE SKIP LOCKED.
+        indexes = [models.Index(fields=['status', 'run_at', 'id'], name='pms_job_claim_idx')]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.get_status_display()})"
+
+
+# --- EMAIL DIGESTS (see pms.digests) ---
+class DigestState(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="digest_state")
+    # The next digest covers what happened after this.
+    last_sent_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Digest for {self.user_id} up to {self.last_sent_at:%Y-%m-%d %H:%M}"
+
+
+# --- DEADLINE REMINDERS (see pms.reminders) ---
+class ReminderLedger(models.Model):
+    """One row per reminder sent, so a rescan never sends it twice."""
+    kind = models.CharField(max_length=30, choices=ReminderKind.choices)
+    # A Project or ProjectUpdate id depending on kind; 0 for reminders
+    # about the user's own work (a missing daily update).
+    target_id = models.PositiveBigIntegerField()
+    # The deadline reminded about: moving it earns a fresh reminder.
+    due_date = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="reminders")
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'target_id', 'due_date', 'user'], name='pms_reminder_once'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.target_id} to {self.user_id}"
+
+
+# --- SCHEDULER (see pms.scheduler) ---
+class ScheduleEntry(models.Model):
+    """The database side of one SCHEDULED_TASKS entry: when it is next due."""
+    name = models.CharField(max_length=100, unique=True)
+    cron = models.CharField(max_length=100)
+    next_run_at = models.DateTimeField()
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    # Cleared when the task is taken out of SCHEDULED_TASKS.
+    enabled = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['next_run_at']
+        verbose_name_plural = "schedule entries"
+
+    def __str__(self):
+        return f"{self.name} ({self.cron})"
+
+
+class SchedulerLease(models.Model):
+    """Only the node holding the (unexpired) lease fires scheduled tasks."""
+    name = models.CharField(max_length=50, unique=True)
+    owner = models.CharField(max_length=200, blank=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} held by {self.owner or 'nobody'} until {self.expires_at:%Y-%m-%d %H:%M:%S}"
+
+
+class ScheduledRun(models.Model):
+    entry = models.ForeignKey(ScheduleEntry, on_delete=models.CASCADE, related_name="runs")
+    scheduled_for = models.DateTimeField()
+    fired_at = models.DateTimeField(auto_now_add=True)
+    fired_by = models.CharField(max_length=200)
+    # The job doing the work; its status and last_error say how the run went.
+    job = models.ForeignKey(Job, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
 
     class Meta:
-        ordering = ['-timestamp']
\ No newline at end of file
+        ordering = ['-fired_at']
+
+    def __str__(self):
+        return f"{self.entry.name} at {self.fired_at:%Y-%m-%d %H:%M}"
+
+
+# --- CHUNKED UPLOADS (see pms.uploads) ---
+class Upload(models.Model):
+    """A file arriving in chunks; once all are in it becomes the target's file."""
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="uploads")
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # Whole-file SHA-256 given by the client (optional) and the one computed
+    # while assembling.
+    sha256 = models.CharField(max_length=64, blank=True)
+    # Where the file goes: a Project (document, chat file), a ProjectUpdate
+    # (attachment) or an Issue, by target_id.
+    target = models.CharField(max_length=20, choices=UploadTarget.choices)
+    target_id = models.PositiveBigIntegerField()
+    description = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=UploadStatus.choices, default=UploadStatus.ACTIVE)
+    # Storage name of the finished file.
+    file_name = models.CharField(max_length=255, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.get_status_display()})"
+
+
+class UploadChunk(models.Model):
+    upload = models.ForeignKey(Upload, on_delete=models.CASCADE, related_name="chunks")
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    path = models.CharField(max_length=255)
+
+    class Meta:
+        ordering = ['index']
+        constraints = [models.UniqueConstraint(fields=['upload', 'index'], name='pms_upload_chunk_once')]
+
+    def __str__(self):
+        return f"Chunk {self.index} of upload {self.upload_id}"
@@ -0,0 +1,357 @@
+import datetime
+import hashlib
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q, F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from users.models import User
+from .models import Notification
+from .choices import NotificationKind
+from .realtime import publish_on_commit, text_event
+
+logger = logging.getLogger(__name__)
+
+# The counter is a hint; a day's TTL bounds any drift from races.
+UNREAD_COUNT_TIMEOUT = 60 * 60 * 24
+INBOX_PAGE_SIZE = 30
+REPLAY_LIMIT = 50
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def user_group_name(user_id):
+    return f"user_{user_id}_notifications"
+
+
+def unread_cache_key(user_id):
+    return f"pms:unread:{user_id}"
+
+
+def get_unread_count(user_id):
+    """
+    Cached unread count, rebuilt with one COUNT on a miss. Every page shows
+    it, so a cache outage falls back to the COUNT instead of failing.
+    """
+    key = unread_cache_key(user_id)
+    try:
+        count = cache.get(key)
+    except Exception:
+        logger.warning("Unread count cache unavailable", exc_info=True)
+        return Notification.objects.filter(user_id=user_id, is_read=False).count()
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        try:
+            cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+        except Exception:
+            logger.warning("Unread count cache unavailable", exc_info=True)
+    return count
+
+
+def bump_unread_counts(user_ids):
+    """Increment the cached counters that exist. Returns {user_id: new_count}."""
+    counts = {}
+    for uid in user_ids:
+        try:
+            counts[uid] = cache.incr(unread_cache_key(uid))
+        except ValueError:
+            # Not cached: leave it to be rebuilt on the next read.
+            pass
+        except Exception:
+            # Cache down: the counter goes stale, bounded by its TTL.
+            logger.warning("Unread count cache unavailable", exc_info=True)
+            break
+    return counts
+
+
+def bump_unread_counts_on_commit(user_ids):
+    """
+    Increment the counters once the new rows are committed (a rolled-back
+    insert must not count). Returns a dict filled in by then, for events
+    built after the commit to read.
+    """
+    counts = {}
+    user_ids = list(user_ids)
+    transaction.on_commit(lambda: counts.update(bump_unread_counts(user_ids)))
+    return counts
+
+
+def _drop_unread_count(user_id, read):
+    """The unread count after ``read`` rows were marked read."""
+    key = unread_cache_key(user_id)
+    try:
+        count = cache.decr(key, read)
+        if count < 0:
+            cache.delete(key)
+            count = None
+    except ValueError:
+        count = None
+    except Exception:
+        logger.warning("Unread count cache unavailable", exc_info=True)
+        count = None
+    return count if count is not None else get_unread_count(user_id)
+
+
+def mark_read(user, notification_ids):
+    """Mark only the given rows read, adjust the counter and update the user's open tabs."""
+    if not notification_ids:
+        return 0
+    updated = Notification.objects.filter(
+        user=user, id__in=notification_ids, is_read=False
+    ).update(is_read=True, dedupe_key=None)
+    if not updated:
+        return 0
+
+    counts = {}
+    transaction.on_commit(lambda: counts.update({user.id: _drop_unread_count(user.id, updated)}))
+    publish_on_commit(lambda: [(user_group_name(user.id), text_event("send_unread_count", {
+        "type": "unread_count",
+        "unread_count": counts.get(user.id),
+    }))])
+    return updated
+
+
+# --- INBOX (keyset pagination on (timestamp, id)) ---
+def _encode_cursor(when, nid):
+    delta = when - _EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f"{micros}_{nid}"
+
+
+def encode_inbox_cursor(notification):
+    return _encode_cursor(notification.timestamp, notification.id)
+
+
+def decode_inbox_cursor(cursor):
+    """Returns (timestamp, id); raises ValueError on a malformed or out-of-range cursor."""
+    micros, _, nid = cursor.partition('_')
+    nid = int(nid)
+    if not 0 < nid < 2 ** 63:
+        raise ValueError(f"Cursor id {nid} is out of range")
+    try:
+        return _EPOCH + datetime.timedelta(microseconds=int(micros)), nid
+    except OverflowError as e:
+        raise ValueError(str(e)) from e
+
+
+def get_inbox_page(user, cursor=None, page_size=INBOX_PAGE_SIZE):
+    """Returns (notifications, next_cursor) newest first; next_cursor is None on the last page."""
+    qs = Notification.objects.filter(user=user)
+    if cursor is not None:
+        ts, nid = cursor
+        qs = qs.filter(Q(timestamp__lt=ts) | Q(timestamp=ts, id__lt=nid))
+    rows = list(qs.order_by('-timestamp', '-id')[:page_size + 1])
+    next_cursor = encode_inbox_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def dedupe_key_for(message, link):
+    """Unread rows with the same text and link collapse into one."""
+    return hashlib.sha1(f"{message}\n{link or ''}".encode()).hexdigest()
+
+
+def project_audience(project, exclude=None, include_creator=True):
+    """(id, email) pairs for the team, team head and optionally the creator, in one query."""
+    audience = Q(projects=project) | Q(id=project.team_head_id)
+    if include_creator:
+        audience |= Q(id=project.created_by_id)
+    qs = User.objects.filter(audience)
+    if exclude is not None:
+        qs = qs.exclude(id=exclude.id)
+    return list(qs.distinct().values_list('id', 'email'))
+
+
+def coalesce_key_for(kind, project_id):
+    return f"coalesce:{kind}:{project_id or 0}"
+
+
+def notify_users(user_ids, message, link=None, dedupe=True, kind=NotificationKind.GENERAL, project_id=None, coalesce=False):
+    """
+    Send the same notification to many users. Returns the ids that got a new row.
+
+    With ``coalesce`` a user's unread row of the same kind and project that
+    saw an event within NOTIFICATION_COALESCE_WINDOW is updated in place
+    (latest message, event_count + 1) instead of getting a new row.
+    """
+    user_ids = set(user_ids)
+    now = timezone.now()
+    if coalesce:
+        key = coalesce_key_for(kind, project_id)
+        user_ids -= _coalesce(user_ids, key, message, link, now)
+    else:
+        # Non-deduped sends still get a (one-off) key so their ids can be
+        # read back after the bulk insert and pushed with the event.
+        key = dedupe_key_for(message, link) if dedupe else f"once:{uuid.uuid4().hex}"
+    rows = [
+        Notification(user_id=uid, message=message, link=link, dedupe_key=key,
+                     kind=kind, project_id=project_id, last_event_at=now)
+        for uid in user_ids
+    ]
+    return [n.user_id for n in deliver(rows, coalesce=coalesce)]
+
+
+def _coalesce(user_ids, key, message, link, now):
+    """Fold the event into live rows; returns the ids of users that were folded."""
+    if not user_ids:
+        return set()
+    window = datetime.timedelta(seconds=getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 900))
+    # Rows that went quiet keep their count but stop absorbing events.
+    Notification.objects.filter(
+        user_id__in=user_ids, dedupe_key=key, last_event_at__lt=now - window
+    ).update(dedupe_key=None)
+
+    # Update first and read back after, so a row bumped by a concurrent
+    # request is published with the count it really has.
+    live = Notification.objects.filter(user_id__in=user_ids, dedupe_key=key)
+    if not live.update(message=message, link=link, event_count=F('event_count') + 1, last_event_at=now):
+        return set()
+    live = list(live.values_list('id', 'user_id', 'event_count'))
+    folded = [
+        Notification(id=nid, user_id=uid, message=message, link=link, event_count=count, last_event_at=now)
+        for nid, uid, count in live
+    ]
+    publish_notifications(folded, coalesced=True)
+    return {uid for _, uid, _ in live}
+
+
+def deliver(notifications, coalesce=False):
+    """
+    Write unsaved Notification rows in one INSERT and push them to the users'
+    sockets. Rows whose (user, dedupe_key) is already unread are dropped, or
+    with ``coalesce`` folded into the row that holds the key.
+    """
+    keyed = [n for n in notifications if n.dedupe_key]
+    taken = []
+    if keyed:
+        existing = set(
+            Notification.objects.filter(
+                user_id__in={n.user_id for n in keyed},
+                dedupe_key__in={n.dedupe_key for n in keyed},
+            ).values_list('user_id', 'dedupe_key')
+        )
+        taken = [n for n in notifications if (n.user_id, n.dedupe_key) in existing]
+        notifications = [n for n in notifications if (n.user_id, n.dedupe_key) not in existing]
+
+    if notifications:
+        try:
+            with transaction.atomic():
+                Notification.objects.bulk_create(notifications)
+        except IntegrityError:
+            # A concurrent request inserted one of these keys between the
+            # SELECT above and this INSERT: find out which, row by row.
+            notifications, collided = _insert_each(notifications)
+            taken += collided
+        _read_back_ids([n for n in notifications if n.dedupe_key and n.pk is None])
+        counts = bump_unread_counts_on_commit(n.user_id for n in notifications)
+        publish_notifications(notifications, counts)
+
+    if coalesce:
+        groups = {}
+        for n in taken:
+            groups.setdefault((n.dedupe_key, n.message, n.link, n.last_event_at), set()).add(n.user_id)
+        for (key, message, link, now), user_ids in groups.items():
+            _coalesce(user_ids, key, message, link, now)
+    return notifications
+
+
+def _insert_each(notifications):
+    """Insert rows one at a time, each in a savepoint. Returns (inserted, collided)."""
+    inserted, collided = [], []
+    for n in notifications:
+        try:
+            with transaction.atomic():
+                Notification.objects.bulk_create([n])
+        except IntegrityError:
+            collided.append(n)
+        else:
+            inserted.append(n)
+    return inserted, collided
+
+
+def _read_back_ids(notifications):
+    """bulk_create sets no pks on some backends (MySQL); fetch them by (user, key) in one query."""
+    if not notifications:
+        return
+    ids = {
+        (uid, key): nid
+        for nid, uid, key in Notification.objects.filter(
+            user_id__in={n.user_id for n in notifications},
+            dedupe_key__in={n.dedupe_key for n in notifications},
+        ).values_list('id', 'user_id', 'dedupe_key')
+    }
+    for n in notifications:
+        n.pk = ids.get((n.user_id, n.dedupe_key))
+
+
+# --- REPLAY (keyset on (last event, id)) ---
+# A coalesced row is updated in place and keeps its id, so "newer than the
+# last id seen" would miss it; a tab instead remembers the (last_event_at,
+# id) of the newest event it saw. Rows that never coalesced fall back to
+# their timestamp.
+def encode_replay_cursor(event_at, nid):
+    return _encode_cursor(event_at, nid)
+
+
+def decode_replay_cursor(cursor):
+    """Returns (event_at, id); raises ValueError on a malformed or out-of-range cursor."""
+    return decode_inbox_cursor(str(cursor))
+
+
+def _events(user_id):
+    return Notification.objects.filter(user_id=user_id).annotate(event_at=Coalesce('last_event_at', 'timestamp'))
+
+
+def get_missed_notifications(user_id, after, limit=REPLAY_LIMIT):
+    """
+    Rows created or coalesced into after ``after`` for a reconnecting
+    socket, oldest event first; each carries the ``cursor`` to resume from.
+    ``after`` is an (event_at, id) pair from decode_replay_cursor, or a bare
+    id from a tab loaded before cursors (new rows only). Returns (rows, has_more).
+    """
+    if isinstance(after, tuple):
+        event_at, nid = after
+        qs = _events(user_id).filter(Q(event_at__gt=event_at) | Q(event_at=event_at, id__gt=nid)).order_by('event_at', 'id')
+    else:
+        qs = _events(user_id).filter(id__gt=after).order_by('id')
+    rows = list(qs.values('id', 'message', 'link', 'kind', 'event_count', 'timestamp', 'event_at')[:limit + 1])
+    for row in rows:
+        row['timestamp'] = row['timestamp'].isoformat()
+        row['cursor'] = encode_replay_cursor(row.pop('event_at'), row['id'])
+    return rows[:limit], len(rows) > limit
+
+
+def get_latest_replay_cursor(user_id):
+    """Cursor of the user's newest event, or None without notifications."""
+    latest = _events(user_id).order_by('-event_at', '-id').values_list('event_at', 'id').first()
+    return encode_replay_cursor(*latest) if latest else None
+
+
+def get_latest_notification_id(user_id):
+    return Notification.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first()
+
+
+def publish_notifications(notifications, unread_counts=None, coalesced=False):
+    """
+    Queue one pre-encoded channel-layer message per notification for after
+    the commit. ``unread_counts`` may still be filling in until then (see
+    bump_unread_counts_on_commit), so it is read when the messages are built.
+    """
+    unread_counts = {} if unread_counts is None else unread_counts
+    publish_on_commit(lambda: [
+        (user_group_name(n.user_id), text_event("send_notification", {
+            "type": "notification",
+            "id": n.pk,
+            "message": n.message,
+            "link": n.link,
+            "unread_count": unread_counts.get(n.user_id),
+            "event_count": n.event_count,
+            # Coalesced events don't add a row, so the badge stays put.
+            "coalesced": coalesced,
+            "cursor": encode_replay_cursor(n.last_event_at or n.timestamp, n.pk) if n.pk else None,
+        }))
+        for n in notifications
+    ])
@@ -0,0 +1,291 @@
+import asyncio
+import atexit
+import json
+import logging
+import queue
+import threading
+from urllib.parse import parse_qs
+
+import msgpack
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+from .broadcast import send_to_group
+
+logger = logging.getLogger(__name__)
+
+# BaseCache.aincr/adecr are a get followed by a set (and the set resets the
+# TTL), so concurrent connects can lose counts. The sync versions map to an
+# atomic INCRBY on Redis.
+_incr = sync_to_async(lambda key: cache.incr(key))
+_decr = sync_to_async(lambda key: cache.decr(key))
+
+
+PRESENCE_TTL = getattr(settings, 'REALTIME_PRESENCE_TTL', 120)
+
+# What a project socket asks for with ?mode=...:
+#   full    - html plus every raw field (what older clients expect)
+#   html    - the rendered partial and just enough to route it
+#   fields  - raw fields only, no html
+#   msgpack - raw fields as a binary msgpack frame
+PAYLOAD_MODES = ('full', 'html', 'fields', 'msgpack')
+DEFAULT_PAYLOAD_MODE = 'full'
+HTML_MODE_KEYS = ('type', 'html', 'title', 'sender_id')
+
+
+def query_param(scope, name, default=None):
+    values = parse_qs(scope.get('query_string', b'').decode()).get(name)
+    return values[0] if values else default
+
+
+def project_group_name(project_id):
+    return f"project_{project_id}_updates"
+
+
+# Every project's updates, for management dashboards.
+MANAGEMENT_FIREHOSE_GROUP = "management_firehose"
+
+
+def text_event(handler, frame):
+    """
+    A channel-layer message carrying an already-encoded WebSocket frame.
+    The publisher serializes once; every consumer forwards ``text`` as is.
+    """
+    return {"type": handler, "text": json.dumps(frame)}
+
+
+def mode_frames(modes, fields, html=None):
+    """
+    Encode ``fields`` once per requested payload mode. None values are left
+    out of the compact modes. Returns {mode: str | bytes}.
+    """
+    compact = {k: v for k, v in fields.items() if v is not None}
+    frames = {}
+    if 'full' in modes:
+        frames['full'] = json.dumps(dict(fields, html=html))
+    if 'html' in modes:
+        frames['html'] = json.dumps({k: v for k, v in dict(compact, html=html).items() if k in HTML_MODE_KEYS})
+    if 'fields' in modes:
+        frames['fields'] = json.dumps(compact)
+    if 'msgpack' in modes:
+        frames['msgpack'] = msgpack.packb(compact)
+    return frames
+
+
+def batch_frame(frames):
+    """
+    Join already-encoded frames of one payload mode into a single frame
+    without decoding them: a JSON envelope for text, an array for msgpack.
+    """
+    if isinstance(frames[0], bytes):
+        return msgpack.Packer().pack_array_header(len(frames)) + b"".join(frames)
+    return '{"type": "batch", "events": [' + ", ".join(frames) + ']}'
+
+
+def stream_frame(stream, frame, project_id=None):
+    """
+    Tag an already-encoded frame with its stream for the multiplexed socket:
+    {"stream": ..., "event": <frame>} for text, [stream, event] for msgpack.
+    Firehose events also carry the project they belong to.
+    """
+    if isinstance(frame, bytes):
+        parts = [msgpack.packb(stream), frame] + ([msgpack.packb(project_id)] if project_id is not None else [])
+        return msgpack.Packer().pack_array_header(len(parts)) + b"".join(parts)
+    tag = f', "project_id": {int(project_id)}' if project_id is not None else ''
+    return '{"stream": ' + json.dumps(stream) + tag + ', "event": ' + frame + '}'
+
+
+# --- GROUP PRESENCE ---
+# A per-group, per-payload-mode counter in the shared cache: consumers
+# increment it on connect, decrement on disconnect and keep refreshing its
+# TTL while open. If a process dies without decrementing, the count only
+# errs high (an unnecessary render) and the key expires once every socket
+# has gone.
+def presence_key(group, mode=DEFAULT_PAYLOAD_MODE):
+    return f"pms:presence:{group}:{mode}"
+
+
+async def presence_join(group, mode=DEFAULT_PAYLOAD_MODE):
+    key = presence_key(group, mode)
+    await cache.aadd(key, 0, PRESENCE_TTL)
+    try:
+        await _incr(key)
+    except ValueError:
+        await cache.aset(key, 1, PRESENCE_TTL)
+    await cache.atouch(key, PRESENCE_TTL)
+
+
+async def presence_leave(group, mode=DEFAULT_PAYLOAD_MODE):
+    key = presence_key(group, mode)
+    try:
+        if await _decr(key) < 0:
+            await cache.aset(key, 0, PRESENCE_TTL)
+    except ValueError:
+        pass
+
+
+async def presence_refresh(group, mode=DEFAULT_PAYLOAD_MODE):
+    await cache.atouch(presence_key(group, mode), PRESENCE_TTL)
+
+
+def active_modes(group):
+    """Payload modes someone in ``group`` is listening with (one cache round trip)."""
+    try:
+        counts = cache.get_many([presence_key(group, mode) for mode in PAYLOAD_MODES])
+    except Exception:
+        # Fail open: a cache outage must not silence live updates.
+        logger.exception("Presence lookup failed for %s", group)
+        return set(PAYLOAD_MODES)
+    return {mode for mode in PAYLOAD_MODES if (counts.get(presence_key(group, mode)) or 0) > 0}
+
+
+def has_subscribers(group):
+    return bool(active_modes(group))
+
+
+# --- PER-USER SOCKET REGISTRY ---
+# Each socket takes the next number from a per-user counter and holds a
+# slot key (number -> channel name) that its heartbeat keeps alive. Slots
+# of dead processes simply expire, so the registry never drifts. Only the
+# most recent SOCKET_SCAN_WINDOW numbers are looked at when enforcing the cap.
+SOCKET_SLOT_TTL = getattr(settings, 'REALTIME_IDLE_TIMEOUT', 90) * 2
+SOCKET_SCAN_WINDOW = 64
+
+
+def socket_seq_key(user_id):
+    return f"pms:sockets:{user_id}:seq"
+
+
+def socket_slot_key(user_id, seq):
+    return f"pms:sockets:{user_id}:{seq}"
+
+
+async def register_socket(user_id, channel_name, cap):
+    """
+    Claim a slot for a new socket. Returns (seq, channels_to_evict): the
+    user's oldest sockets beyond ``cap``, this one included in the count.
+    """
+    seq_key = socket_seq_key(user_id)
+    await cache.aadd(seq_key, 0, None)
+    seq = await _incr(seq_key)
+    await cache.aset(socket_slot_key(user_id, seq), channel_name, SOCKET_SLOT_TTL)
+
+    window = range(max(1, seq - SOCKET_SCAN_WINDOW), seq + 1)
+    slots = await cache.aget_many([socket_slot_key(user_id, n) for n in window])
+    live = [(n, slots[socket_slot_key(user_id, n)]) for n in window if socket_slot_key(user_id, n) in slots]
+    evicted = live[:max(0, len(live) - cap)]
+    if evicted:
+        await cache.adelete_many([socket_slot_key(user_id, n) for n, _ in evicted])
+    return seq, [channel for _, channel in evicted]
+
+
+async def refresh_socket(user_id, seq):
+    await cache.atouch(socket_slot_key(user_id, seq), SOCKET_SLOT_TTL)
+
+
+async def release_socket(user_id, seq):
+    await cache.adelete(socket_slot_key(user_id, seq))
+
+
+class Dispatcher:
+    """
+    One background thread per process that builds channel-layer messages
+    (template rendering included) and publishes them in batches, so request
+    threads never wait on rendering or Redis.
+
+    Jobs are callables returning a list of (group, message) pairs. The queue
+    is bounded: when it is full new jobs are dropped and logged rather than
+    letting memory grow behind a stalled channel layer.
+    """
+
+    def __init__(self, max_queue=1000, batch_size=50):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            logger.warning("Realtime dispatch queue is full; dropping an event.")
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far has been published."""
+        if self._thread is None:
+            return
+        done = threading.Thread(target=self.queue.join, daemon=True)
+        done.start()
+        done.join(timeout)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="pms-realtime-dispatch", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # A long-lived loop keeps the channel layer's connection pool warm
+        # across batches instead of rebuilding it per async_to_sync call.
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while True:
+            jobs = [self.queue.get()]
+            while len(jobs) < self.batch_size:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            messages = []
+            for job in jobs:
+                try:
+                    messages.extend(job() or [])
+                except Exception:
+                    logger.exception("Failed to build a realtime event.")
+            if messages:
+                try:
+                    loop.run_until_complete(self._send_all(messages))
+                except Exception:
+                    logger.exception("Failed to publish realtime events.")
+
+            close_old_connections()
+            for _ in jobs:
+                self.queue.task_done()
+
+    async def _send_all(self, messages):
+        channel_layer = get_channel_layer()
+        results = await asyncio.gather(
+            *[send_to_group(channel_layer, group, message) for group, message in messages],
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("group_send failed: %r", result)
+
+
+dispatcher = Dispatcher(
+    max_queue=getattr(settings, 'REALTIME_DISPATCH_QUEUE_SIZE', 1000),
+    batch_size=getattr(settings, 'REALTIME_DISPATCH_BATCH_SIZE', 50),
+)
+# Short-lived processes (management commands) should not lose queued events.
+atexit.register(dispatcher.flush, 5)
+
+
+def publish_on_commit(build):
+    """
+    Hand ``build`` to the dispatcher once the current transaction commits,
+    so rolled-back rows are never broadcast. Outside a transaction it is
+    submitted straight away.
+    """
+    transaction.on_commit(lambda: dispatcher.submit(build))
+
+
+def group_send_on_commit(group, message):
+    publish_on_commit(lambda: [(group, message)])
@@ -0,0 +1,117 @@
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .choices import NotificationKind, ProjectUpdateStatus, ReminderKind, WorkStatus
+from .jobs import job_handler
+from .models import Notification, Project, ProjectMember, ProjectUpdate, ReminderLedger
+from .notifications import deliver, dedupe_key_for
+
+REMINDER_LEAD_DAYS = getattr(settings, 'REMINDER_LEAD_DAYS', 3)
+REMINDER_OVERDUE_LOOKBACK_DAYS = getattr(settings, 'REMINDER_OVERDUE_LOOKBACK_DAYS', 7)
+
+
+def due_phrase(due, today):
+    days = (due - today).days
+    if days == 0:
+        return "today"
+    if days == 1:
+        return "tomorrow"
+    return f"in {days} days ({due:%d %b})"
+
+
+# --- SCANNING ---
+# A reminder is (kind, target, due date, project, message, link); every
+# query below is a range scan on an indexed end_date column.
+def find_due_reminders(today):
+    soon_until = today + datetime.timedelta(days=REMINDER_LEAD_DAYS)
+    overdue_from = today - datetime.timedelta(days=REMINDER_OVERDUE_LOOKBACK_DAYS)
+    reminders = []
+
+    projects = (
+        Project.objects.filter(end_date__gte=overdue_from, end_date__lte=soon_until)
+        .exclude(project_status_update=WorkStatus.COMPLETE)
+        .values('id', 'name', 'end_date')
+    )
+    for p in projects:
+        link = reverse('project_detail', args=[p['id']])
+        if p['end_date'] >= today:
+            reminders.append((ReminderKind.PROJECT_DUE_SOON, p['id'], p['end_date'], p['id'],
+                              f"Project {p['name']} is due {due_phrase(p['end_date'], today)}", link))
+        else:
+            reminders.append((ReminderKind.PROJECT_OVERDUE, p['id'], p['end_date'], p['id'],
+                              f"Project {p['name']} passed its end date ({p['end_date']:%d %b})", link))
+
+    recommendations = (
+        ProjectUpdate.objects.filter(category='RECOMMENDATION', end_date__gte=overdue_from, end_date__lt=today)
+        .exclude(update_status=ProjectUpdateStatus.COMPLETE)
+        .values('id', 'title', 'end_date', 'project_id', 'project__name')
+    )
+    for r in recommendations:
+        reminders.append((ReminderKind.RECOMMENDATION_OVERDUE, r['id'], r['end_date'], r['project_id'],
+                          f"Recommendation \"{r['title'] or 'Untitled'}\" on {r['project__name']} was due {r['end_date']:%d %b}",
+                          reverse('project_detail', args=[r['project_id']])))
+    return reminders
+
+
+def project_teams(project_ids):
+    """{project_id: {user ids of the team head and members}} in two queries."""
+    teams = defaultdict(set)
+    for project_id, head_id in Project.objects.filter(id__in=project_ids, team_head__isnull=False).values_list('id', 'team_head_id'):
+        teams[project_id].add(head_id)
+    for project_id, user_id in ProjectMember.objects.filter(project_id__in=project_ids).values_list('project_id', 'user_id'):
+        teams[project_id].add(user_id)
+    return teams
+
+
+def send_reminders(today=None, dry_run=False):
+    """
+    Notify team heads and members about approaching and passed deadlines.
+    Safe to run as often as you like: the ledger holds what was already sent.
+    Returns the number of notifications created (or that would be).
+    """
+    today = today or timezone.localdate()
+    reminders = find_due_reminders(today)
+    if not reminders:
+        return 0
+    teams = project_teams({r[3] for r in reminders})
+
+    wanted = {
+        (kind, target_id, due, user_id): (project_id, message, link)
+        for kind, target_id, due, project_id, message, link in reminders
+        for user_id in teams.get(project_id, ())
+    }
+    sent = set(
+        ReminderLedger.objects.filter(
+            kind__in={k[0] for k in wanted}, target_id__in={k[1] for k in wanted}, due_date__gte=min(k[2] for k in wanted),
+        ).values_list('kind', 'target_id', 'due_date', 'user_id')
+    ) if wanted else set()
+    new = {key: value for key, value in wanted.items() if key not in sent}
+    if dry_run or not new:
+        return len(new)
+
+    now = timezone.now()
+    with transaction.atomic():
+        # ignore_conflicts: an overlapping run may have just written some of
+        # these; the notifications' unread dedupe key absorbs the overlap.
+        ReminderLedger.objects.bulk_create(
+            [ReminderLedger(kind=kind, target_id=target_id, due_date=due, user_id=user_id)
+             for kind, target_id, due, user_id in new],
+            ignore_conflicts=True,
+        )
+        delivered = deliver([
+            Notification(user_id=user_id, message=message, link=link, dedupe_key=dedupe_key_for(message, link),
+                         kind=NotificationKind.DEADLINE, project_id=project_id, last_event_at=now)
+            for (_, _, _, user_id), (project_id, message, link) in new.items()
+        ])
+    return len(delivered)
+
+
+@job_handler('reminders')
+def run_reminder_jobs(jobs):
+    send_reminders()
+    return {}
@@ -0,0 +1,161 @@
+import datetime
+import logging
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import ScheduleEntry, ScheduledRun, SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+SCHEDULED_TASKS = getattr(settings, 'SCHEDULED_TASKS', {})
+SCHEDULER_LEASE_SECONDS = getattr(settings, 'SCHEDULER_LEASE_SECONDS', 60)
+SCHEDULER_DEFAULT_JITTER = getattr(settings, 'SCHEDULER_DEFAULT_JITTER', 30)
+SCHEDULER_HISTORY_DAYS = getattr(settings, 'SCHEDULER_HISTORY_DAYS', 30)
+LEASE_NAME = 'scheduler'
+
+
+# --- CRON EXPRESSIONS ---
+class CronExpression:
+    """
+    Standard five-field cron ("minute hour day-of-month month day-of-week")
+    with *, a-b, */n, a-b/n and comma lists; Sunday is 0 or 7. As in cron, a
+    day matches either day field when both are restricted. Evaluated in the
+    project's TIME_ZONE.
+    """
+    FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+
+    def __init__(self, expression):
+        self.expression = expression
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression {expression!r} needs 5 fields")
+        values = [self._parse(part, low, high) for part, (_, low, high) in zip(parts, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            body, _, step = part.partition('/')
+            step = int(step) if step else 1
+            if body == '*':
+                start, end = low, high
+            elif '-' in body:
+                start, end = (int(v) for v in body.split('-', 1))
+            else:
+                start = int(body)
+                end = high if step > 1 else start
+            if not (low <= start <= end <= high) or step < 1:
+                raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return sorted(values)
+
+    def _day_matches(self, day):
+        in_days = day.day in self.days
+        in_weekdays = (day.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment):
+        """The first matching minute strictly after ``moment`` (aware)."""
+        zone = timezone.get_current_timezone()
+        local = timezone.localtime(moment, zone).replace(second=0, microsecond=0, tzinfo=None)
+        start = local + datetime.timedelta(minutes=1)
+        day = start.date()
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime.datetime.combine(day, datetime.time(hour, minute))
+                        if candidate >= start:
+                            return timezone.make_aware(candidate, zone)
+            day += datetime.timedelta(days=1)
+        raise ValueError(f"Cron expression {self.expression!r} never fires")
+
+
+# --- ENTRIES ---
+def task_target(spec):
+    """(job kind, payload) a task enqueues: a registered job kind or a management command."""
+    if 'command' in spec:
+        return 'command', {'name': spec['command'], 'args': spec.get('args', []), 'options': spec.get('options', {})}
+    return spec['job'], spec.get('payload', {})
+
+
+def sync_entries(now=None):
+    """Mirror SCHEDULED_TASKS into ScheduleEntry rows; a changed cron is rescheduled from now."""
+    now = now or timezone.now()
+    existing = {e.name: e for e in ScheduleEntry.objects.all()}
+    for name, spec in SCHEDULED_TASKS.items():
+        cron = CronExpression(spec['cron'])  # fail loudly on a typo
+        entry = existing.get(name)
+        if entry is None:
+            ScheduleEntry.objects.create(name=name, cron=spec['cron'], next_run_at=cron.next_after(now))
+        elif entry.cron != spec['cron'] or not entry.enabled:
+            ScheduleEntry.objects.filter(id=entry.id).update(cron=spec['cron'], enabled=True, next_run_at=cron.next_after(now))
+    ScheduleEntry.objects.exclude(name__in=list(SCHEDULED_TASKS)).update(enabled=False)
+
+
+# --- LEADER LEASE ---
+def acquire_lease(owner, now=None):
+    """
+    Take or renew the single scheduler lease. Only the holder fires tasks;
+    a node that dies loses it after SCHEDULER_LEASE_SECONDS.
+    """
+    now = now or timezone.now()
+    expires = now + datetime.timedelta(seconds=SCHEDULER_LEASE_SECONDS)
+    SchedulerLease.objects.get_or_create(name=LEASE_NAME, defaults={'expires_at': now})
+    return bool(
+        SchedulerLease.objects.filter(name=LEASE_NAME)
+        .filter(Q(owner=owner) | Q(expires_at__lte=now))
+        .update(owner=owner, expires_at=expires)
+    )
+
+
+def release_lease(owner):
+    SchedulerLease.objects.filter(name=LEASE_NAME, owner=owner).update(expires_at=timezone.now())
+
+
+# --- FIRING ---
+def fire_due(owner, now=None):
+    """
+    Enqueue a job for every due entry and move it to its next slot. Missed
+    slots (the scheduler was down) fire once, not once per slot. Each entry
+    is advanced with a compare-and-set on next_run_at, so even two nodes
+    overlapping during a lease handover cannot fire the same slot twice.
+    Returns the names fired.
+    """
+    now = now or timezone.now()
+    fired = []
+    for entry in ScheduleEntry.objects.filter(enabled=True, next_run_at__lte=now):
+        spec = SCHEDULED_TASKS.get(entry.name)
+        if spec is None:
+            continue
+        jitter = spec.get('jitter', SCHEDULER_DEFAULT_JITTER)
+        next_run = CronExpression(entry.cron).next_after(now) + datetime.timedelta(seconds=random.uniform(0, jitter))
+        with transaction.atomic():
+            claimed = ScheduleEntry.objects.filter(id=entry.id, next_run_at=entry.next_run_at).update(
+                next_run_at=next_run, last_run_at=now,
+            )
+            if not claimed:
+                continue
+            kind, payload = task_target(spec)
+            job = enqueue(kind, payload, max_attempts=spec.get('max_attempts'))
+            ScheduledRun.objects.create(entry=entry, scheduled_for=entry.next_run_at, fired_by=owner, job=job)
+        logger.info("Scheduled task %s fired (job %s); next run %s", entry.name, job.id, next_run)
+        fired.append(entry.name)
+    return fired
+
+
+def prune_history(now=None):
+    now = now or timezone.now()
+    cutoff = now - datetime.timedelta(days=SCHEDULER_HISTORY_DAYS)
+    return ScheduledRun.objects.filter(fired_at__lt=cutoff).delete()[0]
@@ -1,10 +1,19 @@
 import os
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from django.template.loader import render_to_string
-from .models import Notification, ProjectUpdate
+from django.urls import reverse
+from users.models import User
+from .models import Notification, Project, ProjectUpdate, ProjectDocument, WorkUpdate, ProjectMember
+from .choices import ActivityVerb
+from .activity import record_activity
+from .notifications import bump_unread_counts_on_commit, publish_notifications
+from .subscriptions import forget_project_access, forget_user_access
+from .images import delete_variants_later, generate_variants_later, needs_variants, variant_url
+from .realtime import (
+    publish_on_commit, project_group_name, active_modes, mode_frames,
+    MANAGEMENT_FIREHOSE_GROUP,
+)
 
 # Colors for user avatars
 USER_COLORS = ['#0d6efd', '#6f42c1', '#d63384', '#fd7e14', '#198754', '#20c997', '#dc3545']
@@ -12,52 +21,202 @@ USER_COLORS = ['#0d6efd', '#6f42c1', '#d63384', '#fd7e14', '#198754', '#20c997',
 @receiver(post_save, sender=Notification)
 def notification_created(sender, instance, created, **kwargs):
     if created:
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"user_{instance.user.id}_notifications",
-            {
-                "type": "send_notification",
-                "message": instance.message,
-                "link": instance.link,
-            }
-        )
+        publish_notifications([instance], bump_unread_counts_on_commit([instance.user_id]))
 
 @receiver(post_save, sender=ProjectUpdate)
 def project_update_created(sender, instance, created, **kwargs):
     if created:
-        channel_layer = get_channel_layer()
-        project = instance.project
-        
-        # File URLs
-        image_url = instance.image.url if instance.image else None
-        file_url = instance.file.url if instance.file else None
-        file_name = os.path.basename(instance.file.name) if instance.file else None
-        
-        # --- NEW: Get Profile Photo URL ---
-        sender_profile_photo = None
-        if instance.user and instance.user.profile_photo:
-            sender_profile_photo = instance.user.profile_photo.url
-        # ----------------------------------
-
-        # Decide layout
-        if instance.title:
-            html = render_to_string('pms/partials/timeline_item.html', {'update': instance})
-        else: 
-            html = render_to_string('pms/partials/chat_bubble.html', {'update': instance})
-        
-        async_to_sync(channel_layer.group_send)(
-            f"project_{project.id}_updates",
-            {
-                "type": "send_project_update",
-                "html": html,
-                "sender_id": instance.user.id,
-                "title": instance.title,
-                "message": instance.remarks,
-                "sender_username": instance.user.username,
-                "sender_profile_photo": sender_profile_photo, # <-- SEND THIS
-                "timestamp": instance.created_at.strftime("%I:%M %p"),
-                "image_url": image_url,
-                "file_url": file_url,
-                "file_name": file_name,
-            }
-        )
\ No newline at end of file
+        # Rendering and publishing happen on the dispatcher thread after the
+        # transaction commits (so attachments saved in the same transaction
+        # are included, and rolled-back updates are never broadcast).
+        publish_on_commit(lambda: build_project_update_events(instance))
+
+def build_project_update_events(instance):
+    # Nobody has the project (or the management firehose) open: skip the
+    # render and the group_send.
+    project_modes = active_modes(project_group_name(instance.project_id))
+    firehose_modes = active_modes(MANAGEMENT_FIREHOSE_GROUP)
+    modes = project_modes | firehose_modes
+    if not modes:
+        return []
+
+    image_url = instance.image.url if instance.image else None
+    image_thumb_url = variant_url(instance.image, 400) if instance.image else None
+    file_url = instance.file.url if instance.file else None
+    file_name = os.path.basename(instance.file.name) if instance.file else None
+    sender_profile_photo = None
+    if instance.user and instance.user.profile_photo:
+        sender_profile_photo = variant_url(instance.user.profile_photo, 64)
+
+    # Titled updates render as timeline items, chat messages as bubbles;
+    # only rendered if some client asked for html.
+    html = None
+    if modes & {'full', 'html'}:
+        template = 'pms/partials/timeline_item.html' if instance.title else 'pms/partials/chat_bubble.html'
+        html = render_to_string(template, {'update': instance})
+
+    fields = {
+        "type": "project_update",
+        "sender_id": instance.user.id,
+        "title": instance.title,
+        "message": instance.remarks,
+        "sender_username": instance.user.username,
+        "sender_profile_photo": sender_profile_photo,
+        "timestamp": instance.created_at.strftime("%I:%M %p"),
+        "image_url": image_url,
+        "image_thumb_url": image_thumb_url,
+        "file_url": file_url,
+        "file_name": file_name,
+    }
+    frames = mode_frames(modes, fields, html)
+    return project_events(instance.project_id, project_modes, firehose_modes, frames)
+
+def build_attachment_events(attachment):
+    # A file added to an update that was already broadcast (chunked
+    # uploads attach after the update is saved).
+    update = attachment.project_update
+    project_modes = active_modes(project_group_name(update.project_id))
+    firehose_modes = active_modes(MANAGEMENT_FIREHOSE_GROUP)
+    modes = project_modes | firehose_modes
+    if not modes:
+        return []
+    fields = {
+        "type": "attachment_added",
+        "update_id": update.id,
+        "title": update.title,
+        "file_url": attachment.file.url,
+        "file_name": os.path.basename(attachment.file.name),
+    }
+    return project_events(update.project_id, project_modes, firehose_modes, mode_frames(modes, fields))
+
+def project_events(project_id, project_modes, firehose_modes, frames):
+    events = []
+    if project_modes:
+        events.append((project_group_name(project_id),
+                       {"type": "send_project_update", "project_id": project_id, "frames": frames}))
+    if firehose_modes:
+        events.append((MANAGEMENT_FIREHOSE_GROUP,
+                       {"type": "send_firehose_update", "project_id": project_id, "frames": frames}))
+    return events
+
+# --- ACTIVITY FEED ---
+@receiver(post_save, sender=ProjectUpdate)
+def project_update_activity(sender, instance, created, **kwargs):
+    if not created:
+        return
+    who = instance.user.username if instance.user else "Someone"
+    if instance.category == 'RECOMMENDATION':
+        verb, message, url_name = ActivityVerb.RECOMMENDATION_POSTED, f"{who} posted recommendation: {instance.title}", 'project_detail'
+    elif instance.title:
+        verb, message, url_name = ActivityVerb.UPDATE_POSTED, f"{who} posted update: {instance.title}", 'project_updates'
+    else:
+        verb, message, url_name = ActivityVerb.CHAT_MESSAGE, f"{who} sent a chat message", 'project_chat'
+    record_activity(instance.project_id, verb, message, actor=instance.user, link=reverse(url_name, args=[instance.project_id]))
+
+@receiver(post_save, sender=ProjectDocument)
+def project_document_activity(sender, instance, created, **kwargs):
+    if not created:
+        return
+    who = instance.uploaded_by.username if instance.uploaded_by else "Someone"
+    name = instance.description or os.path.basename(instance.document.name)
+    record_activity(
+        instance.project_id, ActivityVerb.DOCUMENT_UPLOADED, f"{who} uploaded {name}",
+        actor=instance.uploaded_by, link=reverse('project_detail', args=[instance.project_id])
+    )
+
+@receiver(pre_save, sender=WorkUpdate)
+def remember_work_status(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._previous_status = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+@receiver(post_save, sender=WorkUpdate)
+def work_update_activity(sender, instance, created, **kwargs):
+    # Re-posting the same status only edits the remarks.
+    if not created and instance.__dict__.pop('_previous_status', None) == instance.status:
+        return
+    record_activity(
+        instance.project_id, ActivityVerb.WORK_STATUS,
+        f"{instance.member.username} set work status to {instance.get_status_display()}",
+        actor=instance.member, link=reverse('project_list')
+    )
+
+# --- SOCKET ACCESS CACHE ---
+@receiver(post_save, sender=ProjectMember)
+@receiver(post_delete, sender=ProjectMember)
+def project_member_changed(sender, instance, **kwargs):
+    forget_project_access(instance.user_id, instance.project_id)
+
+# Team head and role changes also move access; the old value is read
+# before the save.
+@receiver(pre_save, sender=Project)
+def remember_team_head(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is not None and (update_fields is None or 'team_head' in update_fields):
+        instance._previous_team_head_id = sender.objects.filter(pk=instance.pk).values_list('team_head_id', flat=True).first()
+
+@receiver(post_save, sender=Project)
+def team_head_changed(sender, instance, **kwargs):
+    previous = instance.__dict__.pop('_previous_team_head_id', None)
+    if previous != instance.team_head_id:
+        for user_id in {previous, instance.team_head_id} - {None}:
+            forget_project_access(user_id, instance.pk)
+
+@receiver(pre_save, sender=User)
+def remember_role(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is not None and (update_fields is None or 'role' in update_fields):
+        instance._previous_role = sender.objects.filter(pk=instance.pk).values_list('role', flat=True).first()
+
+@receiver(post_save, sender=User)
+def role_changed(sender, instance, **kwargs):
+    previous = instance.__dict__.pop('_previous_role', None)
+    if previous is not None and previous != instance.role:
+        forget_user_access(instance.pk)
+
+# --- IMAGE VARIANTS ---
+# A newly stored image gets its thumbnails from the job worker; saves that
+# leave the image alone are a cache hit in needs_variants().
+def queue_image_variants(instance, field_name, update_fields):
+    if update_fields is not None and field_name not in update_fields:
+        return
+    field = getattr(instance, field_name)
+    if field and needs_variants(field.name):
+        generate_variants_later(field.name)
+
+@receiver(post_save, sender=Project)
+def project_logo_variants(sender, instance, update_fields=None, **kwargs):
+    queue_image_variants(instance, 'project_logo', update_fields)
+
+@receiver(post_save, sender=User)
+def profile_photo_variants(sender, instance, update_fields=None, **kwargs):
+    queue_image_variants(instance, 'profile_photo', update_fields)
+
+@receiver(post_save, sender=ProjectUpdate)
+def chat_image_variants(sender, instance, created, **kwargs):
+    if created:
+        queue_image_variants(instance, 'image', None)
+
+# The thumbnails of a replaced or deleted image go with it. The old name is
+# read before the save and the variants dropped once it commits.
+IMAGE_FIELDS = {Project: 'project_logo', User: 'profile_photo', ProjectUpdate: 'image'}
+
+@receiver(pre_save, sender=Project)
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=ProjectUpdate)
+def remember_replaced_image(sender, instance, update_fields=None, **kwargs):
+    field_name = IMAGE_FIELDS[sender]
+    if instance.pk is None or (update_fields is not None and field_name not in update_fields):
+        return
+    old = sender.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+    if old and old != getattr(instance, field_name).name:
+        instance._replaced_image = old
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ProjectUpdate)
+def drop_replaced_image_variants(sender, instance, **kwargs):
+    delete_variants_later(instance.__dict__.pop('_replaced_image', None))
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=ProjectUpdate)
+def drop_deleted_image_variants(sender, instance, **kwargs):
+    delete_variants_later(getattr(instance, IMAGE_FIELDS[sender]).name)
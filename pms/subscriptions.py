@@ -0,0 +1,121 @@
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+
+from users.models import User
+from .models import Project
+from .realtime import query_param
+
+SUBSCRIPTION_TOKEN_SALT = 'pms.subscriptions.token'
+SUBSCRIPTION_TOKEN_MAX_AGE = getattr(settings, 'REALTIME_TOKEN_MAX_AGE', 15 * 60)
+PROJECT_ACCESS_TIMEOUT = getattr(settings, 'REALTIME_ACCESS_CACHE_TIMEOUT', 5 * 60)
+
+
+# --- SIGNED SUBSCRIPTION TOKENS ---
+# Issued while rendering a page the user is already authorized for, and
+# checked on connect with an HMAC instead of a session + user fetch.
+def issue_subscription_token(user, project_id=None):
+    payload = {'u': user.id}
+    if project_id is not None:
+        payload['p'] = int(project_id)
+    return signing.dumps(payload, salt=SUBSCRIPTION_TOKEN_SALT)
+
+
+def read_subscription_token(token):
+    """The token's payload, or None if it is forged or expired."""
+    try:
+        return signing.loads(token, salt=SUBSCRIPTION_TOKEN_SALT, max_age=SUBSCRIPTION_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
+# --- PROJECT ACCESS (cached) ---
+def project_access_key(user_id, project_id):
+    return f"pms:access:{user_id}:{project_id}"
+
+
+def user_can_access_project(user_id, project_id):
+    """Same rule as the project views (management, team head or member), cached per user and project."""
+    key = project_access_key(user_id, project_id)
+    allowed = cache.get(key)
+    if allowed is None:
+        allowed = (
+            user_is_management(user_id)
+            or Project.objects.filter(Q(team_head_id=user_id) | Q(members__id=user_id), id=project_id).exists()
+        )
+        cache.set(key, allowed, PROJECT_ACCESS_TIMEOUT)
+    return allowed
+
+
+def management_key(user_id):
+    return f"pms:access:{user_id}:management"
+
+
+def user_is_management(user_id):
+    key = management_key(user_id)
+    allowed = cache.get(key)
+    if allowed is None:
+        allowed = User.objects.filter(id=user_id, role=User.Role.MANAGEMENT).exists()
+        cache.set(key, allowed, PROJECT_ACCESS_TIMEOUT)
+    return allowed
+
+
+def forget_project_access(user_id, project_id):
+    cache.delete(project_access_key(user_id, project_id))
+
+
+def forget_user_access(user_id):
+    """Drop every cached answer for ``user_id`` (their role changed)."""
+    keys = [project_access_key(user_id, pid) for pid in Project.objects.values_list('id', flat=True)]
+    cache.delete_many(keys + [management_key(user_id)])
+
+
+def subscription_allows(scope, project_id, token=None):
+    """
+    True if the connection's token, or ``token`` when given (issued to the
+    same user), was issued for this project.
+    """
+    if token:
+        claims = read_subscription_token(token) or {}
+        if claims.get('u') != scope['user'].id:
+            return False
+    else:
+        claims = scope.get('subscription') or {}
+    return claims.get('p') == int(project_id)
+
+
+# --- ASGI MIDDLEWARE ---
+class SubscriptionTokenMiddleware:
+    """
+    Authenticates a WebSocket by its ``?token=`` when it carries a valid
+    one, without touching the session or user tables. Anything else goes
+    through the regular session-backed AuthMiddlewareStack.
+
+    A token user is an unsaved ``User`` with only ``id`` set: enough for
+    group names and access checks, nothing more.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.session_auth = AuthMiddlewareStack(inner)
+
+    async def __call__(self, scope, receive, send):
+        token = query_param(scope, 'token')
+        claims = read_subscription_token(token) if token else None
+        if claims is None:
+            return await self.session_auth(scope, receive, send)
+        scope = dict(scope, user=User(id=claims['u']), subscription=claims)
+        return await self.inner(scope, receive, send)
+
+
+async def authorize_project(scope, project_id, token=None):
+    """A project token for this project, or a cached membership check for anyone else signed in."""
+    if subscription_allows(scope, project_id, token):
+        return True
+    user = scope['user']
+    if not user.is_authenticated:
+        return False
+    return await database_sync_to_async(user_can_access_project)(user.id, project_id)
@@ -1,4 +1,7 @@
 from django import template
+from django.utils.html import format_html, format_html_join
+
+from pms.images import variant_image_set, variant_srcset, variant_url
 
 register = template.Library()
 
@@ -34,4 +37,32 @@ def get_item(dictionary, key):
 
 @register.filter
 def get_attribute(obj, attr_name):
-    return getattr(obj, attr_name, None)
\ No newline at end of file
+    return getattr(obj, attr_name, None)
+
+# --- IMAGE VARIANTS (see pms.images) ---
+@register.filter
+def image_variant(field, size):
+    """URL of the smallest thumbnail of ``field`` at least ``size`` px wide; the original until one exists."""
+    return variant_url(field, int(size))
+
+@register.filter
+def image_srcset(field):
+    """``srcset`` listing the thumbnails of ``field``; empty until they exist."""
+    return variant_srcset(field)
+
+@register.filter
+def image_background(field, size):
+    """
+    ``background-image`` declarations for ``field`` shown ``size`` px wide:
+    a plain url() and, when a 2x thumbnail exists, an image-set() that
+    browsers without support skip.
+    """
+    urls = variant_image_set(field, int(size))
+    if not urls:
+        return ''
+    css = format_html("background-image: url('{}')", urls[0][0])
+    if len(urls) > 1:
+        css += format_html("; background-image: image-set({})",
+                           format_html_join(', ', "url('{}') {}x", urls))
+    return css
+
@@ -1,3 +1,981 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from users.models import User
+from .choices import (
+    ActivityVerb, IssueSubject, JobStatus, NotificationKind, ProjectPriority, ReminderKind, UploadStatus, UploadTarget,
+    WorkStatus,
+)
+from .models import (
+    ActivityEvent, DailyUpdate, Issue, Job, Notification, Project, ProjectDocument, ProjectMember, ProjectUpdate, ProjectUpdateAttachment,
+    ScheduledRun, ScheduleEntry, Upload,
+)
+from .broadcast import BroadcastHub, is_broadcast_group
+from .compliance import compliance_summary, expected_reporters, missed_days, remind_missing_updates, working_days
+from .consumers import OutboxMixin, StreamConsumer, pick_frame
+from .digests import send_digests
+from .images import variants_cache_key
+from .jobs import JOB_LOCK_TIMEOUT, Heartbeat, claim_jobs, enqueue, job_handler, run_jobs, send_email_later, send_queued_emails
+from .layers import UnixSocketChannelLayer
+from .notifications import (
+    coalesce_key_for, decode_inbox_cursor, decode_replay_cursor, deliver, encode_inbox_cursor, get_latest_replay_cursor,
+    get_missed_notifications, get_unread_count, notify_users, unread_cache_key,
+)
+from .realtime import Dispatcher, batch_frame, mode_frames, project_group_name, publish_on_commit, stream_frame
+from .reminders import find_due_reminders, send_reminders
+from .scheduler import SCHEDULER_LEASE_SECONDS, CronExpression, acquire_lease, fire_due, sync_entries
+from .subscriptions import SUBSCRIPTION_TOKEN_MAX_AGE, issue_subscription_token, user_can_access_project, user_is_management
+from .templatetags.pms_extras import image_background
+from .uploads import UploadError, complete_upload, start_upload, store_chunk
+
+
+class ProjectFixtureMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('mgr', 'mgr@example.com', 'pw', role=User.Role.MANAGEMENT)
+        cls.head = User.objects.create_user('head', 'head@example.com', 'pw', role=User.Role.EMPLOYEE)
+        cls.member = User.objects.create_user('member', 'member@example.com', 'pw', role=User.Role.EMPLOYEE)
+        cls.outsider = User.objects.create_user('outsider', 'out@example.com', 'pw', role=User.Role.EMPLOYEE)
+        cls.project = Project.objects.create(name='Apollo', created_by=cls.manager, team_head=cls.head)
+        ProjectMember.objects.create(project=cls.project, user=cls.member)
+
+    def client_for(self, user):
+        self.client.force_login(user)
+        return self.client
+
+
+# --- CONDITIONAL GET ---
+class ProjectPageEtagTests(ProjectFixtureMixin, TestCase):
+    def chat_url(self):
+        return f'/project/{self.project.id}/chat/'
+
+    def test_member_gets_etag_and_304(self):
+        client = self.client_for(self.member)
+        response = client.get(self.chat_url())
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(client.get(self.chat_url(), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_new_message_changes_etag(self):
+        client = self.client_for(self.member)
+        etag = client.get(self.chat_url())['ETag']
+        ProjectUpdate.objects.create(project=self.project, user=self.head, category='UPDATE', remarks='hi')
+        self.assertEqual(client.get(self.chat_url(), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_outsider_redirect_has_no_etag(self):
+        response = self.client_for(self.outsider).get(self.chat_url())
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('ETag', response)
+
+    def test_removed_member_is_not_revalidated(self):
+        client = self.client_for(self.member)
+        etag = client.get(self.chat_url())['ETag']
+        ProjectMember.objects.filter(project=self.project, user=self.member).delete()
+        self.assertEqual(client.get(self.chat_url(), HTTP_IF_NONE_MATCH=etag).status_code, 302)
+
+    def test_attachment_on_an_existing_update_changes_etag(self):
+        update = ProjectUpdate.objects.create(project=self.project, user=self.head, category='UPDATE', title='Plan', remarks='.')
+        client = self.client_for(self.member)
+        url = f'/project/{self.project.id}/updates/'
+        etag = client.get(url)['ETag']
+        ProjectUpdateAttachment.objects.create(project_update=update, file='project_updates/plan.pdf')
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cached_page_is_not_revalidated_past_its_token_window(self):
+        client = self.client_for(self.member)
+        etag = client.get(self.chat_url())['ETag']
+        later = time.time() + SUBSCRIPTION_TOKEN_MAX_AGE / 2
+        with mock.patch('pms.views.time.time', return_value=later):
+            self.assertEqual(client.get(self.chat_url(), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_new_notification_changes_etag(self):
+        client = self.client_for(self.member)
+        etag = client.get(self.chat_url())['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_users([self.member.id], 'ping')
+        self.assertEqual(client.get(self.chat_url(), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_new_session_is_not_revalidated(self):
+        client = self.client_for(self.member)
+        etag = client.get(self.chat_url())['ETag']
+        client.logout()
+        client.force_login(self.member)
+        self.assertEqual(client.get(self.chat_url(), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# --- REALTIME TOKENS ---
+class SubscriptionTokenTests(ProjectFixtureMixin, TestCase):
+    async def connect(self, path, cookie=None):
+        from config.asgi import application
+        headers = [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={cookie}'.encode())] if cookie else []
+        communicator = WebsocketCommunicator(application, path, headers=headers)
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_session_connect_gets_a_token(self):
+        await self.client.aforce_login(self.member)
+        communicator, connected = await self.connect('/ws/notifications/', self.client.cookies[settings.SESSION_COOKIE_NAME].value)
+        self.assertTrue(connected)
+        self.assertEqual(json.loads(await communicator.receive_from())['type'], 'token')
+        await communicator.disconnect()
+
+    async def test_token_connect_does_not_renew_the_token(self):
+        token = issue_subscription_token(self.member)
+        communicator, connected = await self.connect(f'/ws/notifications/?token={token}')
+        self.assertTrue(connected)
+        self.assertEqual(json.loads(await communicator.receive_from())['type'], 'unread_count')
+        await communicator.disconnect()
+
+    async def test_forged_token_without_session_is_refused(self):
+        token = issue_subscription_token(self.member)[:-2] + 'xx'
+        communicator, connected = await self.connect(f'/ws/notifications/?token={token}')
+        self.assertFalse(connected)
+
+    async def test_project_token_is_bound_to_its_project(self):
+        other = await Project.objects.acreate(name='Other', created_by=self.manager)
+        token = issue_subscription_token(self.member, self.project.id)
+        communicator, connected = await self.connect(f'/ws/project/{self.project.id}/updates/?token={token}')
+        self.assertTrue(connected)
+        await communicator.disconnect()
+        communicator, connected = await self.connect(f'/ws/project/{other.id}/updates/?token={token}')
+        self.assertFalse(connected)
+
+
+class AccessCacheTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_team_head_change_is_seen_at_once(self):
+        self.assertTrue(user_can_access_project(self.head.id, self.project.id))
+        self.assertFalse(user_can_access_project(self.outsider.id, self.project.id))
+        self.project.team_head = self.outsider
+        self.project.save()
+        self.assertFalse(user_can_access_project(self.head.id, self.project.id))
+        self.assertTrue(user_can_access_project(self.outsider.id, self.project.id))
+
+    def test_role_change_is_seen_at_once(self):
+        self.assertFalse(user_is_management(self.outsider.id))
+        self.assertFalse(user_can_access_project(self.outsider.id, self.project.id))
+        self.outsider.role = User.Role.MANAGEMENT
+        self.outsider.save()
+        self.assertTrue(user_is_management(self.outsider.id))
+        self.assertTrue(user_can_access_project(self.outsider.id, self.project.id))
+
+
+class RecordingOutbox(OutboxMixin):
+    channel_name = 'test!socket'
+    coalesce_window = 0
+    outbox_size = 3
+    max_unacked_bytes = 100
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, text_data=None, bytes_data=None):
+        self.sent.append(text_data if text_data is not None else bytes_data)
+
+    async def close(self, code=None):
+        self.sent.append(code)
+
+
+class OutboxBackpressureTests(SimpleTestCase):
+    async def settle(self):
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+    async def test_writer_waits_for_the_client_to_acknowledge(self):
+        outbox = RecordingOutbox()
+        outbox.start_outbox()
+        self.addCleanup(outbox.stop_outbox)
+        await outbox.enqueue('x' * 60)
+        await self.settle()
+        probe = json.loads(outbox.sent[-1])
+        self.assertEqual(probe, {'type': 'ping', 'at': 60})
+
+        # No ack yet: the client is not held back until it opts in.
+        outbox.record_ack({'type': 'pong', 'at': 0})
+        await outbox.enqueue('y' * 60)
+        await self.settle()
+        self.assertEqual(outbox.sent.count('y' * 60), 1)
+        self.assertEqual(outbox.unacked_bytes(), 120)
+
+        # 120 unacknowledged > 100: the next frame waits, then the backlog overflows.
+        await outbox.enqueue('z')
+        await self.settle()
+        self.assertNotIn('z', outbox.sent)
+        for frame in 'abcd':
+            await outbox.enqueue(frame)
+        outbox.record_ack({'type': 'pong', 'at': 120})
+        await self.settle()
+        self.assertEqual(json.loads(outbox.sent[-1]), {'type': 'resync'})
+        self.assertNotIn('z', outbox.sent)
+
+    def test_bogus_acks_are_ignored(self):
+        outbox = RecordingOutbox()
+        outbox.sent_bytes, outbox.acked_bytes = 50, None
+        for at in ('50', True, -1, 51, None):
+            outbox.record_ack({'type': 'pong', 'at': at})
+        self.assertIsNone(outbox.acked_bytes)
+
+
+# --- REALTIME SOCKETS ---
+class StreamSocketTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    async def connect(self, user, path='/ws/stream/'):
+        from config.asgi import application
+        communicator = WebsocketCommunicator(application, f'{path}?token={issue_subscription_token(user)}')
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    async def receive(self, communicator):
+        return json.loads(await communicator.receive_from())
+
+    async def publish(self, project_id, text):
+        await get_channel_layer().group_send(project_group_name(project_id), {
+            'type': 'send_project_update', 'project_id': project_id, 'frames': {'full': text},
+        })
+
+    async def test_anonymous_connect_is_refused(self):
+        from config.asgi import application
+        communicator = WebsocketCommunicator(application, '/ws/stream/')
+        self.assertEqual(await communicator.connect(), (False, 4003))
+
+    async def test_notifications_and_project_streams(self):
+        communicator, connected, _ = await self.connect(self.member)
+        self.assertTrue(connected)
+        await communicator.send_json_to({'type': 'subscribe', 'stream': 'notifications'})
+        frame = await self.receive(communicator)
+        self.assertEqual((frame['stream'], frame['event']['type']), ('notifications', 'unread_count'))
+
+        await communicator.send_json_to({'type': 'subscribe', 'stream': f'project:{self.project.id}', 'mode': 'full'})
+        self.assertEqual(await self.receive(communicator), {'type': 'subscribed', 'stream': f'project:{self.project.id}'})
+        await self.publish(self.project.id, '{"type": "project_update", "title": "Kickoff"}')
+        frame = await self.receive(communicator)
+        self.assertEqual(frame, {'stream': f'project:{self.project.id}', 'event': {'type': 'project_update', 'title': 'Kickoff'}})
+
+        await communicator.send_json_to({'type': 'unsubscribe', 'stream': f'project:{self.project.id}'})
+        self.assertEqual((await self.receive(communicator))['type'], 'unsubscribed')
+        await self.publish(self.project.id, '{"type": "project_update"}')
+        self.assertTrue(await communicator.receive_nothing(0.2))
+        await communicator.disconnect()
+
+    async def test_subscriptions_are_authorized(self):
+        communicator, _, _ = await self.connect(self.outsider)
+        await communicator.send_json_to({'type': 'subscribe', 'stream': f'project:{self.project.id}'})
+        self.assertEqual(await self.receive(communicator),
+                         {'type': 'error', 'stream': f'project:{self.project.id}', 'reason': 'forbidden'})
+        await communicator.send_json_to({'type': 'subscribe', 'stream': 'firehose'})
+        self.assertEqual((await self.receive(communicator))['reason'], 'forbidden')
+        await communicator.send_json_to({'type': 'subscribe', 'stream': 'bogus'})
+        self.assertEqual((await self.receive(communicator))['reason'], 'unknown stream')
+        await communicator.disconnect()
+
+    async def test_slow_consumer_is_told_to_resync(self):
+        with mock.patch.object(StreamConsumer, 'outbox_size', 2), mock.patch.object(StreamConsumer, 'coalesce_window', 0.2):
+            communicator, _, _ = await self.connect(self.member)
+            await communicator.send_json_to({'type': 'subscribe', 'stream': f'project:{self.project.id}'})
+            await self.receive(communicator)
+            for n in range(5):
+                await self.publish(self.project.id, json.dumps({'type': 'project_update', 'n': n}))
+            self.assertEqual(await self.receive(communicator), {'type': 'resync'})
+            self.assertTrue(await communicator.receive_nothing(0.3))
+            await communicator.disconnect()
+
+    async def test_burst_goes_out_as_one_batch(self):
+        with mock.patch.object(StreamConsumer, 'coalesce_window', 0.2):
+            communicator, _, _ = await self.connect(self.member)
+            await communicator.send_json_to({'type': 'subscribe', 'stream': f'project:{self.project.id}'})
+            await self.receive(communicator)
+            for n in range(3):
+                await self.publish(self.project.id, json.dumps({'n': n}))
+            frame = await self.receive(communicator)
+            self.assertEqual(frame['type'], 'batch')
+            self.assertEqual([e['event']['n'] for e in frame['events']], [0, 1, 2])
+            await communicator.disconnect()
+
+    async def test_heartbeat_and_idle_timeout(self):
+        with mock.patch.object(StreamConsumer, 'heartbeat_interval', 0.05), \
+                mock.patch.object(StreamConsumer, 'idle_timeout', 0.3):
+            communicator, _, _ = await self.connect(self.member)
+            self.assertEqual(await self.receive(communicator), {'type': 'ping'})
+            await communicator.send_json_to({'type': 'pong'})
+            output = None
+            for _ in range(20):
+                output = await communicator.receive_output(1)
+                if output['type'] == 'websocket.close':
+                    break
+            self.assertEqual(output, {'type': 'websocket.close', 'code': 4000})
+
+    async def test_oldest_socket_is_evicted_past_the_cap(self):
+        with mock.patch.object(StreamConsumer, 'max_sockets_per_user', 1):
+            first, _, _ = await self.connect(self.member)
+            second, _, _ = await self.connect(self.member)
+            self.assertEqual(await first.receive_output(1), {'type': 'websocket.close', 'code': 4001})
+            self.assertTrue(await second.receive_nothing(0.1))
+            await second.disconnect()
+
+
+class StreamFrameTests(SimpleTestCase):
+    def test_text_frames_are_wrapped_without_decoding(self):
+        frame = stream_frame('firehose', '{"type": "project_update"}', project_id=7)
+        self.assertEqual(json.loads(frame), {'stream': 'firehose', 'project_id': 7, 'event': {'type': 'project_update'}})
+        batch = batch_frame([stream_frame('notifications', '{"n": 1}'), stream_frame('notifications', '{"n": 2}')])
+        self.assertEqual([e['event']['n'] for e in json.loads(batch)['events']], [1, 2])
+
+    def test_msgpack_frames(self):
+        event = msgpack.packb({'n': 1})
+        self.assertEqual(msgpack.unpackb(stream_frame('project:3', event)), ['project:3', {'n': 1}])
+        self.assertEqual(msgpack.unpackb(stream_frame('firehose', event, project_id=3)), ['firehose', {'n': 1}, 3])
+        self.assertEqual(msgpack.unpackb(batch_frame([event, event])), [{'n': 1}, {'n': 1}])
+
+    def test_mode_frames_and_fallback(self):
+        frames = mode_frames({'html', 'fields'}, {'type': 'project_update', 'title': None, 'sender_id': 4, 'extra': 'x'}, '<li>')
+        self.assertEqual(json.loads(frames['html']), {'type': 'project_update', 'sender_id': 4, 'html': '<li>'})
+        self.assertEqual(json.loads(frames['fields']), {'type': 'project_update', 'sender_id': 4, 'extra': 'x'})
+        self.assertEqual(pick_frame(frames, 'html'), frames['html'])
+        # A socket whose mode the publisher did not know about still gets a text frame.
+        self.assertIn(pick_frame(frames, 'full'), (frames['html'], frames['fields']))
+
+
+class FakePubSub:
+    def __init__(self):
+        self.topics = set()
+
+    async def subscribe(self, topic):
+        self.topics.add(topic)
+
+    async def unsubscribe(self, topic):
+        self.topics.discard(topic)
+
+    async def listen(self):
+        return
+        yield
+
+
+class BroadcastHubTests(SimpleTestCase):
+    def make_hub(self):
+        hub = BroadcastHub('redis://unused')
+        hub._client = mock.Mock(publish=mock.AsyncMock())
+        hub._client.pubsub.return_value = FakePubSub()
+        return hub
+
+    async def test_one_subscription_per_group_and_local_fan_out(self):
+        hub = self.make_hub()
+        first, second, broken = (mock.Mock(dispatch=mock.AsyncMock(), channel_name=n) for n in 'abc')
+        broken.dispatch.side_effect = RuntimeError('gone')
+        for consumer in (first, broken, second):
+            await hub.add('project_1_updates', consumer)
+        self.assertEqual(hub._pubsub.topics, {'pms:broadcast:project_1_updates'})
+
+        message = {'type': 'send_project_update', 'project_id': 1}
+        with self.assertLogs('pms.broadcast', 'ERROR'):
+            await hub._fan_out(b'pms:broadcast:project_1_updates', msgpack.packb(message))
+        first.dispatch.assert_awaited_once_with(message)
+        second.dispatch.assert_awaited_once_with(message)
+
+        for consumer in (first, broken, second):
+            await hub.discard('project_1_updates', consumer)
+        self.assertEqual(hub._pubsub.topics, set())
+
+    async def test_publish_writes_once(self):
+        hub = self.make_hub()
+        await hub.publish('management_firehose', {'type': 'x'})
+        hub._client.publish.assert_awaited_once_with('pms:broadcast:management_firehose', msgpack.packb({'type': 'x'}))
+
+    def test_groups_are_matched_by_pattern(self):
+        with mock.patch('pms.broadcast.BROADCAST_GROUPS', ['project_*_updates']):
+            self.assertTrue(is_broadcast_group('project_7_updates'))
+            self.assertFalse(is_broadcast_group('user_7_notifications'))
+
+
+class UnixSocketLayerTests(SimpleTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+
+    async def test_send_and_group_send_across_processes(self):
+        receiver = UnixSocketChannelLayer(path=self.path)
+        sender = UnixSocketChannelLayer(path=self.path)
+        try:
+            channel = await receiver.new_channel()
+            await receiver.group_add('project_1_updates', channel)
+            await sender.group_send('project_1_updates', {'type': 'hello', 'n': 1})
+            self.assertEqual(await asyncio.wait_for(receiver.receive(channel), 1), {'type': 'hello', 'n': 1})
+            await sender.send(channel, {'type': 'direct'})
+            self.assertEqual(await asyncio.wait_for(receiver.receive(channel), 1), {'type': 'direct'})
+            with self.assertRaises(ValueError):
+                await sender.group_send('project_1_updates', {'type': 'big', 'data': 'x' * (receiver.max_message + 1)})
+        finally:
+            await receiver.close()
+            await sender.close()
+
+    async def test_dead_peers_are_forgotten(self):
+        dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        dead.bind(os.path.join(self.path, 'gone-abcd.sock'))
+        dead.close()  # the process died without unlinking its socket
+        sender = UnixSocketChannelLayer(path=self.path)
+        await sender.group_send('project_1_updates', {'type': 'hello'})
+        self.assertEqual(os.listdir(self.path), [])
+        await sender.close()
+
+
+class DispatcherTests(TestCase):
+    def test_builds_and_publishes_off_the_request_thread(self):
+        sent = []
+
+        async def record(layer, group, message):
+            sent.append((group, message, threading.current_thread().name))
+
+        def broken():
+            raise RuntimeError('template error')
+
+        dispatcher = Dispatcher(max_queue=10, batch_size=5)
+        with mock.patch('pms.realtime.send_to_group', record), self.assertLogs('pms.realtime', 'ERROR'):
+            dispatcher.submit(lambda: [('g1', {'type': 'a'})])
+            dispatcher.submit(broken)
+            dispatcher.submit(lambda: [('g2', {'type': 'b'})])
+            dispatcher.flush(5)
+        self.assertEqual(sorted(g for g, _, _ in sent), ['g1', 'g2'])
+        self.assertEqual({t for _, _, t in sent}, {'pms-realtime-dispatch'})
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        started, release = threading.Event(), threading.Event()
+
+        def stall():
+            started.set()
+            release.wait(5)
+            return []
+
+        dispatcher = Dispatcher(max_queue=1, batch_size=1)
+        dispatcher.submit(stall)
+        started.wait(5)
+        self.assertTrue(dispatcher.submit(lambda: []))
+        with self.assertLogs('pms.realtime', 'WARNING'):
+            self.assertFalse(dispatcher.submit(lambda: []))
+        release.set()
+        dispatcher.flush(5)
+
+    def test_publish_waits_for_commit(self):
+        build = mock.Mock(return_value=[])
+        with mock.patch('pms.realtime.dispatcher') as dispatcher:
+            with self.captureOnCommitCallbacks(execute=True):
+                publish_on_commit(build)
+                dispatcher.submit.assert_not_called()
+            dispatcher.submit.assert_called_once_with(build)
+
+
+# --- CHUNKED UPLOADS ---
+class UploadCompletionTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, data, target=UploadTarget.PROJECT_DOCUMENT, target_id=None, filename='plan.pdf'):
+        upload = start_upload(self.member, filename, len(data), target, target_id or self.project.id)
+        store_chunk(upload, 0, data)
+        return upload
+
+    def test_second_complete_is_refused(self):
+        upload = self.upload(b'spec')
+        complete_upload(upload)
+        with self.assertRaises(UploadError) as cm:
+            complete_upload(Upload.objects.get(pk=upload.pk))
+        self.assertEqual(cm.exception.status, 409)
+        self.assertEqual(ProjectDocument.objects.count(), 1)
+
+    def test_concurrent_complete_loses_the_claim(self):
+        upload = self.upload(b'spec')
+        stale = Upload.objects.get(pk=upload.pk)
+        complete_upload(upload)
+        # ``stale`` still reads ACTIVE, as a request that loaded it earlier would.
+        with self.assertRaises(UploadError) as cm:
+            complete_upload(stale)
+        self.assertEqual(cm.exception.status, 409)
+        self.assertEqual(ProjectDocument.objects.count(), 1)
+
+    def test_resent_chunk_replaces_the_stored_copy(self):
+        upload = self.upload(b'spec')
+        store_chunk(upload, 0, b'SPEC')
+        chunk = upload.chunks.get()
+        self.assertTrue(chunk.path.endswith('/000000'))
+        self.assertEqual(os.listdir(os.path.dirname(os.path.join(settings.MEDIA_ROOT, chunk.path))), ['000000'])
+        complete_upload(upload)
+        with ProjectDocument.objects.get().document.open('rb') as f:
+            self.assertEqual(f.read(), b'SPEC')
+
+    def test_chunks_are_refused_once_assembly_started(self):
+        upload = self.upload(b'spec')
+        Upload.objects.filter(pk=upload.pk).update(status=UploadStatus.ASSEMBLING)
+        with self.assertRaises(UploadError) as cm:
+            store_chunk(upload, 0, b'spec')  # ``upload`` still reads ACTIVE
+        self.assertEqual(cm.exception.status, 409)
+
+    def test_failed_attach_releases_the_claim_and_the_file(self):
+        upload = self.upload(b'spec')
+        with mock.patch.object(ProjectDocument, 'save', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                complete_upload(upload)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, UploadStatus.ACTIVE)
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'project_documents')), [])
+        complete_upload(upload)
+        self.assertEqual(ProjectDocument.objects.count(), 1)
+
+    def test_unexpected_errors_are_answered_as_json(self):
+        upload = self.upload(b'spec')
+        with mock.patch('pms.views.complete_upload', side_effect=RuntimeError('boom')), \
+                self.assertLogs('pms.views', 'ERROR'):
+            response = self.client_for(self.member).post(f'/uploads/{upload.token}/complete/')
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('error', response.json())
+
+    def test_replacing_an_issue_attachment_deletes_the_old_file(self):
+        issue = Issue.objects.create(subject=IssueSubject.choices[0][0], description='broken', user=self.member)
+        issue.attachment.save('old.txt', ContentFile(b'old'))
+        old = issue.attachment.name
+        upload = self.upload(b'new', UploadTarget.ISSUE_ATTACHMENT, issue.id, 'new.txt')
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_upload(upload)
+        issue.refresh_from_db()
+        self.assertNotEqual(issue.attachment.name, old)
+        self.assertFalse(issue.attachment.storage.exists(old))
+        self.assertEqual(Upload.objects.get(pk=upload.pk).status, UploadStatus.COMPLETE)
+
+    def test_attaching_to_an_existing_update_is_recorded_and_broadcast(self):
+        update = ProjectUpdate.objects.create(project=self.project, user=self.head, title='Sprint 3')
+        upload = start_upload(self.head, 'logs.zip', 4, UploadTarget.UPDATE_ATTACHMENT, update.id)
+        store_chunk(upload, 0, b'logs')
+        with mock.patch('pms.uploads.publish_on_commit') as publish:
+            complete_upload(upload)
+        event = ActivityEvent.objects.filter(verb=ActivityVerb.ATTACHMENT_ADDED).get()
+        self.assertEqual(event.project_id, self.project.id)
+        self.assertIn('logs.zip', event.message)
+        self.assertIn('Sprint 3', event.message)
+        publish.assert_called_once()
+        self.assertEqual(update.attachments.count(), 1)
+
+    def test_issue_form_answers_xhr_with_the_new_id(self):
+        client = self.client_for(self.member)
+        response = client.post('/issues/submit/', {'subject': IssueSubject.choices[0][0], 'description': 'broken'},
+                               HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], Issue.objects.get().id)
+        response = client.post('/issues/submit/', {}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+
+
+# --- NOTIFICATION INBOX ---
+class InboxCursorTests(ProjectFixtureMixin, TestCase):
+    def test_round_trip(self):
+        notification = Notification.objects.create(user=self.member, message='hello')
+        self.assertEqual(decode_inbox_cursor(encode_inbox_cursor(notification)), (notification.timestamp, notification.id))
+
+    def test_malformed_and_out_of_range_cursors_raise_value_error(self):
+        for cursor in ('', 'abc', '12', '12_x', '99999999999999999999999_1', '-99999999999999999999999_1',
+                       '1_99999999999999999999999', '1_0'):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_inbox_cursor(cursor)
+
+    def test_inbox_view_ignores_an_overflowing_cursor(self):
+        Notification.objects.create(user=self.member, message='hello')
+        response = self.client_for(self.member).get('/notifications/', {'before': '99999999999999999999999_1'})
+        self.assertEqual(response.status_code, 200)
+
+
+class UnreadCountTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        cache.delete(unread_cache_key(self.member.id))
+
+    def test_counter_moves_only_when_the_insert_commits(self):
+        self.assertEqual(get_unread_count(self.member.id), 0)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Notification.objects.create(user=self.member, message='rolled back')
+            raise RuntimeError
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_users([self.member.id], 'kept')
+        self.assertEqual(cache.get(unread_cache_key(self.member.id)), 1)
+
+    def test_pages_render_when_the_cache_is_down(self):
+        Notification.objects.create(user=self.member, message='hello')
+        broken = mock.Mock(**{name + '.side_effect': ConnectionError for name in ('get', 'set', 'incr', 'decr')})
+        with mock.patch('pms.notifications.cache', broken), self.assertLogs('pms.notifications', 'WARNING'):
+            self.assertEqual(get_unread_count(self.member.id), 1)
+            response = self.client_for(self.member).get('/notifications/')
+        self.assertEqual(response.status_code, 200)
+
+
+class CoalescingTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        cache.set(unread_cache_key(self.member.id), 0)
+
+    def chat(self, message):
+        notify_users([self.member.id], message, '/chat/', kind=NotificationKind.CHAT,
+                     project_id=self.project.id, coalesce=True)
+
+    def test_events_fold_into_one_row(self):
+        self.chat('first')
+        self.chat('second')
+        row = Notification.objects.get(user=self.member)
+        self.assertEqual((row.message, row.event_count), ('second', 2))
+
+    def test_colliding_insert_is_folded_not_counted(self):
+        key = coalesce_key_for(NotificationKind.CHAT, self.project.id)
+        now = timezone.now()
+        # Two requests racing past the SELECT: the second INSERT hits the unique key.
+        rows = [Notification(user_id=self.member.id, message=m, dedupe_key=key, kind=NotificationKind.CHAT,
+                             project_id=self.project.id, last_event_at=now) for m in ('first', 'second')]
+        with self.captureOnCommitCallbacks(execute=True):
+            delivered = deliver(rows, coalesce=True)
+        self.assertEqual(len(delivered), 1)
+        row = Notification.objects.get(user=self.member)
+        self.assertEqual(row.event_count, 2)
+        self.assertEqual(cache.get(unread_cache_key(self.member.id)), 1)
+
+    def test_replay_includes_rows_coalesced_into_after_the_cursor(self):
+        self.chat('first')
+        cursor = get_latest_replay_cursor(self.member.id)
+        notify_users([self.member.id], 'task done', kind=NotificationKind.TASK)
+        self.chat('second')
+        rows, has_more = get_missed_notifications(self.member.id, decode_replay_cursor(cursor))
+        self.assertEqual([(r['message'], r['event_count']) for r in rows], [('task done', 1), ('second', 2)])
+        self.assertFalse(has_more)
+        self.assertEqual(get_missed_notifications(self.member.id, decode_replay_cursor(rows[-1]['cursor'])), ([], False))
+
+    async def test_reconnect_with_a_cursor_replays_the_coalesced_row(self):
+        from config.asgi import application
+        await sync_to_async(self.chat)('first')
+        cursor = await sync_to_async(get_latest_replay_cursor)(self.member.id)
+        await sync_to_async(self.chat)('second')
+        token = issue_subscription_token(self.member)
+        communicator = WebsocketCommunicator(application, f'/ws/notifications/?token={token}&cursor={cursor}')
+        self.assertTrue((await communicator.connect())[0])
+        frame = json.loads(await communicator.receive_from())
+        self.assertEqual(frame['type'], 'replay')
+        self.assertEqual([n['message'] for n in frame['notifications']], ['second'])
+        await communicator.disconnect()
+
+
+# --- DAILY UPDATE COMPLIANCE ---
+class ComplianceSummaryTests(ProjectFixtureMixin, TestCase):
+    def test_missed_days_streak_and_rate(self):
+        monday = datetime.date(2026, 10, 5)
+        days = [monday + datetime.timedelta(days=n) for n in range(5)]
+        for day in days[:2] + days[3:]:
+            DailyUpdate.objects.create(user=self.member, date=day)
+        DailyUpdate.objects.create(user=self.member, date=days[4])  # a second post that day
+        for day in days:
+            DailyUpdate.objects.create(user=self.head, date=day)
+        DailyUpdate.objects.create(user=self.outsider, date=days[0])
+
+        # Monday..Sunday: the weekend is not a working day.
+        working, rows = compliance_summary(monday, monday + datetime.timedelta(days=6))
+        self.assertEqual(working, days)
+        by_user = {row['employee'].id: row for row in rows}
+        member, head, outsider = by_user[self.member.id], by_user[self.head.id], by_user[self.outsider.id]
+        self.assertEqual((member['submitted'], member['missed_days'], member['streak'], member['rate']),
+                         (4, [days[2]], 2, 80))
+        self.assertEqual((head['submitted'], head['missed_days'], head['streak']), (5, [], 5))
+        self.assertEqual((outsider['missed_days'], outsider['streak'], outsider['last_submitted']), (days[1:], 0, days[0]))
+        self.assertEqual(rows[0]['employee'], self.outsider)
+
+    def test_missed_days_is_one_query_over_many_days(self):
+        days = working_days(datetime.date(2026, 7, 1), datetime.date(2026, 9, 30))
+        for day in days[1:]:
+            DailyUpdate.objects.create(user=self.member, date=day)
+        with self.assertNumQueries(1):
+            missed = missed_days(expected_reporters(), days)
+        self.assertEqual(missed[self.member.id], days[:1])
+        self.assertEqual(missed[self.head.id], days)
+        self.assertEqual(missed_days(expected_reporters(), []), {})
+
+    def test_reminders_have_their_own_kind(self):
+        monday = datetime.date(2026, 10, 5)
+        DailyUpdate.objects.create(user=self.head, date=monday)
+        remind_missing_updates(monday)
+        reminded = Notification.objects.filter(kind=NotificationKind.REMINDER)
+        self.assertEqual(set(reminded.values_list('user_id', flat=True)), {self.member.id, self.outsider.id})
+
+    def test_report_page_renders(self):
+        DailyUpdate.objects.create(user=self.member, date=datetime.date.today())
+        response = self.client_for(self.manager).get('/daily-updates/compliance/', {'start': '2026-01-01'})
+        self.assertEqual(response.status_code, 200)
+
+
+# --- ACTIVITY FEED ---
+class ActivityEventTests(ProjectFixtureMixin, TestCase):
+    def test_work_update_is_recorded_only_when_the_status_changes(self):
+        client = self.client_for(self.member)
+        url = f'/project/{self.project.id}/update-status/'
+        client.post(url, {'status': WorkStatus.INCOMPLETE, 'remarks': 'started'})
+        client.post(url, {'status': WorkStatus.INCOMPLETE, 'remarks': 'still going'})
+        client.post(url, {'status': WorkStatus.COMPLETE, 'remarks': 'done'})
+        self.assertEqual(ActivityEvent.objects.filter(verb=ActivityVerb.WORK_STATUS).count(), 2)
+
+    def test_new_team_head_is_recorded_as_joining(self):
+        response = self.client_for(self.manager).post(f'/project/{self.project.id}/edit/', {
+            'name': self.project.name, 'priority': ProjectPriority.MEDIUM, 'team_head': self.outsider.id,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(ProjectMember.objects.filter(project=self.project, user=self.outsider).exists())
+        event = ActivityEvent.objects.get(verb=ActivityVerb.MEMBER_ADDED)
+        self.assertEqual((event.project_id, event.actor_id), (self.project.id, self.manager.id))
+
+
+# --- IMAGE VARIANTS ---
+class ImageVariantLookupTests(ProjectFixtureMixin, TestCase):
+    def test_chat_page_looks_up_variants_in_one_round_trip(self):
+        for n in range(20):
+            ProjectUpdate.objects.create(project=self.project, user=self.member if n % 2 else self.head,
+                                         category='UPDATE', remarks='hi', image=f'project_chat_images/{n}.png')
+        for n in range(20):
+            cache.set(variants_cache_key(f'project_chat_images/{n}.png'), (64, 128))
+        counting = mock.Mock(wraps=cache)
+        with mock.patch('pms.images.cache', counting):
+            response = self.client_for(self.member).get(f'/project/{self.project.id}/chat/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(counting.get_many.call_count, 1)
+        self.assertEqual(counting.get.call_count, 0)
+
+    def test_replacing_or_deleting_an_image_drops_its_variants(self):
+        self.project.project_logo = 'project_logos/old.png'
+        self.project.save()
+        cache.set(variants_cache_key('project_logos/old.png'), (64,))
+        self.project.project_logo = 'project_logos/new.png'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.save()
+        self.assertIsNone(cache.get(variants_cache_key('project_logos/old.png')))
+
+        cache.set(variants_cache_key('project_logos/new.png'), (64,))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.save(update_fields=['name'])
+        self.assertEqual(cache.get(variants_cache_key('project_logos/new.png')), (64,))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.delete()
+        self.assertIsNone(cache.get(variants_cache_key('project_logos/new.png')))
+
+    def test_image_background_adds_a_2x_image_set(self):
+        self.member.profile_photo = 'profile_photos/me.png'
+        cache.set(variants_cache_key('profile_photos/me.png'), (64, 128))
+        css = image_background(self.member.profile_photo, 64)
+        self.assertIn("background-image: url('/media/variants/profile_photos/me.png.64.webp')", css)
+        self.assertIn("image-set(url('/media/variants/profile_photos/me.png.64.webp') 1x, "
+                      "url('/media/variants/profile_photos/me.png.128.webp') 2x)", css)
+        cache.set(variants_cache_key('profile_photos/me.png'), ())
+        self.assertNotIn('image-set', image_background(self.member.profile_photo, 64))
+        self.assertEqual(image_background(self.manager.profile_photo, 64), '')
+
+
+# --- BACKGROUND JOBS ---
+@job_handler('tests.flaky')
+def run_flaky_jobs(jobs):
+    return {job.id: "boom" for job in jobs if job.payload.get('fail')}
+
+
+class JobQueueTests(TestCase):
+    def test_claimed_jobs_are_not_claimed_twice(self):
+        job = enqueue('tests.flaky', {})
+        self.assertEqual([j.id for j in claim_jobs('w1')], [job.id])
+        self.assertEqual(claim_jobs('w2'), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (JobStatus.RUNNING, 1, 'w1'))
+
+    def test_only_stale_running_jobs_are_reclaimed(self):
+        job = enqueue('tests.flaky', {})
+        claim_jobs('w1')
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - datetime.timedelta(seconds=JOB_LOCK_TIMEOUT - 5))
+        self.assertEqual(claim_jobs('w2'), [])
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - datetime.timedelta(seconds=JOB_LOCK_TIMEOUT + 5))
+        self.assertEqual([(j.id, j.attempts) for j in claim_jobs('w2')], [(job.id, 2)])
+
+    def test_failure_is_retried_with_backoff_then_given_up(self):
+        job = enqueue('tests.flaky', {'fail': True}, max_attempts=2)
+        self.assertEqual(run_jobs(claim_jobs('w1')), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error, job.locked_by), (JobStatus.PENDING, 'boom', ''))
+        self.assertGreater(job.run_at, timezone.now())
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        run_jobs(claim_jobs('w1'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.FAILED, 2))
+
+    def test_outcome_is_not_written_after_the_job_was_reclaimed(self):
+        job = enqueue('tests.flaky', {})
+        claimed = claim_jobs('w1')
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - datetime.timedelta(seconds=JOB_LOCK_TIMEOUT + 5))
+        claim_jobs('w2')
+        run_jobs(claimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (JobStatus.RUNNING, 'w2'))
+
+    def test_sent_emails_are_not_resent_when_the_batch_is_reclaimed(self):
+        sent = send_email_later('Hello', 'body', ['a@example.com'])
+        unsent = send_email_later('Later', 'body', ['b@example.com'])
+        claimed = claim_jobs('w1')
+        # The first message goes out, then the worker dies mid-batch.
+        send_queued_emails(claimed[:1])
+        Job.objects.filter(id__in=[sent.id, unsent.id]).update(
+            locked_at=timezone.now() - datetime.timedelta(seconds=JOB_LOCK_TIMEOUT + 5),
+        )
+        self.assertEqual([j.id for j in claim_jobs('w2')], [unsent.id])
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class DigestRerunTests(ProjectFixtureMixin, TestCase):
+    def test_rerun_does_not_mail_the_same_people_again(self):
+        ProjectUpdate.objects.create(project=self.project, user=self.member, category='UPDATE', title='Kickoff', remarks='.')
+        self.assertEqual(send_digests()[0], 2)
+        self.assertEqual(send_digests()[0], 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failure_mid_chunk_keeps_what_went_out(self):
+        ProjectUpdate.objects.create(project=self.project, user=self.member, category='UPDATE', title='Kickoff', remarks='.')
+        real_send = EmailBackend.send_messages
+        calls = []
+
+        def flaky_send(backend, messages):
+            calls.append(messages)
+            if len(calls) == 2:
+                raise ConnectionError('smtp went away')
+            return real_send(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', flaky_send), self.assertRaises(ConnectionError):
+            send_digests()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(send_digests()[0], 1)
+        self.assertEqual(len({m.to[0] for m in mail.outbox}), 2)
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    def test_heartbeat_refreshes_the_lock(self):
+        job = enqueue('tests.flaky', {})
+        claimed = claim_jobs('w1')
+        old = timezone.now() - datetime.timedelta(seconds=JOB_LOCK_TIMEOUT + 5)
+        Job.objects.filter(id=job.id).update(locked_at=old)
+        with Heartbeat(claimed, interval=0.05):
+            deadline = timezone.now() + datetime.timedelta(seconds=5)
+            while Job.objects.get(id=job.id).locked_at == old and timezone.now() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(claim_jobs('w2'), [])
+
+
+# --- DEADLINE REMINDERS ---
+class DeadlineReminderTests(ProjectFixtureMixin, TestCase):
+    today = datetime.date(2026, 10, 14)
+
+    def test_team_is_reminded_once_per_deadline(self):
+        Project.objects.filter(id=self.project.id).update(end_date=self.today + datetime.timedelta(days=1))
+        self.assertEqual(send_reminders(self.today, dry_run=True), 2)
+        self.assertEqual(send_reminders(self.today), 2)
+        reminded = Notification.objects.filter(kind=NotificationKind.DEADLINE, project=self.project)
+        self.assertEqual(set(reminded.values_list('user_id', flat=True)), {self.head.id, self.member.id})
+        self.assertIn('tomorrow', reminded.first().message)
+        self.assertEqual(send_reminders(self.today), 0)
+        # The next day it is due today: a new reminder for the same deadline is not sent.
+        self.assertEqual(send_reminders(self.today + datetime.timedelta(days=1)), 0)
+
+    def test_overdue_projects_and_recommendations(self):
+        Project.objects.filter(id=self.project.id).update(end_date=self.today - datetime.timedelta(days=2))
+        ProjectUpdate.objects.create(project=self.project, user=self.manager, category='RECOMMENDATION',
+                                     title='Add tests', end_date=self.today - datetime.timedelta(days=1))
+        ProjectUpdate.objects.create(project=self.project, user=self.manager, category='RECOMMENDATION',
+                                     title='Long gone', end_date=self.today - datetime.timedelta(days=30))
+        kinds = sorted(r[0] for r in find_due_reminders(self.today))
+        self.assertEqual(kinds, [ReminderKind.PROJECT_OVERDUE, ReminderKind.RECOMMENDATION_OVERDUE])
+        self.assertEqual(send_reminders(self.today), 4)
+
+    def test_completed_projects_are_left_alone(self):
+        Project.objects.filter(id=self.project.id).update(end_date=self.today, project_status_update=WorkStatus.COMPLETE)
+        self.assertEqual(send_reminders(self.today), 0)
+
+
+# --- SCHEDULER ---
+def local_time(*args):
+    return timezone.make_aware(datetime.datetime(*args))
+
+
+class CronExpressionTests(SimpleTestCase):
+    def test_next_after(self):
+        cron = CronExpression('*/15 9-17 * * 1-5')
+        self.assertEqual(cron.next_after(local_time(2026, 10, 14, 9, 0)), local_time(2026, 10, 14, 9, 15))
+        self.assertEqual(cron.next_after(local_time(2026, 10, 14, 9, 7, 30)), local_time(2026, 10, 14, 9, 15))
+        # Friday evening -> Monday morning.
+        self.assertEqual(cron.next_after(local_time(2026, 10, 16, 17, 50)), local_time(2026, 10, 19, 9, 0))
+
+    def test_restricted_day_fields_match_either(self):
+        cron = CronExpression('0 0 13 * 5')  # the 13th, and every Friday
+        self.assertEqual(cron.next_after(local_time(2026, 10, 10)), local_time(2026, 10, 13))
+        self.assertEqual(cron.next_after(local_time(2026, 10, 13)), local_time(2026, 10, 16))
+        self.assertEqual(CronExpression('0 0 * * 7').weekdays, {0})
+
+    def test_invalid_expressions(self):
+        for expression in ('* * * *', '60 * * * *', '* 5-2 * * *', '*/0 * * * *', 'x * * * *', '0 0 31 2 *'):
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                CronExpression(expression).next_after(local_time(2026, 1, 1))
+
+
+@mock.patch('pms.scheduler.SCHEDULED_TASKS', {'nightly': {'cron': '0 2 * * *', 'job': 'tests.nightly', 'jitter': 0}})
+class SchedulerTests(TestCase):
+    def test_lease_has_one_holder_until_it_expires(self):
+        now = local_time(2026, 10, 14, 12, 0)
+        self.assertTrue(acquire_lease('node-a', now))
+        self.assertFalse(acquire_lease('node-b', now))
+        renewed = now + datetime.timedelta(seconds=SCHEDULER_LEASE_SECONDS - 1)
+        self.assertTrue(acquire_lease('node-a', renewed))
+        self.assertFalse(acquire_lease('node-b', renewed + datetime.timedelta(seconds=1)))
+        self.assertTrue(acquire_lease('node-b', renewed + datetime.timedelta(seconds=SCHEDULER_LEASE_SECONDS)))
+
+    def test_due_entry_fires_once_for_missed_slots(self):
+        sync_entries(local_time(2026, 10, 14, 12, 0))
+        entry = ScheduleEntry.objects.get(name='nightly')
+        self.assertEqual(entry.next_run_at, local_time(2026, 10, 15, 2, 0))
+
+        self.assertEqual(fire_due('node-a', local_time(2026, 10, 15, 1, 59)), [])
+        # Down for three nights: one run, then back on schedule.
+        later = local_time(2026, 10, 18, 9, 0)
+        self.assertEqual(fire_due('node-a', later), ['nightly'])
+        self.assertEqual(fire_due('node-b', later), [])
+        entry.refresh_from_db()
+        self.assertEqual(entry.next_run_at, local_time(2026, 10, 19, 2, 0))
+        run = ScheduledRun.objects.get()
+        self.assertEqual((run.scheduled_for, run.fired_by, run.job.kind), (local_time(2026, 10, 15, 2, 0), 'node-a', 'tests.nightly'))
+
+    def test_stale_read_cannot_fire_a_slot_twice(self):
+        sync_entries(local_time(2026, 10, 14, 12, 0))
+        stale = list(ScheduleEntry.objects.all())
+        now = local_time(2026, 10, 15, 3, 0)
+        self.assertEqual(fire_due('node-a', now), ['nightly'])
+        # A second node that listed the entries before the first one moved it.
+        listing = ScheduleEntry.objects.filter
+        with mock.patch.object(ScheduleEntry.objects, 'filter',
+                               side_effect=lambda **kw: stale if 'enabled' in kw else listing(**kw)):
+            self.assertEqual(fire_due('node-b', now), [])
+        self.assertEqual(Job.objects.filter(kind='tests.nightly').count(), 1)
@@ -0,0 +1,307 @@
+import datetime
+import hashlib
+import io
+import math
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User
+from .activity import record_activity
+from .choices import ActivityVerb, NotificationKind, UploadStatus, UploadTarget
+from .forms import IssueForm, ProjectChatForm, ProjectDocumentForm, ProjectUpdateAttachmentForm
+from .images import delete_variants
+from .jobs import job_handler
+from .models import Issue, Project, ProjectDocument, ProjectUpdate, ProjectUpdateAttachment, Upload, UploadChunk
+from .notifications import notify_users, project_audience
+from .realtime import publish_on_commit
+
+UPLOAD_CHUNK_SIZE = getattr(settings, 'UPLOAD_CHUNK_SIZE', 1024 * 1024)
+UPLOAD_MAX_SIZE = getattr(settings, 'UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+UPLOAD_EXPIRY_HOURS = getattr(settings, 'UPLOAD_EXPIRY_HOURS', 24)
+PARTIAL_DIR = 'uploads/partial'
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def chunk_count(upload):
+    return max(math.ceil(upload.size / upload.chunk_size), 1)
+
+
+def expected_chunk_size(upload, index):
+    if index < chunk_count(upload) - 1:
+        return upload.chunk_size
+    return upload.size - upload.chunk_size * index
+
+
+def missing_chunks(upload):
+    received = set(upload.chunks.values_list('index', flat=True))
+    return [i for i in range(chunk_count(upload)) if i not in received]
+
+
+# --- TARGETS ---
+def resolve_target(user, target, target_id):
+    """The object the upload attaches to, if ``user`` may add a file to it."""
+    obj = None
+    if target in (UploadTarget.PROJECT_DOCUMENT, UploadTarget.CHAT_FILE):
+        project = Project.objects.filter(id=target_id).first()
+        if project and (user.role == User.Role.MANAGEMENT or user.id == project.team_head_id
+                        or project.members.filter(id=user.id).exists()):
+            obj = project
+    elif target == UploadTarget.UPDATE_ATTACHMENT:
+        update = ProjectUpdate.objects.select_related('project').filter(id=target_id).first()
+        if update and (user.role == User.Role.MANAGEMENT or user.id in (update.user_id, update.project.team_head_id)):
+            obj = update
+    elif target == UploadTarget.ISSUE_ATTACHMENT:
+        obj = Issue.objects.filter(id=target_id, user=user).first()
+    else:
+        raise UploadError(f"Unknown upload target {target!r}")
+    if obj is None:
+        raise UploadError("Target not found", status=404)
+    return obj
+
+
+# The form field each target's multipart upload goes through; a chunked
+# upload is held to the same checks.
+FORM_FIELDS = {
+    UploadTarget.PROJECT_DOCUMENT: (ProjectDocumentForm, 'document'),
+    UploadTarget.CHAT_FILE: (ProjectChatForm, 'file'),
+    UploadTarget.UPDATE_ATTACHMENT: (ProjectUpdateAttachmentForm, 'file'),
+    UploadTarget.ISSUE_ATTACHMENT: (IssueForm, 'attachment'),
+}
+
+
+def validate_file(target, content):
+    """Run the target form's file field validation on ``content`` (anything with .name and .size)."""
+    form_class, name = FORM_FIELDS[target]
+    try:
+        form_class.base_fields[name].clean(content)
+    except ValidationError as e:
+        raise UploadError(" ".join(e.messages))
+
+
+def new_file_holder(upload, obj):
+    """(unsaved or existing instance, name of its file field) for the finished file."""
+    if upload.target == UploadTarget.PROJECT_DOCUMENT:
+        return ProjectDocument(project=obj, uploaded_by=upload.user, description=upload.description), 'document'
+    if upload.target == UploadTarget.CHAT_FILE:
+        return ProjectUpdate(project=obj, user=upload.user, category='UPDATE'), 'file'
+    if upload.target == UploadTarget.UPDATE_ATTACHMENT:
+        return ProjectUpdateAttachment(project_update=obj), 'file'
+    return obj, 'attachment'
+
+
+# --- RECEIVING ---
+def start_upload(user, filename, size, target, target_id, sha256='', description=''):
+    filename = (filename or '').replace('\\', '/').rsplit('/', 1)[-1].strip()
+    if not filename:
+        raise UploadError("A file name is required")
+    if not 0 < size <= UPLOAD_MAX_SIZE:
+        raise UploadError(f"File size must be between 1 byte and {UPLOAD_MAX_SIZE} bytes")
+    sha256 = (sha256 or '').lower()
+    if sha256 and not SHA256_RE.match(sha256):
+        raise UploadError("sha256 must be 64 hex digits")
+    resolve_target(user, target, target_id)
+    placeholder = ContentFile(b'', name=filename)
+    placeholder.size = size
+    validate_file(target, placeholder)
+    return Upload.objects.create(
+        user=user, filename=filename[:255], size=size, chunk_size=UPLOAD_CHUNK_SIZE, sha256=sha256,
+        target=target, target_id=target_id, description=(description or '')[:255],
+    )
+
+
+def store_chunk(upload, index, data, sha256=None):
+    """
+    Write one chunk to storage. A chunk that arrives again (a retry)
+    replaces the earlier copy; one whose SHA-256 does not match the
+    client's is refused, so the client resends just that chunk.
+
+    The write happens under a lock on the upload row, so two sends of the
+    same chunk cannot delete each other's file, and a chunk cannot land
+    while complete_upload is claiming the upload.
+    """
+    if not 0 <= index < chunk_count(upload):
+        raise UploadError(f"Chunk index {index} is out of range")
+    if len(data) != expected_chunk_size(upload, index):
+        raise UploadError(f"Chunk {index} should be {expected_chunk_size(upload, index)} bytes, got {len(data)}")
+    if sha256 and hashlib.sha256(data).hexdigest() != sha256.lower():
+        raise UploadError(f"Chunk {index} failed its checksum", status=422)
+
+    path = f"{PARTIAL_DIR}/{upload.token}/{index:06d}"
+    with transaction.atomic():
+        status = Upload.objects.select_for_update().filter(pk=upload.pk).values_list('status', flat=True).first()
+        if status != UploadStatus.ACTIVE:
+            raise UploadError("Upload is no longer accepting chunks", status=409)
+        old = UploadChunk.objects.filter(upload=upload, index=index).first()
+        if old:
+            default_storage.delete(old.path)
+        # Always the same name, so nothing is left behind under a suffixed one.
+        default_storage.delete(path)
+        saved = default_storage.save(path, ContentFile(data))
+        UploadChunk.objects.update_or_create(upload=upload, index=index, defaults={'size': len(data), 'path': saved})
+
+
+class ChunkReader(io.RawIOBase):
+    """The stored chunks read back in order as one stream, hashed on the way."""
+
+    def __init__(self, paths):
+        self.paths = iter(paths)
+        self.current = None
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self.current is None:
+                path = next(self.paths, None)
+                if path is None:
+                    return 0
+                self.current = default_storage.open(path, 'rb')
+            data = self.current.read(len(buffer))
+            if data:
+                self.digest.update(data)
+                buffer[:len(data)] = data
+                return len(data)
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+        super().close()
+
+
+def discard_chunks(upload):
+    for path in upload.chunks.values_list('path', flat=True):
+        default_storage.delete(path)
+    upload.chunks.all().delete()
+    try:
+        os.rmdir(default_storage.path(f"{PARTIAL_DIR}/{upload.token}"))
+    except (NotImplementedError, OSError):
+        pass  # not a local filesystem storage, or already gone
+
+
+def complete_upload(upload):
+    """
+    Assemble the chunks into the target's file field, streaming them through
+    storage (memory stays at one read buffer), check the whole-file SHA-256
+    and attach the file. Returns the model instance now holding the file.
+
+    The upload is claimed (ACTIVE -> ASSEMBLING) before anything is written,
+    so of two concurrent calls only one attaches a file; the other gets 409.
+    """
+    if upload.status == UploadStatus.COMPLETE:
+        raise UploadError("Upload is already complete", status=409)
+    if upload.status != UploadStatus.ACTIVE:
+        raise UploadError(upload.error or "Upload failed", status=409)
+    missing = missing_chunks(upload)
+    if missing:
+        raise UploadError(f"{len(missing)} chunks are missing", status=409)
+    if not Upload.objects.filter(pk=upload.pk, status=UploadStatus.ACTIVE).update(status=UploadStatus.ASSEMBLING):
+        raise UploadError("Upload is already being completed", status=409)
+    upload.status = UploadStatus.ASSEMBLING
+
+    saved = field = None
+    try:
+        obj = resolve_target(upload.user, upload.target, upload.target_id)
+        holder, field_name = new_file_holder(upload, obj)
+        field = holder._meta.get_field(field_name)
+        reader = ChunkReader(upload.chunks.order_by('index').values_list('path', flat=True))
+        content = File(reader, name=upload.filename)
+        content.size = upload.size
+        validate_file(upload.target, content)
+        try:
+            saved = field.storage.save(field.generate_filename(holder, upload.filename), content,
+                                       max_length=field.max_length)
+        finally:
+            reader.close()
+        digest = reader.digest.hexdigest()
+    except Exception:
+        hand_back(upload, field, saved)
+        raise
+
+    if upload.sha256 and digest != upload.sha256:
+        field.storage.delete(saved)
+        discard_chunks(upload)
+        upload.status, upload.error = UploadStatus.FAILED, "Checksum of the assembled file does not match"
+        upload.save(update_fields=['status', 'error'])
+        raise UploadError(upload.error, status=422)
+
+    replaced = getattr(holder, field_name).name if holder.pk else None
+    try:
+        with transaction.atomic():
+            setattr(holder, field_name, saved)
+            holder.save()
+            Upload.objects.filter(pk=upload.pk).update(
+                status=UploadStatus.COMPLETE, sha256=digest, file_name=saved, completed_at=timezone.now(),
+            )
+            if replaced and replaced != saved:
+                transaction.on_commit(lambda: (field.storage.delete(replaced), delete_variants(replaced)))
+            if upload.target == UploadTarget.CHAT_FILE:
+                audience = project_audience(obj, exclude=upload.user)
+                notify_users([uid for uid, _ in audience], f"Chat from {upload.user.username}",
+                             reverse('project_chat', args=[obj.id]), kind=NotificationKind.CHAT, project_id=obj.id, coalesce=True)
+            if upload.target == UploadTarget.UPDATE_ATTACHMENT:
+                announce_attachment(holder, upload.user)
+    except Exception:
+        # Rolled back: the claim is still ours, so release it with the file.
+        hand_back(upload, field, saved)
+        raise
+    upload.refresh_from_db()
+    discard_chunks(upload)
+    return holder
+
+
+def announce_attachment(attachment, user):
+    """An update got a file after it was posted: put it in the activity feed and tell open pages."""
+    from .signals import build_attachment_events
+
+    update = attachment.project_update
+    url_name = 'project_detail' if update.category == 'RECOMMENDATION' else 'project_updates'
+    record_activity(update.project_id, ActivityVerb.ATTACHMENT_ADDED,
+                    f"{user.username} attached {os.path.basename(attachment.file.name)} to {update.title or 'an update'}",
+                    actor=user, link=reverse(url_name, args=[update.project_id]))
+    publish_on_commit(lambda: build_attachment_events(attachment))
+
+
+def hand_back(upload, field, saved):
+    """Undo a claim that attached nothing: drop the assembled file and let the client retry."""
+    if saved:
+        field.storage.delete(saved)
+    Upload.objects.filter(pk=upload.pk, status=UploadStatus.ASSEMBLING).update(status=UploadStatus.ACTIVE)
+    upload.status = UploadStatus.ACTIVE
+
+
+# --- CLEANUP ---
+def prune_uploads(now=None):
+    """Drop unfinished uploads (and their chunks) older than UPLOAD_EXPIRY_HOURS, and old finished records."""
+    now = now or timezone.now()
+    cutoff = now - datetime.timedelta(hours=UPLOAD_EXPIRY_HOURS)
+    stale = list(Upload.objects.filter(created_at__lt=cutoff).exclude(status=UploadStatus.COMPLETE))
+    for upload in stale:
+        discard_chunks(upload)
+    Upload.objects.filter(id__in=[u.id for u in stale]).delete()
+    Upload.objects.filter(status=UploadStatus.COMPLETE, completed_at__lt=now - datetime.timedelta(days=30)).delete()
+    return len(stale)
+
+
+@job_handler('prune_uploads')
+def run_prune_upload_jobs(jobs):
+    prune_uploads()
+    return {}
@@ -21,6 +21,7 @@ urlpatterns = [
     # --- Chat & Updates ---
     path('project/<int:project_id>/chat/', views.project_chat_view, name='project_chat'),
     path('project/<int:project_id>/updates/', views.project_updates_view, name='project_updates'),
+    path('project/<int:project_id>/activity/', views.project_activity_feed, name='project_activity_feed'),
 
     # --- Team & Task ---
     path('project/<int:project_id>/team/', views.manage_project_team, name='manage_project_team'),
@@ -47,6 +48,7 @@ urlpatterns = [
     
     # 3. Manager Overview
     path('daily-updates/overview/', views.manager_daily_update_list_view, name='manager_daily_updates'),
+    path('daily-updates/compliance/', views.daily_update_compliance_view, name='daily_update_compliance'),
     
     # 4. AJAX Task Loader
     path('ajax/load-tasks/', views.load_tasks_for_project, name='ajax_load_tasks'),
@@ -61,6 +63,12 @@ urlpatterns = [
     path('issues/<int:issue_id>/', views.issue_detail_view, name='issue_detail'),
     path('project/<int:project_id>/meet/end/', views.end_project_meeting, name='end_project_meeting'),
     
+    # --- Chunked Uploads ---
+    path('uploads/', views.upload_start_view, name='upload_start'),
+    path('uploads/<uuid:token>/', views.upload_status_view, name='upload_status'),
+    path('uploads/<uuid:token>/chunks/<int:index>/', views.upload_chunk_view, name='upload_chunk'),
+    path('uploads/<uuid:token>/complete/', views.upload_complete_view, name='upload_complete'),
+
     # --- Notifications ---
     path('notifications/', views.notification_list_view, name='notification_list'),
     path('project/<int:project_id>/task/<int:task_id>/toggle/', views.pm_toggle_task_status, name='pm_toggle_task_status'),
@@ -1,31 +1,36 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Prefetch, OuterRef, Subquery, Value, Count, Case, When, BooleanField
+from django.db.models import Q, Prefetch, OuterRef, Subquery, Exists, Value, Count, Case, When, BooleanField
 from django.db.models.functions import Coalesce
 from django.db import IntegrityError, transaction
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.urls import reverse
 from django.core.paginator import Paginator
+from django.middleware.csrf import get_token
+from django.core.files.storage import default_storage
 from django.template.loader import render_to_string
-from django.views.decorators.http import require_POST
-from django.core.mail import send_mail
+from django.views.decorators.http import require_POST, require_http_methods, condition
+from django.views.decorators.cache import cache_control
 from django.conf import settings
 import datetime
 import calendar
+import hashlib
 import json
+import logging
 import os
+import time
 
 # Import Models
 from users.models import User
 from .models import (
     Project, TaskPage, ProjectUpdate, Notification,
     ProjectMember, WorkUpdate, DailyUpdate, Issue, ProjectDocument,
-    ProjectUpdateAttachment, DailyUpdateLineItem
+    ProjectUpdateAttachment, DailyUpdateLineItem, ActivityEvent, Upload
 )
 from .choices import (
     TaskStatus, ProjectRole, ProjectStatus, WorkStatus, IssueStatus,
-    ProjectUpdateStatus, ProjectUpdateIntent, ProjectPriority
+    ProjectUpdateStatus, ProjectUpdateIntent, ProjectPriority, NotificationKind, UploadStatus
 )
 
 # Import Forms
@@ -47,6 +52,15 @@ from .forms import (
     ProjectDocumentForm,
     ProjectUpdateAttachmentFormSet
 )
+from .activity import record_task_toggle, record_membership, get_feed_page, serialize_event
+from .notifications import project_audience, notify_users, mark_read, get_inbox_page, decode_inbox_cursor, get_unread_count
+from .subscriptions import SUBSCRIPTION_TOKEN_MAX_AGE, issue_subscription_token
+from .jobs import send_email_later
+from .compliance import compliance_summary, missing_on, is_working_day
+from .uploads import UploadError, chunk_count, complete_upload, missing_chunks, start_upload, store_chunk
+from .images import prefetch_variants
+
+logger = logging.getLogger(__name__)
 
 # --- HELPER FUNCTIONS ---
 def user_is_project_admin_or_manager(user, project=None):
@@ -61,6 +75,61 @@ def get_base_template(user):
         return 'base_management.html'
     return 'base_employee.html'
 
+# --- CONDITIONAL GET VALIDATORS ---
+# Each page's ETag is built from one indexed query on the project row plus
+# "latest id" subqueries for whatever the page lists, so an unchanged page
+# is answered with 304 before any of the view's own queries run.
+def _project_page_etag(request, project_id, **latest):
+    user = request.user
+    if request.method != 'GET' or not user.is_authenticated: return None
+    # Pending flash messages must still be rendered once.
+    if len(messages.get_messages(request)): return None
+    projects = Project.objects.filter(id=project_id)
+    # Same access rule as the views: anyone they redirect gets no validator
+    # (and a removed member no 304 for the page they had cached).
+    if user.role != User.Role.MANAGEMENT:
+        projects = projects.filter(Q(team_head=user) | Exists(ProjectMember.objects.filter(project=OuterRef('pk'), user=user)))
+    state = projects.annotate(**latest).values('updated_at', *latest).first()
+    if state is None: return None
+    # The session and CSRF secret change on login/logout; a cached page
+    # carrying the old csrfmiddlewaretoken must not be revalidated.
+    # get_token() makes sure the secret exists (first visit) so the ETag
+    # matches the cookie this response sets.
+    get_token(request)
+    # The page also carries the unread badge and signed socket tokens (see
+    # context_processors): a cached copy is only reused within the same
+    # half-lifetime window of its tokens, so they never expire on a page the
+    # browser still treats as fresh.
+    token_window = int(time.time() // (SUBSCRIPTION_TOKEN_MAX_AGE / 2))
+    parts = [project_id, state['updated_at'].timestamp()] + [state[k] or 0 for k in latest] + [
+        user.id, user.role, request.session.session_key, request.META['CSRF_COOKIE'],
+        get_unread_count(user.id), token_window,
+    ]
+    return hashlib.sha1('-'.join(str(p) for p in parts).encode()).hexdigest()
+
+def project_chat_etag(request, project_id):
+    return _project_page_etag(request, project_id,
+        last_update=Subquery(ProjectUpdate.objects.filter(project=OuterRef('pk')).order_by('-id').values('id')[:1]))
+
+def _last_attachment():
+    # Attachments can be added to an existing update (chunked uploads), which
+    # changes neither the update ids nor the project row.
+    return Subquery(ProjectUpdateAttachment.objects.filter(project_update__project=OuterRef('pk'))
+                    .order_by('-id').values('id')[:1])
+
+def project_updates_etag(request, project_id):
+    return _project_page_etag(request, project_id,
+        last_update=Subquery(ProjectUpdate.objects.filter(project=OuterRef('pk')).order_by('-id').values('id')[:1]),
+        last_attachment=_last_attachment())
+
+def project_detail_etag(request, project_id):
+    # The activity feed records documents, recommendations and team changes;
+    # time logs and attachments added to recommendations are tracked apart.
+    return _project_page_etag(request, project_id,
+        last_event=Subquery(ActivityEvent.objects.filter(project=OuterRef('pk')).order_by('-id').values('id')[:1]),
+        last_time_log=Subquery(DailyUpdateLineItem.objects.filter(project=OuterRef('pk')).order_by('-id').values('id')[:1]),
+        last_attachment=_last_attachment())
+
 # --- PERMISSION DECORATORS ---
 def management_only_required(view_func):
     def _wrapped_view(request, *args, **kwargs):
@@ -233,7 +302,9 @@ def add_project(request):
         if form.is_valid() and doc_formset.is_valid():
             with transaction.atomic():
                 p = form.save(commit=False); p.created_by = request.user; p.save()
-                if p.team_head: ProjectMember.objects.get_or_create(project=p, user=p.team_head, defaults={'role': ProjectRole.DEVELOPER})
+                if p.team_head:
+                    _, joined = ProjectMember.objects.get_or_create(project=p, user=p.team_head, defaults={'role': ProjectRole.DEVELOPER})
+                    if joined: record_membership(p, p.team_head, True, actor=request.user)
                 for f in doc_formset: 
                     if f.cleaned_data and f.cleaned_data.get('document'): 
                         d=f.save(commit=False); d.project=p; d.uploaded_by=request.user; d.save()
@@ -252,13 +323,22 @@ def edit_project(request, project_id):
         return redirect('project_list')
 
     if request.method == 'POST':
+        previous_head_id = project.team_head_id
         form = ProjectForm(request.POST, request.FILES, instance=project)
-        if form.is_valid(): form.save(); messages.success(request, "Project Updated"); return redirect('project_list')
+        if form.is_valid():
+            with transaction.atomic():
+                p = form.save()
+                if p.team_head and p.team_head_id != previous_head_id:
+                    _, joined = ProjectMember.objects.get_or_create(project=p, user=p.team_head, defaults={'role': ProjectRole.DEVELOPER})
+                    if joined: record_membership(p, p.team_head, True, actor=request.user)
+            messages.success(request, "Project Updated"); return redirect('project_list')
     else: form = ProjectForm(instance=project)
     return render(request, 'management/edit_project.html', {'form': form, 'project': project})
 
 # --- PROJECT DETAIL VIEW ---
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=project_detail_etag)
 def project_detail_view(request, project_id):
     project = get_object_or_404(Project, id=project_id)
     is_mgmt = request.user.role == User.Role.MANAGEMENT; is_head = (request.user == project.team_head); is_mem = project.members.filter(id=request.user.id).exists()
@@ -332,44 +412,18 @@ def project_detail_view(request, project_id):
             if meet_form.is_valid():
                 meet_form.save()
                 
-                # --- NOTIFICATION LOGIC FIX ---
-                users_to_notify = set()
-                
-                # 1. Add all team members (these are already User objects)
-                for user_obj in project.members.all():
-                    users_to_notify.add(user_obj)
-                
-                # 2. Add the Team Head if they exist and aren't me
-                if project.team_head and project.team_head != request.user:
-                    users_to_notify.add(project.team_head)
-                
-                email_recipients = []
-                
-                for u_notify in users_to_notify:
-                    if u_notify != request.user: 
-                        # Create Notification
-                        Notification.objects.get_or_create(
-                            user=u_notify, 
-                            message=f"Meeting Link Added: {project.name}", 
-                            link=project.google_meet_link, 
-                            is_read=False
-                        )
-                        # Add to Email List
-                        if u_notify.email: 
-                            email_recipients.append(u_notify.email)
+                # --- NOTIFICATIONS: team members + team head, except me ---
+                audience = project_audience(project, exclude=request.user, include_creator=False)
+                notify_users([uid for uid, _ in audience], f"Meeting Link Added: {project.name}", project.google_meet_link, kind=NotificationKind.MEETING, project_id=project.id)
+                email_recipients = [email for _, email in audience if email]
                 
-                # Send Emails
+                # Emails go out from the job worker (`manage.py run_jobs`).
                 if email_recipients:
-                    try:
-                        send_mail(
-                            f"Meeting Invite: {project.name}", 
-                            f"Join here: {project.google_meet_link}\n\n- Savithru PMS", 
-                            settings.DEFAULT_FROM_EMAIL, 
-                            email_recipients, 
-                            fail_silently=True
-                        )
-                    except Exception as e:
-                        print(f"Email Error: {e}")
+                    send_email_later(
+                        f"Meeting Invite: {project.name}",
+                        f"Join here: {project.google_meet_link}\n\n- Savithru PMS",
+                        email_recipients,
+                    )
 
                 messages.success(request, "Link Updated & Notifications Sent")
                 return redirect('project_detail', project_id=project.id)
@@ -410,6 +464,8 @@ def end_project_meeting(request, project_id):
 
 # --- CHAT & UPDATES ---
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=project_chat_etag)
 def project_chat_view(request, project_id):
     project = get_object_or_404(Project, id=project_id)
     is_mgmt = request.user.role == User.Role.MANAGEMENT; is_head = (request.user == project.team_head); is_mem = project.members.filter(id=request.user.id).exists()
@@ -421,18 +477,21 @@ def project_chat_view(request, project_id):
         chat_form = ProjectChatForm(request.POST, request.FILES)
         if chat_form.is_valid():
             u = chat_form.save(commit=False); u.project=project; u.user=request.user; u.category = 'UPDATE'; u.save()
-            users = {project.created_by, project.team_head}; 
-            for m in project.members.all(): users.add(m.user)
-            for u_notify in users:
-                if u_notify and u_notify != request.user:
-                     Notification.objects.get_or_create(user=u_notify, message=f"Chat from {request.user.username}", link=reverse('project_chat', args=[project.id]), is_read=False)
+            audience = project_audience(project, exclude=request.user)
+            notify_users([uid for uid, _ in audience], f"Chat from {request.user.username}", reverse('project_chat', args=[project.id]), kind=NotificationKind.CHAT, project_id=project.id, coalesce=True)
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest': return JsonResponse({'status': 'success'}, status=200)
             return redirect('project_chat', project_id=project.id)
     
     base = get_base_template(request.user)
-    return render(request, 'pms/project_chat.html', {'project': project, 'updates': updates, 'chat_form': chat_form, 'base_template': base})
+    project_ws_token = issue_subscription_token(request.user, project.id)
+    updates = list(updates)
+    prefetch_variants([project.project_logo, request.user.profile_photo]
+                      + [u.image for u in updates] + [u.user.profile_photo for u in updates])
+    return render(request, 'pms/project_chat.html', {'project': project, 'updates': updates, 'chat_form': chat_form, 'base_template': base, 'project_ws_token': project_ws_token})
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=project_updates_etag)
 def project_updates_view(request, project_id):
     project = get_object_or_404(Project, id=project_id)
     is_mgmt = request.user.role == User.Role.MANAGEMENT; is_head = (request.user == project.team_head); is_mem = project.members.filter(id=request.user.id).exists()
@@ -455,19 +514,41 @@ def project_updates_view(request, project_id):
                 u.save()
                 for f in attachment_formset:
                     if f.cleaned_data and f.cleaned_data.get('file'): a=f.save(commit=False); a.project_update=u; a.save()
-            users = {project.created_by, project.team_head}; 
-            for m in project.members.all(): users.add(m.user)
-            for u_notify in users:
-                if u_notify and u_notify != request.user:
-                     Notification.objects.get_or_create(user=u_notify, message=f"Update: {u.title}", link=reverse('project_updates', args=[project.id]), is_read=False)
+            audience = project_audience(project, exclude=request.user)
+            notify_users([uid for uid, _ in audience], f"Update: {u.title}", reverse('project_updates', args=[project.id]), kind=NotificationKind.UPDATE, project_id=project.id, coalesce=True)
 
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 html = render_to_string('pms/partials/timeline_item.html', {'update': u, 'request': request})
-                return JsonResponse({'status': 'success', 'html': html})
+                return JsonResponse({'status': 'success', 'html': html, 'id': u.id})
             return redirect('project_updates', project_id=project.id)
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'error': 'Please correct the update form.'}, status=400)
 
     base = get_base_template(request.user)
-    return render(request, 'pms/project_updates.html', {'project': project, 'updates': updates, 'update_form': update_form, 'attachment_formset': attachment_formset, 'can_post_update': can_post, 'is_manager': is_mgmt, 'base_template': base})
+    project_ws_token = issue_subscription_token(request.user, project.id)
+    updates = list(updates)
+    prefetch_variants([request.user.profile_photo] + [u.user.profile_photo for u in updates])
+    return render(request, 'pms/project_updates.html', {'project': project, 'updates': updates, 'update_form': update_form, 'attachment_formset': attachment_formset, 'can_post_update': can_post, 'is_manager': is_mgmt, 'base_template': base, 'project_ws_token': project_ws_token})
+
+@login_required
+def project_activity_feed(request, project_id):
+    project = get_object_or_404(Project, id=project_id)
+    is_mgmt = request.user.role == User.Role.MANAGEMENT; is_head = (request.user == project.team_head); is_mem = project.members.filter(id=request.user.id).exists()
+    if not (is_mgmt or is_mem or is_head): return JsonResponse({}, status=403)
+
+    try:
+        before = int(request.GET['before']) if request.GET.get('before') else None
+        after = int(request.GET['after']) if request.GET.get('after') else None
+        limit = int(request.GET.get('limit', 50))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    events, next_cursor = get_feed_page(project, before=before, after=after, limit=limit)
+    return JsonResponse({
+        'project_id': project.id,
+        'events': [serialize_event(e) for e in events],
+        'next_cursor': next_cursor,
+    })
 
 # --- TASK & TEAM VIEWS ---
 @login_required
@@ -497,7 +578,7 @@ def employee_task_list(request):
 @require_POST
 def complete_task_page_view(request, task_id):
     t = get_object_or_404(TaskPage, id=task_id, assigned_to=request.user)
-    t.is_complete = True; t.save(); messages.success(request, "Task Complete")
+    t.is_complete = True; t.save(); record_task_toggle(t, request.user); messages.success(request, "Task Complete")
     return redirect('project_list')
 
 @login_required
@@ -523,9 +604,10 @@ def pm_toggle_task_status(request, task_id, project=None):
     task = get_object_or_404(TaskPage, id=task_id, project=project)
     task.is_complete = not task.is_complete
     task.save()
+    record_task_toggle(task, request.user)
     status = "Complete" if task.is_complete else "Incomplete"
-    if task.assigned_to != request.user:
-        Notification.objects.create(user=task.assigned_to, message=f"Task '{task.page_name}' marked {status}", link=reverse('project_list'))
+    if task.assigned_to_id != request.user.id:
+        notify_users([task.assigned_to_id], f"Task '{task.page_name}' marked {status}", reverse('project_list'), kind=NotificationKind.TASK, project_id=project.id, coalesce=True)
     messages.success(request, f"Task marked {status}")
     return redirect('manage_project_team', project_id=project.id)
 
@@ -540,8 +622,9 @@ def manage_project_team(request, project, **kwargs):
     if request.method == 'POST':
         if 'delete_member' in request.POST:
             try:
-                member = ProjectMember.objects.get(id=request.POST['delete_member'], project=project)
+                member = ProjectMember.objects.select_related('user').get(id=request.POST['delete_member'], project=project)
                 member.delete()
+                record_membership(project, member.user, False, actor=request.user)
                 messages.success(request, "Member removed.")
             except ProjectMember.DoesNotExist:
                 messages.error(request, "Failed to remove member.")
@@ -556,6 +639,7 @@ def manage_project_team(request, project, **kwargs):
                  messages.warning(request, "User already in team.")
             else:
                 ProjectMember.objects.create(project=project, user=user_to_add, role=form.cleaned_data['role'])
+                record_membership(project, user_to_add, True, actor=request.user)
                 messages.success(request, "Member added.")
             return redirect('manage_project_team', project_id=project.id)
     
@@ -613,6 +697,26 @@ def manager_daily_update_list_view(request):
     employees = User.objects.filter(role=User.Role.EMPLOYEE).annotate(latest_update_desc=Subquery(latest), update_count=Subquery(count)).order_by('first_name')
     return render(request, 'management/daily_update_list.html', {'employees': employees, 'today': today, 'base_template': 'base_management.html'})
 
+COMPLIANCE_DEFAULT_DAYS = 14
+COMPLIANCE_MAX_DAYS = 92
+
+@login_required
+def daily_update_compliance_view(request):
+    if not user_is_project_admin_or_manager(request.user): return redirect('index')
+    today = datetime.date.today()
+    try: end = min(datetime.date.fromisoformat(request.GET['end']), today)
+    except (KeyError, ValueError): end = today
+    try: start = datetime.date.fromisoformat(request.GET['start'])
+    except (KeyError, ValueError): start = end - datetime.timedelta(days=COMPLIANCE_DEFAULT_DAYS - 1)
+    start = max(min(start, end), end - datetime.timedelta(days=COMPLIANCE_MAX_DAYS - 1))
+
+    days, rows = compliance_summary(start, end)
+    missing = list(missing_on(end)) if is_working_day(end) else []
+    return render(request, 'management/daily_update_compliance.html', {
+        'rows': rows, 'working_days': len(days), 'start': start, 'end': end, 'missing': missing,
+        'base_template': get_base_template(request.user),
+    })
+
 @login_required
 def load_tasks_for_project(request):
     pid = request.GET.get('project_id')
@@ -678,9 +782,14 @@ def submit_issue_view(request):
         form = IssueForm(request.POST, request.FILES)
         if form.is_valid():
             issue = form.save(commit=False); issue.user = request.user; issue.save()
-            managers = User.objects.filter(role=User.Role.MANAGEMENT)
-            for m in managers: Notification.objects.create(user=m, message=f"Issue from {request.user.username}", link=reverse('issue_detail', args=[issue.id]))
-            messages.success(request, "Issue Submitted"); return redirect('issues')
+            managers = User.objects.filter(role=User.Role.MANAGEMENT).values_list('id', flat=True)
+            notify_users(managers, f"Issue from {request.user.username}", reverse('issue_detail', args=[issue.id]), dedupe=False, kind=NotificationKind.ISSUE)
+            messages.success(request, "Issue Submitted")
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({'status': 'success', 'id': issue.id, 'redirect': reverse('issues')})
+            return redirect('issues')
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'error': 'Please correct the issue form.'}, status=400)
     else: form = IssueForm()
     base = get_base_template(request.user)
     return render(request, 'employee/submit_issue.html', {'form': form, 'base_template': base})
@@ -695,17 +804,25 @@ def issue_detail_view(request, issue_id):
         elif action == 'decline': issue.status = IssueStatus.DECLINED
         elif action == 'wfh': issue.status = IssueStatus.WFH_APPROVED
         issue.save()
-        Notification.objects.create(user=issue.user, message=f"Your issue updated: {issue.status}", link=reverse('issues'))
+        notify_users([issue.user_id], f"Your issue updated: {issue.status}", reverse('issues'), dedupe=False, kind=NotificationKind.ISSUE)
         messages.success(request, "Issue Updated"); return redirect('issues')
     return render(request, 'management/issue_detail.html', {'issue': issue, 'base_template': 'base_management.html'})
 
 @login_required
 def notification_list_view(request):
     current_user = request.user
-    notifications_list = list(Notification.objects.filter(user=current_user))
-    Notification.objects.filter(user=current_user, is_read=False).update(is_read=True)
+    try:
+        cursor = decode_inbox_cursor(request.GET['before']) if request.GET.get('before') else None
+    except ValueError:
+        cursor = None
+    notifications_list, next_cursor = get_inbox_page(current_user, cursor)
+    # Only what is actually on screen counts as read.
+    mark_read(current_user, [n.id for n in notifications_list if not n.is_read])
     base = get_base_template(request.user)
-    return render(request, 'pms/notification_list.html', {'notifications': notifications_list, 'base_template': base})
+    return render(request, 'pms/notification_list.html', {
+        'notifications': notifications_list, 'next_cursor': next_cursor,
+        'is_first_page': cursor is None, 'base_template': base
+    })
 
 @login_required
 def daily_update_view(request):
@@ -721,5 +838,74 @@ def pm_update_task_status_view(request, task_id):
     t = get_object_or_404(TaskPage, id=task_id); 
     if request.user != t.project.team_head: return JsonResponse({}, status=403)
     data = json.loads(request.body); status = data.get('status')
-    t.is_complete = (status == 'complete'); t.save()
-    return JsonResponse({'status': 'success'})
\ No newline at end of file
+    t.is_complete = (status == 'complete'); t.save(); record_task_toggle(t, request.user)
+    return JsonResponse({'status': 'success'})
+
+# --- CHUNKED UPLOADS (assets/js/chunked_upload.js) ---
+def upload_api(view_func):
+    """Answer unexpected failures of the upload endpoints as JSON too, so the client can show and retry them."""
+    def _wrapped_view(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except Http404:
+            raise
+        except Exception:
+            logger.exception("Upload request failed")
+            return JsonResponse({'error': 'The upload could not be processed, try again'}, status=500)
+    return _wrapped_view
+
+def _upload_state(upload):
+    return {
+        'token': str(upload.token), 'status': upload.status, 'chunk_size': upload.chunk_size,
+        'chunks': chunk_count(upload),
+        'missing': missing_chunks(upload) if upload.status == UploadStatus.ACTIVE else [],
+        'error': upload.error,
+    }
+
+@login_required
+@upload_api
+@require_POST
+def upload_start_view(request):
+    try:
+        data = json.loads(request.body)
+        upload = start_upload(
+            request.user, data.get('filename'), int(data.get('size') or 0),
+            data.get('target'), int(data.get('target_id') or 0),
+            sha256=data.get('sha256') or '', description=data.get('description') or '',
+        )
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(_upload_state(upload), status=201)
+
+@login_required
+@upload_api
+def upload_status_view(request, token):
+    upload = get_object_or_404(Upload, token=token, user=request.user)
+    return JsonResponse(_upload_state(upload))
+
+@login_required
+@upload_api
+@require_http_methods(['PUT'])
+def upload_chunk_view(request, token, index):
+    upload = get_object_or_404(Upload, token=token, user=request.user)
+    # Refuse oversized chunks before reading the body.
+    if int(request.META.get('CONTENT_LENGTH') or 0) > upload.chunk_size:
+        return JsonResponse({'error': f'Chunks are at most {upload.chunk_size} bytes'}, status=413)
+    try:
+        store_chunk(upload, index, request.body, request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse({'status': 'success', 'index': index})
+
+@login_required
+@upload_api
+@require_POST
+def upload_complete_view(request, token):
+    upload = get_object_or_404(Upload, token=token, user=request.user)
+    try:
+        complete_upload(upload)
+    except UploadError as e:
+        return JsonResponse(dict(_upload_state(upload), error=str(e)), status=e.status)
+    return JsonResponse(dict(_upload_state(upload), sha256=upload.sha256, url=default_storage.url(upload.file_name)))